@@ -0,0 +1,122 @@
+import asyncio
+import base64
+import io
+import json
+import numpy as np
+import time
+
+from Benchmark.SyntheticData import generateText, location
+from Configuration import loadTestSetting, servingSetting
+from PIL import Image
+
+def constructPayload(endpoint:str, itemNumber:int, seed:int=0) -> bytes:
+    '''
+        Return the json body of a scoring request with synthetic
+    products or images
+
+    Argument:
+        endpoint: str, "/price" or "/category"
+        itemNumber: int, the number of products or images within the request
+        seed: int, the seed of the random generator
+
+    Return:
+        result: bytes, the body of the request
+    '''
+    random=np.random.default_rng(seed)
+
+    if endpoint=="/price":
+        return json.dumps({"records":[{
+            "product_name":name,
+            "product_description":description,
+            "location":location[random.integers(0, len(location))]
+        } for name, description in zip(generateText(random, itemNumber, 3, 8), generateText(random, itemNumber, 10, 80))]}).encode()
+
+    images=[]
+    for _ in range(itemNumber):
+        file=io.BytesIO()
+        Image.fromarray(random.integers(0, 256, (256, 256, 3), dtype="uint8")).save(file, format="JPEG", quality=90)
+        images.append(base64.b64encode(file.getvalue()).decode())
+
+    return json.dumps({"images":images}).encode()
+
+async def sendRequest(reader:asyncio.StreamReader, writer:asyncio.StreamWriter, method:str, path:str, body:bytes=b"") -> tuple[int, dict]:
+    '''
+        Send a request over a kept alive connection and read its response
+
+    Argument:
+        reader: asyncio.StreamReader, the incoming stream of the connection
+        writer: asyncio.StreamWriter, the outgoing stream of the connection
+        method: str, the HTTP method of the request
+        path: str, the path of the request
+        body: bytes, the body of the request
+
+    Return:
+        status: int, the status code of the response
+        payload: dict, the json payload of the response
+    '''
+    writer.write((method+" "+path+" HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+                  "Content-Length: "+str(len(body))+"\r\n\r\n").encode()+body)
+    await writer.drain()
+
+    status=int((await reader.readline()).split()[1])
+    header={}
+    while (line:=await reader.readline()) not in (b"\r\n", b"\n", b""):
+        name, _, value=line.decode("latin-1").partition(":")
+        header[name.strip().lower()]=value.strip()
+
+    return status, json.loads(await reader.readexactly(int(header.get("content-length", 0))))
+
+async def runLoadTest(loadTestSetting:dict=loadTestSetting, servingSetting:dict=servingSetting) -> dict:
+    '''
+        Send the requests of the load test from concurrent connections and
+    return the throughput and latency seen by the client together with the
+    metrics reported by the server
+
+        Every connection sends its next request as soon as the previous
+    response arrives, so the number of requests in flight is the concurrency
+
+    Argument:
+        loadTestSetting: dict, the setting of the load test
+        servingSetting: dict, the setting of the scoring server
+
+    Return:
+        result: dict, contains the counters, throughput and latency percentiles
+                in milliseconds of the client, and the metrics of the server
+    '''
+    endpoint=loadTestSetting["endpoint"]
+    body=[constructPayload(endpoint, loadTestSetting["itemNumber"], seed) for seed in range(min(loadTestSetting["requestNumber"], 16))]
+    latency=[]
+    error=[0]
+    remaining=[loadTestSetting["requestNumber"]]
+
+    async def runConnection():
+        reader, writer=await asyncio.open_connection(servingSetting["host"], servingSetting["port"])
+        try:
+            while remaining[0]>0:
+                remaining[0]-=1
+                start=time.perf_counter()
+                status, _=await sendRequest(reader, writer, "POST", endpoint, body[remaining[0]%len(body)])
+                latency.append(time.perf_counter()-start)
+                error[0]+=status!=200
+        finally:
+            writer.close()
+
+    start=time.perf_counter()
+    await asyncio.gather(*[runConnection() for _ in range(loadTestSetting["concurrency"])])
+    second=time.perf_counter()-start
+
+    reader, writer=await asyncio.open_connection(servingSetting["host"], servingSetting["port"])
+    _, metric=await sendRequest(reader, writer, "GET", "/metrics")
+    writer.close()
+
+    latency=np.array(latency)*1000
+    return {
+        "endpoint":endpoint,
+        "request":len(latency),
+        "error":error[0],
+        "second":second,
+        "throughput":len(latency)/second,
+        "p50":float(np.percentile(latency, 50)),
+        "p99":float(np.percentile(latency, 99)),
+        "server":metric[endpoint]
+    }
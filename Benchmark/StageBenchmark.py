@@ -0,0 +1,223 @@
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+import TrainClassification
+import TrainRegression
+
+from Benchmark.SyntheticData import generateImage, generateProduct
+from collections.abc import Callable
+from Configuration import imageFolder, imageInformationPath, productPath, targetFolder, textDatasetSetting
+from DataCleaning.CleanImageData import cleanImage, constructImageID, constructLabel
+from DataCleaning.CleanTabularData import cleanProduct
+from DataLoading.TextLoading import loadProduct
+from DataProcessing.DatasetSplitting import updateSplit
+from DataProcessing.ImageProcessing import loadFlatDataset
+from DataProcessing.TextProcessing import splitTrainTest, transformData
+
+def prepareData(productNumber:int, imageNumber:int, imageSize:tuple[int, int], seed:int):
+    '''
+        Generate the synthetic products and images in the current
+    working directory, at the paths given by Configuration, and create
+    the folder for the cleaned images
+
+    Argument:
+        productNumber: int, the number of products to generate
+        imageNumber: int, the number of images to generate
+        imageSize: tuple[int, int], the minimum and maximum width and height of the images
+        seed: int, the seed of the random generator
+    '''
+    os.makedirs(os.path.dirname(productPath), exist_ok=True)
+    os.makedirs(targetFolder, exist_ok=True)
+    productID=generateProduct(productNumber, productPath, seed)
+    generateImage(productID, imageNumber, imageFolder, imageInformationPath, imageSize, seed)
+
+def constructStage() -> list[tuple[str, Callable[[], Callable]]]:
+    '''
+        Return every benchmarked stage in the order they should run
+
+        Each stage is given by a function that prepares its inputs outside
+    the measurement and returns the function to measure, and every stage
+    relies on the outputs of the stages before it
+
+    Return:
+        result: list[tuple[str, Callable]], the name and preparation of each stage
+    '''
+    def prepareTransformData() -> Callable:
+        data=loadProduct(columns=["id"]+textDatasetSetting["featureColumn"]+[textDatasetSetting["targetColumn"]])
+        trainData, testData, _, _=splitTrainTest(data)
+        return lambda: transformData(trainData, testData)
+
+    def prepareLoadFlatDataset() -> Callable:
+        trainPath, _, trainOffset, _, _, _=TrainClassification.splitData()
+        return lambda: loadFlatDataset(trainPath, trainOffset)
+
+    return [
+        ("cleanProduct", lambda: cleanProduct),
+        ("updateSplit", lambda: updateSplit),
+        ("constructLabel", lambda: lambda: constructLabel(constructImageID(imageFolder), imageInformationPath)),
+        ("cleanImage", lambda: cleanImage),
+        ("transformData", prepareTransformData),
+        ("loadFlatDataset", prepareLoadFlatDataset),
+        ("trainRegression", lambda: lambda: TrainRegression.trainModel(*TrainRegression.loadData())),
+        ("trainClassification", lambda: TrainClassification.trainModel)
+    ]
+
+def measureStage(function:Callable, repeat:int=1, memory:bool=True) -> dict:
+    '''
+        Measure the wall time and the peak memory of the given function
+
+        The time is the fastest of the repeated runs without tracing, since
+    tracing slows down the function. The peak memory is measured by one more
+    run with tracemalloc, which covers the allocations of Python and numpy
+    but not the memory of worker processes
+
+    Argument:
+        function: Callable, the function to measure
+        repeat: int, the number of timed runs
+        memory: bool, run the function once more to trace its peak memory
+
+    Return:
+        result: dict, contains the time in seconds and the peak memory in bytes,
+                the peak memory is None if it isn't traced
+    '''
+    second=[]
+    for _ in range(repeat):
+        start=time.perf_counter()
+        function()
+        second.append(time.perf_counter()-start)
+
+    peakMemory=None
+    if memory:
+        tracemalloc.start()
+        try:
+            function()
+            peakMemory=tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    return {"second":min(second), "peakMemory":peakMemory}
+
+def runBenchmark(benchmarkSetting:dict, workFolder:str) -> list[dict]:
+    '''
+        Measure every stage on the synthetic data at each scale
+
+        Every scale is generated into its own sub folder of the work folder,
+    which becomes the working directory while the stages run, so the
+    relative paths in Configuration point at the synthetic data
+
+    Argument:
+        benchmarkSetting: dict, the setting of the benchmark
+        workFolder: str, the folder where the synthetic data are generated
+
+    Return:
+        result: list[dict], the measurement of every stage at every scale
+    '''
+    result=[]
+    currentFolder=os.getcwd()
+
+    for productNumber in benchmarkSetting["productNumber"]:
+        imageNumber=max(int(productNumber*benchmarkSetting["imageRatio"]), 1)
+        scaleFolder=os.path.join(workFolder, str(productNumber))
+        os.makedirs(scaleFolder, exist_ok=True)
+        os.chdir(scaleFolder)
+
+        try:
+            prepareData(productNumber, imageNumber, benchmarkSetting["imageSize"], benchmarkSetting["seed"])
+
+            for name, prepare in constructStage():
+                measurement=measureStage(prepare(), benchmarkSetting["repeat"], benchmarkSetting["memory"])
+                result.append({"stage":name, "productNumber":productNumber, "imageNumber":imageNumber, **measurement})
+                print("Benchmarked: ", name, productNumber, measurement)
+        finally:
+            os.chdir(currentFolder)
+
+    return result
+
+def saveResult(result:list[dict], benchmarkSetting:dict, benchmarkResultPath:str) -> list[dict]:
+    '''
+        Append the results of this version to the benchmark result file
+
+        Each record is labelled with the current git commit, the time and
+    the Python version, so the results of different versions could be
+    compared with each other
+
+    Argument:
+        result: list[dict], the measurement of every stage at every scale
+        benchmarkSetting: dict, the setting of the benchmark
+        benchmarkResultPath: str, file path of the benchmark results of every version
+
+    Return:
+        history: list[dict], every record saved in the result file, the last one being this version
+    '''
+    history=loadResult(benchmarkResultPath)
+    history.append({
+        "version":findVersion(),
+        "time":time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python":platform.python_version(),
+        "setting":benchmarkSetting,
+        "result":result
+    })
+
+    with open(benchmarkResultPath, "w") as file:
+        json.dump(history, file, indent=4)
+
+    return history
+
+def loadResult(benchmarkResultPath:str) -> list[dict]:
+    '''
+        Load the benchmark results of every version, which is empty
+    if nothing has been recorded yet
+
+    Argument:
+        benchmarkResultPath: str, file path of the benchmark results of every version
+
+    Return:
+        history: list[dict], every record saved in the result file
+    '''
+    if not os.path.exists(benchmarkResultPath):
+        return []
+
+    with open(benchmarkResultPath) as file:
+        return json.load(file)
+
+def findVersion() -> str:
+    '''
+        Return the current git commit of the repository, or "unknown"
+    if it isn't a git repository
+    '''
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def compareResult(previous:dict, current:dict, tolerance:float) -> list[str]:
+    '''
+        Return a message for every stage that became slower or used more
+    memory than the previous record by more than the tolerance
+
+    Argument:
+        previous: dict, the record of the previous version
+        current: dict, the record of the current version
+        tolerance: float, the allowed proportion of increase
+
+    Return:
+        result: list[str], the message of each regression
+    '''
+    result=[]
+    baseline={(item["stage"], item["productNumber"]):item for item in previous["result"]}
+
+    for item in current["result"]:
+        before=baseline.get((item["stage"], item["productNumber"]))
+        if before is None:
+            continue
+
+        for key in ["second", "peakMemory"]:
+            if before[key] and item[key] and item[key]>before[key]*(1+tolerance):
+                result.append(item["stage"]+" at "+str(item["productNumber"])+" products: "+key+" "+
+                              format(before[key], ".4g")+" -> "+format(item[key], ".4g")+" (version "+previous["version"]+")")
+
+    return result
@@ -0,0 +1,116 @@
+import numpy as np
+import os
+import pandas as pd
+import uuid
+
+from PIL import Image
+
+# The words used to build the synthetic product names and descriptions
+vocabulary=["used", "new", "good", "condition", "vintage", "wooden", "leather", "black", "white", "red", "blue", "large", "small",
+            "sofa", "chair", "table", "bike", "guitar", "phone", "laptop", "jacket", "boots", "lamp", "desk", "camera", "watch",
+            "collection", "only", "delivery", "available", "perfect", "working", "order", "box", "original", "boxed", "cheap"]
+# The categories of the synthetic products, each given as its levels
+category=[["Home & Garden", "Furniture"], ["Home & Garden", "Lighting"], ["Music", "Guitars"], ["Sports", "Bikes", "Road"],
+          ["Sports", "Bikes", "Mountain"], ["Phones", "Mobile Phones"], ["Computers", "Laptops"], ["Clothes", "Jackets"],
+          ["Clothes", "Footwear", "Boots"], ["Other Goods"]]
+# The locations of the synthetic products
+location=["London", "Manchester", "Leeds", "York", "Bristol", "Glasgow", "Cardiff", "Belfast"]
+
+def generateProduct(productNumber:int, productPath:str, seed:int=0) -> pd.Series:
+    '''
+        Generate a product csv file in the same format as the raw
+    product information and return the ID of every product
+
+        The price is written as "£x,xxx.xx", the category as levels
+    separated by " / ", and the name and description as free text
+
+    Argument:
+        productNumber: int, the number of products to generate
+        productPath: str, file path of the generated product information
+        seed: int, the seed of the random generator
+
+    Return:
+        result: pd.Series, the unique ID of each product
+    '''
+    random=np.random.default_rng(seed)
+    productID=generateID(random, productNumber)
+    price=np.round(np.exp(random.normal(4, 1.5, productNumber)), 2)
+
+    dataFrame=pd.DataFrame({
+        "id":productID,
+        "product_name":generateText(random, productNumber, 3, 8),
+        "category":[" / ".join(category[i]) for i in random.integers(0, len(category), productNumber)],
+        "product_description":generateText(random, productNumber, 10, 80),
+        "price":["£"+format(value, ",.2f") for value in price],
+        "location":[location[i] for i in random.integers(0, len(location), productNumber)]
+    })
+
+    dataFrame.to_csv(productPath, lineterminator="\n")
+    return dataFrame["id"]
+
+def generateImage(productID:pd.Series, imageNumber:int, imageFolder:str, imageInformationPath:str,
+                  imageSize:tuple[int, int]=(200, 1200), seed:int=0):
+    '''
+        Generate colour JPEG images of random sizes, each attached to
+    a random product, together with the image information csv file
+
+        Every image is a smooth gradient with some noise, so it
+    compresses like a photo instead of pure noise
+
+    Argument:
+        productID: pd.Series, the unique ID of each product
+        imageNumber: int, the number of images to generate
+        imageFolder: str, the folder where the generated images are stored
+        imageInformationPath: str, file path of the generated image information
+        imageSize: tuple[int, int], the minimum and maximum width and height of the images
+        seed: int, the seed of the random generator
+    '''
+    random=np.random.default_rng(seed+1)
+    imageID=generateID(random, imageNumber)
+    os.makedirs(imageFolder, exist_ok=True)
+
+    for ID in imageID:
+        width, height=random.integers(imageSize[0], imageSize[1]+1, 2)
+        colour=random.integers(0, 256, (2, 3))
+        gradient=np.linspace(0, 1, width, dtype="float32")[None, :, None]
+        pixel=colour[0]+(colour[1]-colour[0])*gradient+random.normal(0, 8, (height, 1, 3))
+        image=np.clip(np.broadcast_to(pixel, (height, width, 3)), 0, 255).astype("uint8")
+        Image.fromarray(image).save(imageFolder+"/"+ID+".jpg", quality=90)
+
+    pd.DataFrame({
+        "id":imageID,
+        "product_id":productID.to_numpy()[random.integers(0, len(productID), imageNumber)],
+        "bucket_link":"",
+        "image_ref":"",
+        "create_time":"2022-01-01"
+    }).to_csv(imageInformationPath)
+
+def generateID(random:np.random.Generator, number:int) -> list[str]:
+    '''
+        Return the given number of reproducible UUID strings
+
+    Argument:
+        random: np.random.Generator, the random generator
+        number: int, the number of ID to generate
+
+    Return:
+        result: list[str], the unique ID strings
+    '''
+    return [str(uuid.UUID(bytes=random.bytes(16))) for _ in range(number)]
+
+def generateText(random:np.random.Generator, number:int, minimumLength:int, maximumLength:int) -> list[str]:
+    '''
+        Return the given number of random sentences built from the vocabulary
+
+    Argument:
+        random: np.random.Generator, the random generator
+        number: int, the number of sentences to generate
+        minimumLength: int, the minimum number of words in a sentence
+        maximumLength: int, the maximum number of words in a sentence
+
+    Return:
+        result: list[str], the random sentences
+    '''
+    length=random.integers(minimumLength, maximumLength+1, number)
+    word=np.array(vocabulary)[random.integers(0, len(vocabulary), length.sum())]
+    return [" ".join(sentence) for sentence in np.split(word, np.cumsum(length)[:-1])]
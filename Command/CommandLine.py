@@ -0,0 +1,213 @@
+import argparse
+import ast
+import Configuration
+import json
+import sys
+
+# Every command is run by a function importing its own modules, so the heavy
+# dependencies are only loaded by the command that needs them, after the
+# configuration overrides are applied. Nothing beyond the standard library and
+# Configuration should be imported at the top of this module
+
+def runCommand(argument:list[str]) -> int:
+    '''
+        Parse the command line, apply the configuration overrides and
+    run the given command
+
+    Argument:
+        argument: list[str], the command line arguments without the program name
+
+    Return:
+        result: int, the exit status of the command
+    '''
+    parser=constructParser()
+    option=parser.parse_args(argument)
+
+    try:
+        for item in option.set:
+            applyOverride(item)
+    except (KeyError, TypeError, ValueError) as error:
+        parser.error(str(error.args[0] if error.args else error))
+
+    return option.function(option) or 0
+
+def constructParser() -> argparse.ArgumentParser:
+    '''
+        Return the parser of every command, where each subparser sets
+    the function running its command
+    '''
+    common=argparse.ArgumentParser(add_help=False)
+    common.add_argument("--set", action="append", default=[], metavar="NAME=VALUE",
+                        help="override a value of Configuration before running, e.g. TFIDFVectorizerSetting.max_features=5000, "
+                             "the value is read as a Python literal or kept as a string")
+
+    parser=argparse.ArgumentParser(prog="RunCommand.py", description="Clean the data, train the models and predict new products")
+    subparser=parser.add_subparsers(title="command", required=True)
+
+    command=subparser.add_parser("clean-products", parents=[common], help="clean the raw product information")
+    command.set_defaults(function=cleanProductCommand)
+
+    command=subparser.add_parser("split", parents=[common], help="assign every new product to the training or test set")
+    command.set_defaults(function=splitCommand)
+
+    command=subparser.add_parser("clean-images", parents=[common], help="clean the raw images of the products")
+    command.set_defaults(function=cleanImageCommand)
+
+    command=subparser.add_parser("train-regression", parents=[common], help="train and save the price predictor")
+    command.set_defaults(function=trainRegressionCommand)
+
+    command=subparser.add_parser("train-classification", parents=[common], help="train and save the category classifier")
+    command.set_defaults(function=trainClassificationCommand)
+
+    command=subparser.add_parser("predict", parents=[common], help="predict with the saved models and print the result as json")
+    command.add_argument("target", choices=["price", "category"], help="the model used for the prediction")
+    command.add_argument("input", nargs="+",
+                         help="json or csv files of product records for price, image files for category, - reads json records from stdin")
+    command.set_defaults(function=predictCommand)
+
+    return parser
+
+def applyOverride(item:str):
+    '''
+        Override a value of Configuration, which could be a module
+    variable or a key within a setting dict given by a dotted name
+
+        A dict is updated in place, so modules that have already imported
+    it see the new value. A module variable is only seen by modules imported
+    afterwards, which is why every command imports its modules lazily
+
+    Argument:
+        item: str, the override as "NAME=VALUE" or "NAME.KEY=VALUE"
+    '''
+    name, separator, text=item.partition("=")
+    if not separator:
+        raise ValueError("The override should be NAME=VALUE: "+item)
+
+    try:
+        value=ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        value=text
+
+    path=name.strip().split(".")
+    if path[0].startswith("_") or not hasattr(Configuration, path[0]):
+        raise KeyError("Unknown configuration: "+path[0])
+
+    if len(path)==1:
+        setattr(Configuration, path[0], value)
+        return
+
+    setting=getattr(Configuration, path[0])
+    for key in path[1:-1]:
+        if not isinstance(setting, dict) or key not in setting:
+            raise KeyError("Unknown configuration: "+name)
+        setting=setting[key]
+
+    if not isinstance(setting, dict) or path[-1] not in setting:
+        raise KeyError("Unknown configuration: "+name)
+    setting[path[-1]]=value
+
+def cleanProductCommand(option:argparse.Namespace):
+    '''
+        Clean the raw product information
+    '''
+    from DataCleaning.CleanTabularData import cleanProduct
+
+    print("Cleaned products: ", cleanProduct())
+
+def splitCommand(option:argparse.Namespace):
+    '''
+        Assign every new product to the training or test set
+    '''
+    from DataProcessing.DatasetSplitting import updateSplit
+
+    print("Assigned products: ", updateSplit())
+
+def cleanImageCommand(option:argparse.Namespace):
+    '''
+        Clean the raw images of the products
+    '''
+    from DataCleaning.CleanImageData import cleanImage
+
+    print("Cleaned images: ", cleanImage())
+
+def trainRegressionCommand(option:argparse.Namespace):
+    '''
+        Train the regression model and save it as the price predictor
+    '''
+    import TrainRegression
+
+    TrainRegression.trainModel(*TrainRegression.loadData())
+
+def trainClassificationCommand(option:argparse.Namespace):
+    '''
+        Train the classification model, save it as the category
+    classifier and print its classification report
+    '''
+    import TrainClassification
+
+    from sklearn.metrics import classification_report
+
+    testLabel, prediction=TrainClassification.trainModel()
+    print(classification_report(testLabel, prediction))
+
+def predictCommand(option:argparse.Namespace):
+    '''
+        Predict the price of product records or the category of images
+    with the saved models and print the result of each as a json line
+
+        The category is printed by its name if the relation between
+    categories and labels exists
+    '''
+    if option.target=="price":
+        from Prediction.PricePrediction import predictPrice
+
+        records=[record for path in option.input for record in loadRecord(path)]
+        result=predictPrice(records)
+    else:
+        from Prediction.CategoryPrediction import predictCategory
+
+        image=[]
+        for path in option.input:
+            with open(path, "rb") as file:
+                image.append(file.read())
+
+        result=predictCategory(image)
+        relation=loadRelation()
+        result=[relation.get(int(label), int(label)) for label in result]
+
+    for path, value in zip(option.input if option.target=="category" else range(len(result)), result):
+        print(json.dumps({"input":path, option.target:value.item() if hasattr(value, "item") else value}))
+
+def loadRecord(path:str) -> list[dict]:
+    '''
+        Load the product records within a json or csv file
+
+    Argument:
+        path: str, file path of the records, - reads json from stdin
+
+    Return:
+        result: list[dict], the product records
+    '''
+    if path.endswith(".csv"):
+        import pandas as pd
+
+        return pd.read_csv(path).to_dict("records")
+
+    if path=="-":
+        record=json.load(sys.stdin)
+    else:
+        with open(path) as file:
+            record=json.load(file)
+
+    return record if isinstance(record, list) else [record]
+
+def loadRelation() -> dict[int,str]:
+    '''
+        Return the category name of every label, empty if the relation
+    between categories and labels doesn't exist
+    '''
+    try:
+        with open(Configuration.categoryRelationPath) as file:
+            return {label:name for name, label in json.load(file).items()}
+    except FileNotFoundError:
+        return {}
@@ -7,10 +7,28 @@ imageFolder="./images"
 targetFolder="./Data/CleanImage"
 # The maximum range of pixels in the image
 dataRange=255
+# The data type of cleaned images, "float32" stores normalised pixels and "uint8" stores raw pixels normalised when loading
+imageStorageType="float32"
+# Decode JPEG images directly in grayscale and crop before any conversion
+imageFastDecode=False
 # File path of image information
 imageInformationPath="./Data/Images.csv"
 # File path of image loading information
 imageLoadingPath="./Data/ImageLoading.csv"
+# The number of worker processes used for cleaning images, 1 means cleaning serially and None uses every core
+imageWorkerNumber=1
+# The number of images sent to a worker process at a time
+imageChunkSize=32
+# Report the progress every given number of cleaned images, 0 means no progress is reported
+imageProgressInterval=1000
+# The format of cleaned images, "npy" saves one file per image and "store" saves a single memory-mapped array
+imageStoreFormat="npy"
+# File path of the single memory-mapped array when the "store" format is used
+imageStorePath="./Data/CleanImage.npy"
+# Only clean new or changed images and remove outputs of deleted ones, which requires the "npy" format
+imageIncremental=False
+# File path of the manifest recording every cleaned image for incremental cleaning
+imageManifestPath="./Data/ImageManifest.json"
 
 # ----- CleanTabularData -----
 # File path of product information
@@ -21,6 +39,57 @@ lineTerminator="\n"
 cleanProductName="CleanProduct"
 # File path of processed product information
 cleanProductPath="./Data"
+# The file format of processed product information, "csv", "parquet" or "feather"
+cleanProductFormat="csv"
+# The number of rows read at a time when cleaning products, None means reading the whole file at once
+productChunkSize=None
+# File path of the relation between high-level categories and numerical labels
+categoryRelationPath="./Data/CategoryRelation.json"
+
+# ----- Deduplication -----
+# The setting of the near-duplicate detection over products and cleaned images
+deduplicationSetting={
+    # Detect near-duplicate products and images, the pipeline stages do nothing when disabled
+    "enabled":False,
+    # Only load the first product or image of every cluster of near-duplicates,
+    # the cleaned data is kept whole so turning it off brings the others back
+    "collapse":False,
+    # The number of words within each text shingle
+    "shingleSize":3,
+    # The number of hash permutations within each MinHash signature
+    "permutationNumber":128,
+    # The number of LSH bands the MinHash signature is split into
+    "bandNumber":32,
+    # The minimum estimated Jaccard similarity between near-duplicate products
+    "textThreshold":0.8,
+    # The side length of the difference hash, which has side*side bits
+    "hashSize":8,
+    # The maximum number of differing bits between near-duplicate images
+    "imageDistance":4,
+    # The seed of the hash permutations
+    "seed":0
+}
+# File path of the near-duplicate product clusters
+productDuplicatePath="./Data/ProductDuplicate.csv"
+# File path of the near-duplicate image clusters
+imageDuplicatePath="./Data/ImageDuplicate.csv"
+
+# ----- DatasetSplitting -----
+# The setting of the split shared by the text and image datasets
+datasetSplitSetting={
+    # Assign each product to a split by the hash of its ID instead of a random split
+    "stable":True,
+    # The proportion of test set within the whole dataset for the stable split
+    "testSize":0.33,
+    # Balance the proportion of test set within each label for the stable split
+    "stratify":False,
+    # The salt mixed into the hash, changing it gives a different stable split
+    "salt":"FacebookRankingSystem",
+    # The seed of the random split, None means a different split every run
+    "randomState":None
+}
+# File path of the persisted split of every product
+splitPath="./Data/Split.csv"
 
 # ----- TextProcessing -----
 # The setting of text dataset for simple regression model
@@ -33,9 +102,22 @@ textDatasetSetting={
     "testSize":0.33
 }
 
+# Keep the TFIDF features as sparse matrices instead of dense data frames
+sparseFeature=True
+# The number of worker processes used for fitting columns, 1 means fitting serially and None uses one per column
+textWorkerNumber=None
+
+# The number of product rows read at a time when the "hashing" vectorizers are fitted over chunks
+textChunkSize=100000
+
 # The setting of TFIDFVectorizer
 TFIDFVectorizerSetting={
-    # Only keep features with top frequencies
+    # "tfidf" builds a vocabulary, "hashing" hashes words into a fixed number of features
+    # and updates the IDF incrementally, so it could be fitted over chunks
+    "mode":"tfidf",
+    # The number of hashed features of each column in the "hashing" mode
+    "n_features":2**18,
+    # Only keep features with top frequencies, not used in the "hashing" mode
     "max_features":10000,
     # The lower threshold when building the vocabulary
     "min_df":0.01,
@@ -50,13 +132,171 @@ TFIDFVectorizerSetting={
 imageDatasetSetting={
     # The name of the column that contains loading paths
     "pathColumn":"path",
+    # The name of the column that contains row offsets within the memory-mapped store
+    "offsetColumn":"offset",
     # The name of the column that could be used as labels
     "targetColumn":"label",
     # The proportion of test set within the whole dataset
     "testSize":0.33
 }
 
+# The setting of the batched image loader
+imageLoaderSetting={
+    # The number of batches loaded ahead of the consumer
+    "prefetchNumber":2,
+    # The number of background threads loading batches
+    "workerNumber":2
+}
+
+# The setting of the reduced image features used instead of raw pixels
+imageFeatureSetting={
+    # "pca", "projection" or "downsample", None means using every pixel
+    "method":None,
+    # The number of reduced features
+    "componentNumber":256,
+    # The number of images loaded at a time when fitting and transforming
+    "batchSize":512
+}
+# The folder where all reduced image features are cached
+imageFeatureFolder="./Data/ImageFeature"
+
+# The setting of the image classification model
+classificationSetting={
+    # "full" fits a SVC on every image at once, "batch" trains a SGDClassifier one batch at a time
+    "mode":"full",
+    # The kernel coefficient of the SVC
+    "gamma":0.001,
+    # The number of images loaded at a time in the "batch" mode
+    "batchSize":256,
+    # The number of passes over the training set in the "batch" mode
+    "epoch":5,
+    # Standardise the pixels with the mean and standard deviation of the training set in the "batch" mode
+    "standardise":False
+}
+
+# ----- Prediction -----
+# File path of the fitted vectorizers and regression model used to predict prices
+pricePredictorPath="./Data/PricePredictor.joblib"
+# File path of the image classification model and its preprocessing used to predict categories
+categoryClassifierPath="./Data/CategoryClassifier.joblib"
+
+# ----- Pipeline -----
+# File path of the fingerprint recorded by the last successful run of each pipeline stage
+pipelineStatePath="./Data/PipelineState.json"
+# The number of independent pipeline stages that could run at the same time
+pipelineWorkerNumber=2
+# File path of the cached text features and fitted vectorizers used for training
+textFeaturePath="./Data/TextFeature.joblib"
+# File path of the classification report written by the classification stage
+classificationReportPath="./Data/ClassificationReport.txt"
+
+# ----- Benchmark -----
+# The setting of the benchmark over synthetic data
+benchmarkSetting={
+    # The number of synthetic products at each scale
+    "productNumber":[1000, 10000],
+    # The number of synthetic images per product, each attached to a random product
+    "imageRatio":0.1,
+    # The minimum and maximum width and height of the synthetic images
+    "imageSize":(200, 1200),
+    # The number of timed runs of each stage, the fastest one is recorded
+    "repeat":1,
+    # Run each stage once more while tracing the peak memory allocated by Python and numpy
+    "memory":True,
+    # The seed of the synthetic data so every version is measured on the same data
+    "seed":0,
+    # A stage slower than the previous version by more than this proportion is reported
+    "tolerance":0.2
+}
+# File path of the benchmark results of every version
+benchmarkResultPath="./Data/Benchmark.json"
 
+# ----- Instrumentation -----
+# The setting of the instrumentation that records the time, memory and IO of the main functions,
+# which could also be enabled by setting the environment variable FACEBOOK_RANKING_INSTRUMENT=1
+instrumentationSetting={
+    # Record every instrumented function, it has no cost when disabled
+    "enabled":False,
+    # Trace the peak memory allocated by Python and numpy within each function, which slows them down
+    "memory":True,
+    # The folder where the report of each run is saved
+    "reportFolder":"./Data/Report"
+}
 
+# ----- Retrieval -----
+# The setting of the similar product search
+retrievalSetting={
+    # The number of dimensions the TFIDF features of every product are reduced to
+    "componentNumber":128,
+    # The number of lists within the index, None means the square root of the number of products
+    "listNumber":None,
+    # The number of closest lists scored for each query
+    "probeNumber":8,
+    # The number of k-means iterations used to train the lists
+    "iteration":10,
+    # The size of the delta shard of new products relative to the main shard of the index
+    # beyond which they are merged and the main shard is rewritten
+    "mergeProportion":0.1,
+    # The weight of the mean reduced image features of every product, 0 means only using the text,
+    # otherwise imageFeatureSetting["method"] should be set
+    "imageWeight":0.0,
+    # The number of similar products returned for each query
+    "topNumber":10
+}
+# The folder of the similar product index
+productIndexFolder="./Data/ProductIndex"
 
+# ----- Serving -----
+# The setting of the local scoring server
+servingSetting={
+    # The address the server listens on
+    "host":"127.0.0.1",
+    # The port the server listens on
+    "port":8080,
+    # The maximum number of items scored together in a micro-batch
+    "maxBatchSize":64,
+    # The maximum number of seconds a request waits for others to join its micro-batch
+    "maxWait":0.005,
+    # The number of most recent requests the latency percentiles are computed over
+    "latencyWindow":10000
+}
+# The setting of the load test client of the scoring server
+loadTestSetting={
+    # "/price" or "/category"
+    "endpoint":"/price",
+    # The total number of requests sent
+    "requestNumber":2000,
+    # The number of products or images within each request
+    "itemNumber":1,
+    # The number of connections sending requests at the same time
+    "concurrency":32
+}
 
+# ----- Sweep -----
+# The setting of the hyperparameter sweep with successive halving
+sweepSetting={
+    # The grid of the regression model, the feature grid overrides TFIDFVectorizerSetting
+    # and the model grid is passed to Ridge
+    "regression":{
+        "featureGrid":{"max_features":[5000, 10000], "min_df":[0.001, 0.01], "max_df":[0.9]},
+        "modelGrid":{"alpha":[0.1, 1.0, 10.0]}
+    },
+    # The grid of the classification model, the feature grid overrides imageFeatureSetting
+    # and the model grid is passed to SVC
+    "classification":{
+        "featureGrid":{"method":["pca"], "componentNumber":[64, 256]},
+        "modelGrid":{"gamma":[0.0001, 0.001, 0.01], "C":[1.0, 10.0]}
+    },
+    # The proportion of the training set held out to score the candidates, the test set is never used
+    "validationSize":0.2,
+    # Only the best 1/reduction candidates of each round go on to the next round
+    "reduction":3,
+    # The minimum proportion of the training rows each candidate is fitted on in the first round
+    "minimumProportion":0.1,
+    # The number of worker processes fitting candidates, 1 means fitting serially and None uses one per core
+    "workerNumber":None,
+    # The seed of the validation split and the row order
+    "seed":0
+}
+# File path of the result table of the last sweep
+sweepResultPath="./Data/SweepResult.csv"
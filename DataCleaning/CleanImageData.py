@@ -1,13 +1,24 @@
+import hashlib
+import json
 import numpy as np
 import os
 import pandas as pd
 
-from Configuration import dataRange, imageFolder, imageInformationPath, imageLoadingPath, targetFolder, targetSize
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+from Configuration import dataRange, imageChunkSize, imageFastDecode, imageFolder, imageIncremental, imageInformationPath, imageLoadingPath, imageManifestPath, imageProgressInterval, imageStorageType, imageStoreFormat, imageStorePath, imageWorkerNumber, targetFolder, targetSize
 from DataLoading.TextLoading import loadProduct
+from functools import partial
+from Monitoring.Instrumentation import countRow, instrument
 from PIL import Image, ImageOps
 
+@instrument(count=lambda result: result)
 def cleanImage(imageFolder:str=imageFolder, targetFolder:str=targetFolder, targetSize:int=targetSize, dataRange:int=dataRange,
-               imageInformationPath:str=imageInformationPath, imageLoadingPath:str=imageLoadingPath):
+               imageInformationPath:str=imageInformationPath, imageLoadingPath:str=imageLoadingPath,
+               workerNumber:int=imageWorkerNumber, chunkSize:int=imageChunkSize, progressInterval:int=imageProgressInterval,
+               storeFormat:str=imageStoreFormat, storePath:str=imageStorePath,
+               incremental:bool=imageIncremental, manifestPath:str=imageManifestPath, storageType:str=imageStorageType,
+               fastDecode:bool=imageFastDecode):
     '''
         Clean every image in the given folder and store it
     to another place for further training
@@ -16,6 +27,7 @@ def cleanImage(imageFolder:str=imageFolder, targetFolder:str=targetFolder, targe
         1. The image id
         2. The numerical label
         3. The file path of the stored array
+        4. The row offset within the memory-mapped store if the "store" format is used
 
         Each image is cleaned by:
         1. Convert to grayscale if it's not
@@ -23,6 +35,25 @@ def cleanImage(imageFolder:str=imageFolder, targetFolder:str=targetFolder, targe
         3. Normalise the image and convert it to a np.ndarray
         4. Directly save the np.ndarray as a npy file
 
+        If the "uint8" storage type is used, step 3 keeps the raw pixels instead,
+    which takes a quarter of the space, and the normalisation is applied when the
+    images are loaded
+
+        If the fast decode is used, steps 1~2 are fused by decodeImage, which
+    decodes JPEG images straight to grayscale and pads images smaller than the
+    target dimension
+
+        If more than one worker is used, steps 1~3 are performed across a process
+    pool and the cleaned arrays are streamed back in the original order, so the
+    loading file is identical to the serial one
+
+        If the "store" format is used, step 4 writes every array into one preallocated
+    (N, targetSize, targetSize) npy file instead, which could be opened with np.memmap
+
+        If the incremental mode is used, a manifest of the source files and the cleaning
+    setting is kept so only new or changed images are cleaned, while the outputs of
+    deleted images are removed and the loading file is rewritten for the current images
+
     Argument:
         imageFolder: string, the folder where all images are stored
         targetFolder: string, the folder where all cleaned images are stored
@@ -30,19 +61,299 @@ def cleanImage(imageFolder:str=imageFolder, targetFolder:str=targetFolder, targe
         dataRange: int, the maximum range of the pixel
         imageInformationPath: string, file path of image information
         imageLoadingPath: string, file path of image loading information
+        workerNumber: int, the number of worker processes, 1 means cleaning serially
+                      and None uses every core
+        chunkSize: int, the number of images sent to a worker process at a time
+        progressInterval: int, report the progress every given number of cleaned images,
+                          0 means no progress is reported
+        storeFormat: str, "npy" saves one file per image and "store" saves a single memory-mapped array
+        storePath: str, file path of the single memory-mapped array
+        incremental: bool, only clean new or changed images, which requires the "npy" format
+        manifestPath: str, file path of the manifest recording every cleaned image
+        storageType: str, "float32" stores normalised pixels and "uint8" stores raw pixels
+        fastDecode: bool, decode JPEG images directly in grayscale and crop before any conversion
+
+    Return:
+        result: int, the number of cleaned images
     '''
+    if incremental and storeFormat=="store":
+        raise ValueError("Incremental cleaning requires the \"npy\" format")
+
     imageID, label=constructIDLabel(imageFolder, imageInformationPath)
-    targetPath=[targetFolder+"/"+imageID[i]+".npy" for i in range(len(imageID))]
+    sourcePath=[imageFolder+"/"+imageID[i]+".jpg" for i in range(len(imageID))]
+    cleanIndex=list(range(len(imageID)))
+
+    if storeFormat=="store":
+        targetPath=[storePath]*len(imageID)
+        offset=list(range(len(imageID)))
+        store=np.lib.format.open_memmap(storePath, mode="w+", dtype=storageType, shape=(len(imageID), targetSize, targetSize))
+    else:
+        targetPath=[targetFolder+"/"+imageID[i]+".npy" for i in range(len(imageID))]
+        offset=None
+        store=None
+
+    if incremental:
+        setting={"targetSize":targetSize, "dataRange":dataRange, "storageType":storageType, "fastDecode":fastDecode}
+        manifest=loadManifest(manifestPath)
+        cleanIndex, record=checkImageChange(imageID, sourcePath, targetPath, manifest, setting)
+        removeImageOutput(manifest, record, targetFolder)
+
+    imageArrayIterator=iterateCleanImage([sourcePath[i] for i in cleanIndex], targetSize, dataRange, workerNumber, chunkSize, storageType, fastDecode)
+    for count, (i, imageArray) in enumerate(zip(cleanIndex, imageArrayIterator)):
+        if store is None:
+            saveImage(targetPath[i], imageArray)
+        else:
+            store[i]=imageArray
+        reportProgress(count+1, len(cleanIndex), progressInterval)
+
+    if store is not None:
+        store.flush()
+
+    if incremental:
+        saveManifest(manifestPath, setting, record)
+    
+    constructImageLoading(imageID, label, targetPath, imageLoadingPath, offset)
+    return len(cleanIndex)
+
+def iterateCleanImage(sourcePath:list[str], targetSize:int, dataRange:int, workerNumber:int, chunkSize:int,
+                      storageType:str="float32", fastDecode:bool=False) -> Iterator[np.ndarray]:
+    '''
+        Yield the cleaned pixel array of every given image in order
+
+        If more than one worker is used, the images are cleaned across a
+    process pool and the results are streamed back in the original order
+
+    Argument:
+        sourcePath: list[str], contains the file path of each original image
+        targetSize: int, the uniform dimension of the square image for training
+        dataRange: int, the maximum range of the pixel
+        workerNumber: int, the number of worker processes, 1 means cleaning serially
+                      and None uses every core
+        chunkSize: int, the number of images sent to a worker process at a time
+        storageType: str, "float32" yields normalised pixels and "uint8" yields raw pixels
+        fastDecode: bool, decode JPEG images directly in grayscale and crop before any conversion
+
+    Return:
+        result: Iterator[np.ndarray], yields the cleaned pixel array of each image
+    '''
+    task=partial(processImage, targetSize=targetSize, dataRange=dataRange, storageType=storageType, fastDecode=fastDecode)
+
+    if workerNumber==1:
+        yield from map(task, sourcePath)
+    else:
+        with ProcessPoolExecutor(max_workers=workerNumber) as executor:
+            yield from executor.map(task, sourcePath, chunksize=chunkSize)
+
+@instrument(count=lambda result: 1)
+def processImage(imagePath:str, targetSize:int, dataRange:int, storageType:str="float32", fastDecode:bool=False) -> np.ndarray:
+    '''
+        Open a single image and return its cleaned pixel array
+
+        This function is kept at the module level so it could be sent
+    to the worker processes
+
+    Argument:
+        imagePath: str, the file path of the original image
+        targetSize: int, the uniform dimension of the square image for training
+        dataRange: int, the maximum range of the pixel
+        storageType: str, "float32" returns normalised pixels and "uint8" returns raw pixels
+        fastDecode: bool, decode JPEG images directly in grayscale and crop before any conversion
+
+    Return:
+        result: np.ndarray, array represents the cleaned image
+    '''
+    if fastDecode:
+        image=decodeImage(imagePath, targetSize)
+    else:
+        with Image.open(imagePath) as image:
+            image=grayImage(image)
+            image=cropImage(image, targetSize, targetSize)
+
+    if storageType=="uint8":
+        return np.asarray(image, dtype="uint8")
+
+    return normaliseImage(image, dataRange)
+
+@instrument(count=lambda result: 1)
+def saveImage(targetPath:str, imageArray:np.ndarray) -> str:
+    '''
+        Save the cleaned pixel array of a single image as a npy file
+
+    Argument:
+        targetPath: str, the file path of the cleaned image
+        imageArray: np.ndarray, array represents the cleaned image
+
+    Return:
+        result: str, the file path of the cleaned image
+    '''
+    np.save(targetPath, imageArray)
+    return targetPath
+
+@instrument(count=lambda result: 1)
+def decodeImage(imagePath:str, targetSize:int) -> Image:
+    '''
+        Decode the central part of the image in grayscale with
+    the target dimension in a single pass
+
+        JPEG images are put in draft mode so only the luma channel is
+    decoded, which skips the colour conversion entirely. The draft keeps
+    the original scale because the central part is cropped at the original
+    resolution. Other images are cropped first so only the central part is
+    converted to grayscale
+
+        The crop box uses integer coordinates rounded in the same way as
+    cropImage, and images smaller than the target dimension are centred
+    with black padding
+
+    Argument:
+        imagePath: str, the file path of the original image
+        targetSize: int, the uniform dimension of the square image for training
+
+    Return:
+        result: PIL.Image, the central cropped image in grayscale
+    '''
+    with Image.open(imagePath) as image:
+        if image.format=="JPEG" and image.mode!="L":
+            image.draft("L", image.size)
+
+        width, height=image.size
+        left=round((width-targetSize)/2)
+        top=round((height-targetSize)/2)
+
+        image=image.crop((left, top, left+targetSize, top+targetSize))
+        return grayImage(image)
+
+def loadManifest(manifestPath:str) -> dict:
+    '''
+        Load the manifest recorded by the last incremental cleaning
+
+        If there is no manifest yet, an empty one is returned so
+    every image would be cleaned
+
+    Argument:
+        manifestPath: str, file path of the manifest
+
+    Return:
+        result: dict, contains the cleaning setting and the record of every cleaned image
+    '''
+    if not os.path.exists(manifestPath):
+        return {"setting":{}, "image":{}}
+
+    with open(manifestPath) as file:
+        return json.load(file)
+
+def saveManifest(manifestPath:str, setting:dict, record:dict[str,dict]):
+    '''
+        Save the manifest of the current incremental cleaning
+
+        The manifest is written to a temporary file first so an interrupted
+    run never leaves a partial manifest behind
+
+    Argument:
+        manifestPath: str, file path of the manifest
+        setting: dict, the cleaning setting used by the current run
+        record: dict[str,dict], key=image ID, value=modification time, size and hash of the source file
+    '''
+    temporaryPath=manifestPath+".tmp"
+    with open(temporaryPath, "w") as file:
+        json.dump({"setting":setting, "image":record}, file)
+
+    os.replace(temporaryPath, manifestPath)
+
+def checkImageChange(imageID:list[str], sourcePath:list[str], targetPath:list[str], manifest:dict, setting:dict) -> tuple[list[int], dict[str,dict]]:
+    '''
+        Return the index of every image that needs to be cleaned and the
+    new record of all current images
+
+        An image needs to be cleaned if:
+        1. The cleaning setting has changed since the last run
+        2. It is new or its cleaned output is missing
+        3. Its modification time or size has changed and so has its content hash
+
+        The content hash is only computed when the modification time or size
+    has changed, so unchanged images only cost a single os.stat
+
+    Argument:
+        imageID: list[str], contains the unique ID for each image
+        sourcePath: list[str], contains the file path of each original image
+        targetPath: list[str], contains the file path of each cleaned image
+        manifest: dict, the manifest recorded by the last incremental cleaning
+        setting: dict, the cleaning setting used by the current run
+
+    Return:
+        cleanIndex: list[int], the index of every image that needs to be cleaned
+        record: dict[str,dict], key=image ID, value=modification time, size and hash of the source file
+    '''
+    previous=manifest["image"] if manifest["setting"]==setting else {}
+    cleanIndex=[]
+    record={}
 
     for i in range(len(imageID)):
-        image=Image.open(imageFolder+"/"+imageID[i]+".jpg")
-        image=grayImage(image)
-        image=cropImage(image, targetSize, targetSize)
-        imageArray=normaliseImage(image, dataRange)
+        status=os.stat(sourcePath[i])
+        entry=previous.get(imageID[i])
+        current={"mtime":status.st_mtime_ns, "size":status.st_size}
 
-        np.save(targetPath[i], imageArray)
-    
-    constructImageLoading(imageID, label, targetPath, imageLoadingPath)
+        if entry is not None and os.path.exists(targetPath[i]):
+            if entry["mtime"]==current["mtime"] and entry["size"]==current["size"]:
+                record[imageID[i]]=entry
+                continue
+
+            current["hash"]=hashFile(sourcePath[i])
+            if entry["hash"]==current["hash"]:
+                record[imageID[i]]=current
+                continue
+        else:
+            current["hash"]=hashFile(sourcePath[i])
+
+        cleanIndex.append(i)
+        record[imageID[i]]=current
+
+    return cleanIndex, record
+
+def removeImageOutput(manifest:dict, record:dict[str,dict], targetFolder:str):
+    '''
+        Remove the cleaned outputs of images which were cleaned by the
+    last run but are no longer present or labelled
+
+    Argument:
+        manifest: dict, the manifest recorded by the last incremental cleaning
+        record: dict[str,dict], the new record of all current images
+        targetFolder: string, the folder where all cleaned images are stored
+    '''
+    for ID in manifest["image"]:
+        if ID not in record and os.path.exists(targetFolder+"/"+ID+".npy"):
+            os.remove(targetFolder+"/"+ID+".npy")
+
+def hashFile(filePath:str) -> str:
+    '''
+        Return the SHA-1 hash of the file content
+
+    Argument:
+        filePath: str, the file path of the file to hash
+
+    Return:
+        result: str, the hexadecimal hash of the file content
+    '''
+    result=hashlib.sha1()
+    with open(filePath, "rb") as file:
+        for block in iter(lambda: file.read(1<<20), b""):
+            result.update(block)
+
+    return result.hexdigest()
+
+def reportProgress(count:int, total:int, progressInterval:int):
+    '''
+        Print the cleaning progress every given number of images
+    and when the last image has been cleaned
+
+    Argument:
+        count: int, the number of images that have been cleaned
+        total: int, the total number of images to clean
+        progressInterval: int, report the progress every given number of cleaned images,
+                          0 means no progress is reported
+    '''
+    if progressInterval>0 and (count%progressInterval==0 or count==total):
+        print("Cleaned images: ", str(count)+"/"+str(total))
 
 def constructIDLabel(imageFolder:str, imageInformationPath:str) -> tuple[list[str], list[int]]:
     '''
@@ -70,6 +381,7 @@ def constructImageID(imageFolder:str) -> list[str]:
     imageList=sorted(os.listdir(imageFolder))
     return [path[:-4] for path in imageList]
 
+@instrument(count=countRow)
 def constructLabel(imageID:list[str], imageInformationPath:str) -> list[int]:
     '''
         Return a list of labels for the given image ID
@@ -81,31 +393,33 @@ def constructLabel(imageID:list[str], imageInformationPath:str) -> list[int]:
     Return:
         label: list[int], contains corresponding labels
     '''
-    product=loadProduct()
-    imageInformation=pd.read_csv(imageInformationPath)
+    product=loadProduct(columns=["id", "label"])
+    imageInformation=pd.read_csv(imageInformationPath, usecols=["id", "product_id"])
     
-    return [checkLabel(ID, product, imageInformation) for ID in imageID]
+    return matchLabel(imageID, product, imageInformation).tolist()
 
-def checkLabel(imageID:str, product:pd.DataFrame, imageInformation:pd.DataFrame) -> int:
+def matchLabel(imageID:list[str], product:pd.DataFrame, imageInformation:pd.DataFrame) -> pd.Series:
     '''
-        Check and return the corresponding label according to the category information
-    of the image
+        Match the label of every image at once according to the category information
+    of their products
 
-        If the label can't be found, return "-1" instead
+        Both tables are indexed by ID so every image is joined through
+    id -> product_id -> label with hash lookups instead of scanning the
+    tables per image. If a label can't be found, "-1" is used instead
 
     Argument:
-        imageID: string, the unique ID of the image
+        imageID: list[str], contains the unique ID for each image
         product: pd.DataFrame, the product information after adding labels
         imageInformation: pd.DataFrame, contains the corresponding product ID information
     
     Return:
-        result: int, the corresponding label of the image according to the category
+        result: pd.Series, the corresponding label of each image according to the category
     '''
-    try:
-        productID=imageInformation.loc[imageInformation["id"]==imageID, "product_id"].values[0]
-        return product.loc[product["id"]==productID, "label"].values[0]
-    except:
-        return -1
+    productID=imageInformation.drop_duplicates("id").set_index("id")["product_id"]
+    productLabel=product.drop_duplicates("id").set_index("id")["label"]
+
+    label=pd.Series(imageID, dtype="object").map(productID).map(productLabel)
+    return label.fillna(-1).astype("int64")
 
 def cleanLabel(imageID:list[str], label:list[int]) -> tuple[list[str], list[int]]:
     '''
@@ -146,7 +460,7 @@ def cropImage(image:Image, targetWidth:int, targetHeight:int) -> Image:
         Crop the central part of the image with the target dimension
 
         This function assumes that the input image is larger than the
-    target dimension
+    target dimension, otherwise the area outside the image is black
 
     Argument:
         image: PIL.Image, the image in grayscale
@@ -180,15 +494,21 @@ def normaliseImage(image:Image, dataRange:int) -> np.ndarray:
     result=np.array(image).astype("float32")
     return result/dataRange
 
-def constructImageLoading(imageID:list[str], label:list[int], filePath:list[str], imageLoadingPath:str):
+@instrument()
+def constructImageLoading(imageID:list[str], label:list[int], filePath:list[str], imageLoadingPath:str, offset:list[int]=None):
     '''
         Save a loading list of images which contains all file paths and their corresponding labels
 
+        If the images are saved in a single memory-mapped store, the row offset
+    of each image is saved as well
+
     Argument:
         imageID: list[str], contains the unique ID for each image
         label: list[int], contains corresponding labels of images
         filePath: list[str], contains corresponding file path for loading the image
         imageLoadingPath: str, file path of image loading information
+        offset: list[int], contains the corresponding row offset within the store, None if
+                every image is saved separately
     '''
     imageLoading=pd.DataFrame({
         "id":imageID,
@@ -196,4 +516,7 @@ def constructImageLoading(imageID:list[str], label:list[int], filePath:list[str]
         "path":filePath
     })
 
+    if offset is not None:
+        imageLoading["offset"]=offset
+
     imageLoading.to_csv(imageLoadingPath, index=False)
\ No newline at end of file
@@ -1,8 +1,15 @@
+import json
+import numpy as np
+import os
 import pandas as pd
 
-from Configuration import lineTerminator, cleanProductName, productPath, cleanProductPath
+from Configuration import categoryRelationPath, cleanProductFormat, lineTerminator, cleanProductName, productChunkSize, productPath, cleanProductPath
+from DataLoading.TextLoading import constructProductPath
+from Monitoring.Instrumentation import countRow, instrument
 
-def cleanProduct(productPath:str=productPath, lineterminator:str=lineTerminator, cleanProductName:str=cleanProductName, cleanProductPath:str=cleanProductPath):
+@instrument(count=lambda result: result)
+def cleanProduct(productPath:str=productPath, lineterminator:str=lineTerminator, cleanProductName:str=cleanProductName, cleanProductPath:str=cleanProductPath,
+                 chunkSize:int=productChunkSize, categoryRelationPath:str=categoryRelationPath, cleanProductFormat:str=cleanProductFormat):
     '''
         Clean the product csv file and save the result to the
     target position
@@ -12,6 +19,19 @@ def cleanProduct(productPath:str=productPath, lineterminator:str=lineTerminator,
         2. Format the column "Price" so each value is a float without symbol
         3. Add an extra column "Label" representing the numerical label of the
            highest-level category information
+
+        If a chunk size is given, the file is streamed in chunks of that many rows
+    and each cleaned chunk is appended to the output, so the peak memory doesn't
+    depend on the file size. The relation between categories and labels grows
+    incrementally across chunks, which gives the same labels as reading the file
+    at once, and is saved alongside the output
+
+        The relation saved by the previous run is loaded first and only new
+    categories get new labels, so the labels of saved models and the category
+    names they map to stay the same after the data is refreshed
+
+        The output could be saved as "parquet" or "feather" instead of "csv", so
+    loading it later doesn't need to parse text and could read selected columns only
     
     Argument:
         productPath: string, the file path to the product data file
@@ -19,48 +39,121 @@ def cleanProduct(productPath:str=productPath, lineterminator:str=lineTerminator,
                         in the csv file
         cleanProductName: string, the name of the processed product information
         cleanProductPath: string, file path of processed product information
+        chunkSize: int, the number of rows read at a time, None means reading the whole file at once
+        categoryRelationPath: string, file path of the relation between categories and labels
+        cleanProductFormat: string, the file format of processed product information,
+                            "csv", "parquet" or "feather"
+
+    Return:
+        result: int, the number of cleaned products
+    '''
+    filePath=constructProductPath(cleanProductName, cleanProductPath, cleanProductFormat)
+    writer=None
+
+    if chunkSize is None:
+        chunk=[pd.read_csv(productPath, lineterminator=lineterminator)]
+    else:
+        chunk=pd.read_csv(productPath, lineterminator=lineterminator, chunksize=chunkSize)
+
+    relation=loadRelation(categoryRelationPath)
+    result=0
+    for i, dataFrame in enumerate(chunk):
+        dataFrame=dataFrame.drop("Unnamed: 0", axis=1)
+        dataFrame["price"]=formatPrice(dataFrame["price"])
+        dataFrame=addLabel(dataFrame, relation)
+        result+=len(dataFrame)
+
+        if cleanProductFormat=="csv":
+            dataFrame.to_csv(filePath, index=False, lineterminator=lineterminator, mode="w" if i==0 else "a", header=i==0)
+        else:
+            writer=writeColumnar(dataFrame, filePath, cleanProductFormat, writer)
+
+    if writer is not None:
+        writer[0].close()
+
+    saveRelation(relation, categoryRelationPath)
+    return result
+
+def writeColumnar(dataFrame:pd.DataFrame, filePath:str, fileFormat:str, writer:tuple=None) -> tuple:
     '''
-    dataFrame=pd.read_csv(productPath, lineterminator=lineterminator)
+        Append the data frame to a columnar file, opening the file
+    with the schema of the first chunk if it hasn't been opened yet
 
-    dataFrame=dataFrame.drop("Unnamed: 0", axis=1)
-    dataFrame["price"]=dataFrame["price"].apply(formatPrice)
-    dataFrame=addLabel(dataFrame)
+        Feather files are written as Arrow IPC files, which is the
+    format read by pd.read_feather
 
-    dataFrame.to_csv(cleanProductPath+"/"+cleanProductName+".csv", index=False, line_terminator=lineterminator)
+    Argument:
+        dataFrame: pd.DataFrame, the cleaned chunk of product information
+        filePath: string, file path of processed product information
+        fileFormat: string, "parquet" or "feather"
+        writer: tuple, the opened file writer and its schema, None for the first chunk
 
-def formatPrice(price:str) -> float:
+    Return:
+        result: tuple, the opened file writer and its schema
     '''
-        Format the price and return it as a float
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if writer is None:
+        schema=pa.Schema.from_pandas(dataFrame, preserve_index=False)
+        writer=(pq.ParquetWriter(filePath, schema) if fileFormat=="parquet" else pa.ipc.new_file(filePath, schema), schema)
+
+    writer[0].write_table(pa.Table.from_pandas(dataFrame, schema=writer[1], preserve_index=False))
+    return writer
 
-        Generally the price is in the format: £xxx,xxx.xxx
+@instrument(count=countRow)
+def formatPrice(price:pd.Series) -> pd.Series:
+    '''
+        Format the price column and return it as floats
+
+        Generally the price is in the format: £xxx,xxx.xxx, so the leading
+    currency symbol is sliced off and all thousands separators are removed
+    before the conversion, which gives the same correctly rounded value as
+    float() on the remaining digits. The string operations and the conversion
+    run within pyarrow if it's installed, otherwise the digits are converted
+    by numpy
     
     Argument:
-        price: string, the price information with currency symbol
+        price: pd.Series, the price information with currency symbol
     
     Return:
-        result: float, the price information as float
+        result: pd.Series, the price information as float
     '''
-    if "," not in price:
-        return float(price[1:])
-    else:
-        digit=price[1:].split(",")
-        digit=[float(digit[i])*1000**(len(digit)-1-i) for i in range(len(digit))]
-        return sum(digit)
-
-def addLabel(dataFrame:pd.DataFrame) -> pd.DataFrame:
+    try:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+    except ImportError:
+        digit=price.str.slice(1).str.replace(",", "", regex=False)
+        return pd.Series(np.array(digit.to_numpy(dtype="object"), dtype="float64"), index=price.index, name=price.name)
+
+    digit=pc.replace_substring(pc.utf8_slice_codeunits(pa.array(price), 1), ",", "")
+    return pd.Series(pc.cast(digit, pa.float64()).to_numpy(zero_copy_only=False), index=price.index, name=price.name)
+
+@instrument(count=countRow)
+def addLabel(dataFrame:pd.DataFrame, relation:dict[str,int]=None) -> pd.DataFrame:
     '''
         Add an extra column of numerical labels which
     represents the highest level category information of
     a product to the product information
 
+        The original categories are factorized first so only the distinct
+    ones are formatted and mapped through the relation. If an existing relation
+    is given, it is updated in place with any new category so labels stay stable
+    across chunks
+
     Argument:
         dataFrame: pd.DataFrame, the product information after cleaning
+        relation: dict[str,int], key=distinct high-level categories, value=correspondig numerical label
     
     Return:
         result; pd.DataFrame, the product information with additional labels
     '''
-    relation=constructRelation(dataFrame["category"])
-    dataFrame["label"]=dataFrame["category"].apply(lambda category: relation[formatCategory(category)])
+    originalCode, originalUnique=pd.factorize(dataFrame["category"], use_na_sentinel=False)
+    code, unique=pd.factorize(formatCategory(pd.Series(originalUnique)), use_na_sentinel=False)
+    relation=updateRelation({} if relation is None else relation, unique)
+
+    label=np.array([relation[category] for category in unique], dtype="int64")
+    dataFrame["label"]=label[code][originalCode]
 
     return dataFrame
 
@@ -75,30 +168,69 @@ def constructRelation(column:pd.Series) -> dict[str,int]:
     Return:
         result: dict[str,int], key=distinct high-level categories, value=correspondig numerical label
     '''
-    result={}
-    label=0
+    _, originalUnique=pd.factorize(column, use_na_sentinel=False)
+    _, unique=pd.factorize(formatCategory(pd.Series(originalUnique)), use_na_sentinel=False)
+    return updateRelation({}, unique)
 
-    column=[formatCategory(category) for category in column]
-    for category in column:
-        if category not in result:
-            result[category]=label
-            label+=1
+def updateRelation(relation:dict[str,int], unique:pd.Index) -> dict[str,int]:
+    '''
+        Add every new high-level category to the relation with the
+    next numerical label after the largest one, in the order they first appear
 
-    return result
+    Argument:
+        relation: dict[str,int], key=distinct high-level categories, value=correspondig numerical label
+        unique: pd.Index, the distinct high-level categories in the order they first appear
+    
+    Return:
+        result: dict[str,int], the updated relation
+    '''
+    for category in unique:
+        if category not in relation:
+            relation[category]=max(relation.values(), default=-1)+1
+
+    return relation
+
+def loadRelation(categoryRelationPath:str) -> dict[str,int]:
+    '''
+        Load the relation between high-level categories and numerical
+    labels saved by saveRelation, empty if it doesn't exist yet
+
+    Argument:
+        categoryRelationPath: string, file path of the relation between categories and labels
+
+    Return:
+        result: dict[str,int], key=distinct high-level categories, value=correspondig numerical label
+    '''
+    if not os.path.exists(categoryRelationPath):
+        return {}
+
+    with open(categoryRelationPath) as file:
+        return json.load(file)
+
+def saveRelation(relation:dict[str,int], categoryRelationPath:str):
+    '''
+        Save the relation between high-level categories and numerical
+    labels as a json file
+
+    Argument:
+        relation: dict[str,int], key=distinct high-level categories, value=correspondig numerical label
+        categoryRelationPath: string, file path of the relation between categories and labels
+    '''
+    with open(categoryRelationPath, "w") as file:
+        json.dump(relation, file, indent=4)
 
-def formatCategory(category:str) -> str:
+def formatCategory(category:pd.Series) -> pd.Series:
     '''
         Extract the highest level of category from
     the original category information
     
     Argument:
-        category: str, the original category information
+        category: pd.Series, the original category information
     
     Return:
-        result: str, the highest category information
+        result: pd.Series, the highest category information
     '''
-    result=category.split("/")
-    return result[0].strip(" ")
+    return category.str.split("/", n=1).str[0].str.strip(" ")
 
 def mapLabel(category:str, relation:dict[str,int]) -> int:
     '''
@@ -0,0 +1,234 @@
+import numpy as np
+import pandas as pd
+import re
+import scipy.sparse as sp
+import zlib
+
+from collections.abc import Callable
+from Configuration import deduplicationSetting, imageDuplicatePath, imageLoadingPath, productDuplicatePath
+from DataLoading.ImageBatchLoading import ImageBatchLoader
+from DataLoading.ImageLoading import loadImageLoading
+from DataLoading.TextLoading import loadProduct
+from DataProcessing.ImageProcessing import selectOffset
+from Monitoring.Instrumentation import countRow, instrument
+from scipy.sparse.csgraph import connected_components
+
+# The prime modulus of the MinHash permutations
+minhashPrime=(1<<31)-1
+
+@instrument(count=countRow)
+def deduplicateProduct(deduplicationSetting:dict=deduplicationSetting, productDuplicatePath:str=productDuplicatePath) -> pd.DataFrame:
+    '''
+        Find the clusters of near-duplicate products by their name and
+    description, save them and optionally collapse every cluster to its
+    first product
+
+        Every product is described by the MinHash signature of its word
+    shingles, and only the products sharing a LSH band are compared, so the
+    time grows with the number of products instead of the number of pairs
+
+        The detection always runs on every processed product. If the clusters
+    are collapsed, loadProduct leaves out the other products of every cluster
+    by the saved clusters, so the images of those products get no label and
+    are skipped by cleanImage, and the copies can't leak across the training
+    and test sets. The processed product information itself is never rewritten,
+    so the dropped products come back once collapsing is turned off
+
+    Argument:
+        deduplicationSetting: dict, the setting of the near-duplicate detection
+        productDuplicatePath: str, file path of the near-duplicate product clusters
+
+    Return:
+        result: pd.DataFrame, the ID of every duplicated product and the ID of
+                the first product within its cluster
+    '''
+    product=loadProduct(collapse=False)
+    text=product["product_name"].fillna("")+" "+product["product_description"].fillna("")
+
+    signature=computeMinHash(text, deduplicationSetting["shingleSize"], deduplicationSetting["permutationNumber"], deduplicationSetting["seed"])
+    key=constructBandKey(signature, deduplicationSetting["bandNumber"])
+    threshold=deduplicationSetting["textThreshold"]
+    cluster=clusterCandidate(key, lambda i, j: (signature[i]==signature[j]).mean(axis=1)>=threshold)
+
+    return saveCluster(product["id"], cluster, productDuplicatePath)
+
+@instrument(count=countRow)
+def deduplicateImage(deduplicationSetting:dict=deduplicationSetting, imageDuplicatePath:str=imageDuplicatePath,
+                     imageLoadingPath:str=imageLoadingPath) -> pd.DataFrame:
+    '''
+        Find the clusters of near-duplicate images by the perceptual hash
+    of their cleaned arrays, save them and optionally collapse every cluster
+    to its first image
+
+        Two images are near-duplicates if their difference hashes differ in at
+    most the given number of bits. The hash is split into one more band than that
+    number, so every such pair shares at least one band exactly and only the
+    images sharing a band are compared
+
+        The detection always runs on every cleaned image. If the clusters
+    are collapsed, loadImageLoading leaves out the other images of every
+    cluster by the saved clusters, so they are neither split nor used for
+    training, while the image loading file itself is never rewritten
+
+    Argument:
+        deduplicationSetting: dict, the setting of the near-duplicate detection
+        imageDuplicatePath: str, file path of the near-duplicate image clusters
+        imageLoadingPath: str, file path of image loading information
+
+    Return:
+        result: pd.DataFrame, the ID of every duplicated image and the ID of
+                the first image within its cluster
+    '''
+    imageLoading=loadImageLoading(imageLoadingPath, collapse=False)
+    loader=ImageBatchLoader(imageLoading["path"], selectOffset(imageLoading, imageLoading["path"]), batchSize=1024)
+    side=int(np.sqrt(loader.featureNumber))
+
+    bit=np.concatenate([computeDifferenceHash(batch, side, deduplicationSetting["hashSize"]) for batch, _ in loader])
+    key=np.stack([(band.astype("uint64")<<np.arange(band.shape[1], dtype="uint64")).sum(axis=1)
+                  for band in np.array_split(bit, deduplicationSetting["imageDistance"]+1, axis=1)], axis=1)
+    cluster=clusterCandidate(key, lambda i, j: (bit[i]!=bit[j]).sum(axis=1)<=deduplicationSetting["imageDistance"])
+
+    return saveCluster(imageLoading["id"], cluster, imageDuplicatePath)
+
+def computeMinHash(text:pd.Series, shingleSize:int, permutationNumber:int, seed:int) -> np.ndarray:
+    '''
+        Return the MinHash signature of the word shingles of every text
+
+        Every shingle is hashed with CRC32 so the signatures are the same
+    across runs, and each permutation is a random linear hash modulo a
+    Mersenne prime, whose minimum within every text is found at once with
+    np.minimum.reduceat. Texts without any shingle get a signature unique
+    to themselves, so they never match anything
+
+    Argument:
+        text: pd.Series, the text of every item
+        shingleSize: int, the number of words within each shingle
+        permutationNumber: int, the number of hash permutations
+        seed: int, the seed of the hash permutations
+
+    Return:
+        result: np.ndarray, the (N, permutationNumber) MinHash signature of every text
+    '''
+    shingle=[]
+    length=np.zeros(len(text), dtype="int64")
+
+    for i, item in enumerate(text):
+        word=re.findall(r"\w+", item.lower())
+        gram={" ".join(word[start:start+shingleSize]) for start in range(max(len(word)-shingleSize+1, 1 if word else 0))}
+        shingle.extend(zlib.crc32(value.encode()) for value in gram)
+        length[i]=len(gram)
+
+    value=np.array(shingle, dtype="uint64")
+    start=np.concatenate([[0], np.cumsum(length)[:-1]])
+    empty=length==0
+
+    random=np.random.default_rng(seed)
+    a=random.integers(1, minhashPrime, permutationNumber, dtype="uint64")
+    b=random.integers(0, minhashPrime, permutationNumber, dtype="uint64")
+    result=np.empty((len(text), permutationNumber), dtype="uint64")
+
+    for i in range(permutationNumber):
+        if len(value)>0:
+            result[~empty, i]=np.minimum.reduceat((a[i]*value+b[i])%minhashPrime, start[~empty])
+        result[empty, i]=minhashPrime+np.flatnonzero(empty).astype("uint64")
+
+    return result
+
+def computeDifferenceHash(batch:np.ndarray, side:int, hashSize:int) -> np.ndarray:
+    '''
+        Return the bits of the difference hash of every flattened image
+
+        Every image is averaged into hashSize rows and hashSize+1 columns of
+    blocks, and each bit tells whether a block is brighter than its right
+    neighbour, which is robust to rescaling, compression and brightness changes
+
+    Argument:
+        batch: np.ndarray, the flattened square images
+        side: int, the side length of each image
+        hashSize: int, the number of rows and bits per row of the hash
+
+    Return:
+        result: np.ndarray, the (N, hashSize*hashSize) boolean bits of every image
+    '''
+    image=batch.reshape(len(batch), side, side)
+    rowEdge=np.linspace(0, side, hashSize+1).astype("int64")
+    columnEdge=np.linspace(0, side, hashSize+2).astype("int64")
+
+    block=np.add.reduceat(np.add.reduceat(image, rowEdge[:-1], axis=1), columnEdge[:-1], axis=2)
+    block/=np.diff(rowEdge)[:, None]*np.diff(columnEdge)[None, :]
+    return (block[:, :, 1:]>block[:, :, :-1]).reshape(len(batch), -1)
+
+def constructBandKey(signature:np.ndarray, bandNumber:int) -> np.ndarray:
+    '''
+        Split every MinHash signature into bands and hash each band
+    into a single key
+
+    Argument:
+        signature: np.ndarray, the (N, permutationNumber) MinHash signature of every text
+        bandNumber: int, the number of bands
+
+    Return:
+        result: np.ndarray, the (N, bandNumber) key of every band
+    '''
+    multiplier=np.random.default_rng(0).integers(1, 1<<63, signature.shape[1], dtype="uint64")|np.uint64(1)
+    return np.stack([(band*multiplier[:band.shape[1]]).sum(axis=1) for band in np.array_split(signature, bandNumber, axis=1)], axis=1)
+
+def clusterCandidate(key:np.ndarray, verify:Callable[[np.ndarray, np.ndarray], np.ndarray]) -> np.ndarray:
+    '''
+        Group the items into clusters of near-duplicates
+
+        Within every band, the items sharing a key are compared with the
+    first item holding that key, and the verified pairs are joined into
+    clusters as the connected components of the resulting graph
+
+    Argument:
+        key: np.ndarray, the (N, bandNumber) key of every band of every item
+        verify: Callable, returns whether each pair of items given by two index
+                arrays are near-duplicates
+
+    Return:
+        result: np.ndarray, the cluster of every item, numbered by the first item within it
+    '''
+    number=len(key)
+    first=[]
+    second=[]
+
+    for band in key.T:
+        _, index, inverse=np.unique(band, return_index=True, return_inverse=True)
+        representative=index[inverse]
+        candidate=np.flatnonzero(representative!=np.arange(number))
+
+        if len(candidate)>0:
+            accepted=candidate[verify(representative[candidate], candidate)]
+            first.append(representative[accepted])
+            second.append(accepted)
+
+    first=np.concatenate(first) if first else np.empty(0, dtype="int64")
+    second=np.concatenate(second) if second else np.empty(0, dtype="int64")
+    graph=sp.coo_matrix((np.ones(len(first), dtype="int8"), (first, second)), shape=(number, number))
+    _, component=connected_components(graph, directed=False)
+
+    minimum=np.full(component.max()+1 if number>0 else 0, number, dtype="int64")
+    np.minimum.at(minimum, component, np.arange(number))
+    return minimum[component]
+
+def saveCluster(ID:pd.Series, cluster:np.ndarray, duplicatePath:str) -> pd.DataFrame:
+    '''
+        Save every item within a cluster of more than one item together
+    with the ID of the first item of its cluster
+
+    Argument:
+        ID: pd.Series, the unique ID of every item
+        cluster: np.ndarray, the cluster of every item, numbered by the first item within it
+        duplicatePath: str, file path of the near-duplicate clusters
+
+    Return:
+        result: pd.DataFrame, the ID of every duplicated item and the ID of
+                the first item within its cluster
+    '''
+    ID=ID.to_numpy()
+    duplicated=np.bincount(cluster, minlength=len(cluster))[cluster]>1
+
+    result=pd.DataFrame({"id":ID[duplicated], "cluster":ID[cluster[duplicated]]})
+    result.to_csv(duplicatePath, index=False)
+    return result
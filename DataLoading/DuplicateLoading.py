@@ -0,0 +1,47 @@
+import os
+import pandas as pd
+
+from Configuration import deduplicationSetting
+
+def loadCollapsedID(duplicatePath:str, collapse:bool=None, deduplicationSetting:dict=deduplicationSetting) -> pd.Series|None:
+    '''
+        Return the ID of the items collapsed into the first item of
+    their near-duplicate cluster, which should be left out when loading
+
+        The cleaned data is never rewritten, so turning collapsing off or
+    changing the detection brings the dropped items back once the clusters
+    are detected again
+
+    Argument:
+        duplicatePath: str, file path of the near-duplicate clusters
+        collapse: bool, whether the clusters are collapsed, None means they are
+                  if the deduplication is enabled with collapsing
+        deduplicationSetting: dict, the setting of the near-duplicate detection
+
+    Return:
+        result: pd.Series|None, the ID of every collapsed item, None if nothing is collapsed
+    '''
+    if collapse is None:
+        collapse=deduplicationSetting["enabled"] and deduplicationSetting["collapse"]
+
+    if not collapse or not os.path.exists(duplicatePath):
+        return None
+
+    duplicate=pd.read_csv(duplicatePath)
+    return duplicate.loc[duplicate["id"]!=duplicate["cluster"], "id"]
+
+def dropCollapsed(dataFrame:pd.DataFrame, collapsedID:pd.Series|None) -> pd.DataFrame:
+    '''
+        Leave out the collapsed items of the data frame by their "id" column
+
+    Argument:
+        dataFrame: pd.DataFrame, the data frame that contains the column "id"
+        collapsedID: pd.Series|None, the ID of every collapsed item, None if nothing is collapsed
+
+    Return:
+        result: pd.DataFrame, the data frame without the collapsed items
+    '''
+    if collapsedID is None:
+        return dataFrame
+
+    return dataFrame.loc[~dataFrame["id"].isin(collapsedID)].reset_index(drop=True)
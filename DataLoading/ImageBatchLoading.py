@@ -0,0 +1,160 @@
+import numpy as np
+import pandas as pd
+
+from collections import deque
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from Configuration import dataRange, imageLoaderSetting, targetSize
+from Monitoring.Instrumentation import countRow, instrument
+
+class ImageBatchLoader:
+    '''
+        Iterate over an image dataset in fixed-size batches of
+    flattened images and their labels
+
+        Every batch is loaded into one of a few preallocated buffers by a
+    background thread pool, which prefetches the next batches while the
+    current one is being consumed. The yielded images are views into the
+    reused buffers, so a batch is only valid until the next batch is
+    requested and should be copied if it needs to be kept longer
+
+        The images could be loaded either from separate npy files or from
+    the memory-mapped store if offsets are given. Images stored as raw uint8
+    pixels are normalised in the buffer, and the pixels could be standardised
+    with the given mean and standard deviation as well. An empty dataset yields
+    no batch and has the number of features of a cleaned image
+    '''
+    def __init__(self, datasetPath:pd.Series, datasetOffset:pd.Series=None, label:np.ndarray=None, batchSize:int=256, shuffle:bool=False,
+                 prefetchNumber:int=imageLoaderSetting["prefetchNumber"], workerNumber:int=imageLoaderSetting["workerNumber"], seed:int=None,
+                 dataRange:int=dataRange, mean:float=None, std:float=None):
+        '''
+        Argument:
+            datasetPath: pd.Series, the data series that all paths within a dataset
+            datasetOffset: pd.Series, the data series that contains all offsets within a dataset,
+                           None if every image is saved separately
+            label: np.ndarray, the corresponding labels of the dataset, None if there is no label
+            batchSize: int, the number of images in each batch
+            shuffle: bool, visit the images in a new random order on every iteration
+            prefetchNumber: int, the number of batches loaded ahead of the consumer
+            workerNumber: int, the number of background threads loading batches
+            seed: int, the seed of the random order, None means a different order every run
+            dataRange: int, the maximum range of the pixel, used to normalise raw uint8 pixels
+            mean: float, the mean pixel of the dataset to subtract, None means no standardisation
+            std: float, the standard deviation of pixels to divide by, None means no standardisation
+        '''
+        self.datasetPath=datasetPath.to_numpy()
+        self.datasetOffset=None if datasetOffset is None else datasetOffset.to_numpy()
+        self.label=label
+        self.batchSize=batchSize
+        self.shuffle=shuffle
+        self.prefetchNumber=prefetchNumber
+        self.workerNumber=workerNumber
+        self.random=np.random.default_rng(seed)
+        self.dataRange=dataRange
+        self.mean=mean
+        self.std=std
+
+        if len(self.datasetPath)==0:
+            self.store=None
+            self.featureNumber=targetSize*targetSize
+            self.rawPixel=False
+        elif self.datasetOffset is None:
+            sample=np.load(self.datasetPath[0], mmap_mode="r")
+            self.store=None
+            self.featureNumber=sample.size
+            self.rawPixel=sample.dtype==np.uint8
+        else:
+            store=np.load(self.datasetPath[0], mmap_mode="r")
+            self.store=store.reshape(len(store), -1)
+            self.featureNumber=self.store.shape[1]
+            self.rawPixel=self.store.dtype==np.uint8
+
+    def __len__(self) -> int:
+        '''
+            Return the number of batches in one pass over the dataset
+        '''
+        return (len(self.datasetPath)+self.batchSize-1)//self.batchSize
+
+    def __iter__(self) -> Iterator[tuple[np.ndarray, np.ndarray]]:
+        '''
+            Yield every batch of images and labels in one pass over the dataset
+
+            There is one buffer more than the number of prefetched batches, so
+        the buffer of the current batch is only reused once the consumer has
+        asked for the next batch
+        '''
+        order=self.random.permutation(len(self.datasetPath)) if self.shuffle else np.arange(len(self.datasetPath))
+        index=[order[start:start+self.batchSize] for start in range(0, len(order), self.batchSize)]
+        buffer=[np.empty((self.batchSize, self.featureNumber), dtype="float32") for _ in range(min(self.prefetchNumber+1, len(index)))]
+
+        with ThreadPoolExecutor(max_workers=self.workerNumber) as executor:
+            pending=deque(executor.submit(self.loadBatch, index[i], buffer[i]) for i in range(len(buffer)))
+
+            for i in range(len(buffer), len(index)+len(buffer)):
+                yield pending.popleft().result()
+
+                if i<len(index):
+                    pending.append(executor.submit(self.loadBatch, index[i], buffer[i%len(buffer)]))
+
+    @instrument(count=lambda result: countRow(result[0]))
+    def loadBatch(self, index:np.ndarray, buffer:np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        '''
+            Load the images of the given index into the front of the buffer
+
+        Argument:
+            index: np.ndarray, the index of every image in the batch
+            buffer: np.ndarray, the preallocated array to load the images into
+
+        Return:
+            batch: np.ndarray, the flattened images of the batch as a view into the buffer
+            batchLabel: np.ndarray, the labels of the batch, None if there is no label
+        '''
+        batch=buffer[:len(index)]
+
+        if self.store is None:
+            for i in range(len(index)):
+                batch[i]=np.load(self.datasetPath[index[i]]).ravel()
+        elif self.rawPixel:
+            batch[:]=self.store[self.datasetOffset[index]]
+        else:
+            np.take(self.store, self.datasetOffset[index], axis=0, out=batch)
+
+        if self.rawPixel:
+            batch/=self.dataRange
+        if self.mean is not None and self.std is not None:
+            batch-=self.mean
+            batch/=self.std
+
+        return batch, None if self.label is None else self.label[index]
+
+def computeImageStatistic(loader:ImageBatchLoader) -> tuple[float, float]:
+    '''
+        Return the mean and standard deviation of every pixel within
+    the dataset, accumulated one batch at a time
+
+        The loader should not standardise the pixels itself, otherwise
+    the statistic would describe the standardised pixels instead. An empty
+    dataset gives a mean of 0 and a standard deviation of 1, so standardising
+    with them leaves the pixels unchanged
+
+    Argument:
+        loader: ImageBatchLoader, the loader over the dataset to describe
+
+    Return:
+        mean: float, the mean pixel of the dataset
+        std: float, the standard deviation of pixels within the dataset
+    '''
+    total=0.0
+    square=0.0
+    count=0
+
+    for batch, _ in loader:
+        total+=batch.sum(dtype="float64")
+        square+=np.square(batch, dtype="float64").sum()
+        count+=batch.size
+
+    if count==0:
+        return 0.0, 1.0
+
+    mean=total/count
+    return mean, float(np.sqrt(max(square/count-mean**2, 0.0)))
@@ -1,19 +1,27 @@
 import pandas as pd
 
-from Configuration import imageLoadingPath
+from Configuration import imageDuplicatePath, imageLoadingPath
+from DataLoading.DuplicateLoading import dropCollapsed, loadCollapsedID
+from Monitoring.Instrumentation import countRow, instrument
 
-def loadImageLoading(imageLoadingPath:str=imageLoadingPath) -> pd.DataFrame:
+@instrument(count=countRow)
+def loadImageLoading(imageLoadingPath:str=imageLoadingPath, collapse:bool=None) -> pd.DataFrame:
     '''
         Return a data frame which contains:
         1. image ID
         2. label
         3. the file path to load the pixel array
 
+        If the near-duplicate images are collapsed, only the first image
+    of every cluster is returned
+
     Argument:
         imageLoadingPath: str, file path of the image loading information
+        collapse: bool, leave out the collapsed near-duplicate images, None means following
+                  deduplicationSetting
     
     Return:
         imageLoading: pd.DataFrame, the image loading information
     '''
-    return pd.read_csv(imageLoadingPath)
+    return dropCollapsed(pd.read_csv(imageLoadingPath), loadCollapsedID(imageDuplicatePath, collapse))
 
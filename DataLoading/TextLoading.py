@@ -1,18 +1,125 @@
 import pandas as pd
 
-from Configuration import cleanProductName, cleanProductPath, lineTerminator
+from collections.abc import Iterator
+from Configuration import cleanProductFormat, cleanProductName, cleanProductPath, lineTerminator, productDuplicatePath
+from DataLoading.DuplicateLoading import dropCollapsed, loadCollapsedID
+from Monitoring.Instrumentation import countRow, instrument
 
-def loadProduct(cleanProductName:str=cleanProductName, cleanProductPath:str=cleanProductPath, lineTerminator:str=lineTerminator) -> pd.DataFrame:
+@instrument(count=countRow)
+def loadProduct(cleanProductName:str=cleanProductName, cleanProductPath:str=cleanProductPath, lineTerminator:str=lineTerminator,
+                columns:list[str]=None, cleanProductFormat:str=cleanProductFormat, collapse:bool=None) -> pd.DataFrame:
     '''
-        Load and return the processed product information csv file as a data frame
+        Load and return the processed product information as a data frame
+
+        If columns are given, only those columns are read, which skips
+    parsing the long text columns entirely for the columnar formats
+
+        If the near-duplicate products are collapsed, only the first product
+    of every cluster is returned
     
     Argument:
         cleanProductName: string, the name of the processed product information
         cleanProductPath: string, file path of processed product information
         lineterminator: string, the terminator used to represent the termination
                         in the csv file
+        columns: list[str], the name of columns to load, None means loading every column
+        cleanProductFormat: string, the file format of processed product information,
+                            "csv", "parquet" or "feather"
+        collapse: bool, leave out the collapsed near-duplicate products, None means following
+                  deduplicationSetting
 
     Return: 
         result: pd.DataFrame, the processed product information
     '''
-    return pd.read_csv(cleanProductPath+"/"+cleanProductName+".csv", lineterminator=lineTerminator)
\ No newline at end of file
+    filePath=constructProductPath(cleanProductName, cleanProductPath, cleanProductFormat)
+    collapsedID=loadCollapsedID(productDuplicatePath, collapse)
+    readColumn=columns if columns is None or collapsedID is None else list(dict.fromkeys(columns+["id"]))
+
+    if cleanProductFormat=="parquet":
+        product=pd.read_parquet(filePath, columns=readColumn)
+    elif cleanProductFormat=="feather":
+        product=pd.read_feather(filePath, columns=readColumn)
+    else:
+        product=pd.read_csv(filePath, lineterminator=lineTerminator, usecols=readColumn)
+
+    product=dropCollapsed(product, collapsedID)
+    return product if columns is None else product[columns]
+
+def iterateProduct(chunkSize:int, cleanProductName:str=cleanProductName, cleanProductPath:str=cleanProductPath, lineTerminator:str=lineTerminator,
+                   columns:list[str]=None, cleanProductFormat:str=cleanProductFormat, collapse:bool=None) -> Iterator[pd.DataFrame]:
+    '''
+        Yield the processed product information in chunks, so it
+    could be processed without holding the whole table in memory
+
+        Csv files are read in chunks of the given number of rows and parquet
+    files in batches of the same size. Feather files are read one record batch
+    at a time, which is one chunk written by cleanProduct. The collapsed
+    near-duplicate products are left out of every chunk as in loadProduct
+
+    Argument:
+        chunkSize: int, the number of rows in each chunk
+        cleanProductName: string, the name of the processed product information
+        cleanProductPath: string, file path of processed product information
+        lineterminator: string, the terminator used to represent the termination
+                        in the csv file
+        columns: list[str], the name of columns to load, None means loading every column
+        cleanProductFormat: string, the file format of processed product information,
+                            "csv", "parquet" or "feather"
+        collapse: bool, leave out the collapsed near-duplicate products, None means following
+                  deduplicationSetting
+
+    Return:
+        result: Iterator[pd.DataFrame], yields each chunk of the processed product information
+    '''
+    filePath=constructProductPath(cleanProductName, cleanProductPath, cleanProductFormat)
+    collapsedID=loadCollapsedID(productDuplicatePath, collapse)
+    readColumn=columns if columns is None or collapsedID is None else list(dict.fromkeys(columns+["id"]))
+
+    if cleanProductFormat=="parquet":
+        import pyarrow.parquet as pq
+
+        chunk=(batch.to_pandas() for batch in pq.ParquetFile(filePath).iter_batches(batch_size=chunkSize, columns=readColumn))
+    elif cleanProductFormat=="feather":
+        chunk=iterateFeather(filePath, readColumn)
+    else:
+        chunk=pd.read_csv(filePath, lineterminator=lineTerminator, usecols=readColumn, chunksize=chunkSize)
+
+    for item in chunk:
+        item=dropCollapsed(item, collapsedID)
+        yield item if columns is None else item[columns]
+
+def iterateFeather(filePath:str, columns:list[str]=None) -> Iterator[pd.DataFrame]:
+    '''
+        Yield every record batch of a feather file as a data frame
+
+    Argument:
+        filePath: str, file path of the feather file
+        columns: list[str], the name of columns to load, None means loading every column
+
+    Return:
+        result: Iterator[pd.DataFrame], yields each record batch
+    '''
+    import pyarrow as pa
+
+    with pa.memory_map(filePath) as source:
+        reader=pa.ipc.open_file(source)
+        for i in range(reader.num_record_batches):
+            batch=reader.get_batch(i)
+            yield (batch if columns is None else batch.select(columns)).to_pandas()
+
+def constructProductPath(cleanProductName:str=cleanProductName, cleanProductPath:str=cleanProductPath,
+                         cleanProductFormat:str=cleanProductFormat) -> str:
+    '''
+        Return the file path of the processed product information
+    in the given format
+
+    Argument:
+        cleanProductName: string, the name of the processed product information
+        cleanProductPath: string, file path of processed product information
+        cleanProductFormat: string, the file format of processed product information,
+                            "csv", "parquet" or "feather"
+
+    Return:
+        result: str, the file path of the processed product information
+    '''
+    return cleanProductPath+"/"+cleanProductName+"."+cleanProductFormat
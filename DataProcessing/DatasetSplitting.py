@@ -0,0 +1,187 @@
+import hashlib
+import numpy as np
+import os
+import pandas as pd
+
+from Configuration import datasetSplitSetting, imageInformationPath, splitPath
+from DataLoading.TextLoading import loadProduct
+from functools import lru_cache
+from Monitoring.Instrumentation import countRow, instrument
+
+@instrument(count=lambda result: result)
+def updateSplit(datasetSplitSetting:dict=datasetSplitSetting, splitPath:str=splitPath,
+                imageInformationPath:str=imageInformationPath) -> int:
+    '''
+        Assign every product that hasn't been assigned yet to the training
+    or test set and save the split again, so every product keeps its split as
+    the data grows and both the text and the image pipelines share the same assignment
+
+        The products of the images that aren't within the product table are
+    assigned as well, with a label of -1. This is the only function writing the
+    split, which is run by the split stage, and the file is written next to the
+    old one and then replaced, so a reader never sees a partial split
+
+    Argument:
+        datasetSplitSetting: dict, the setting of the stable split
+        splitPath: str, file path of the persisted split
+        imageInformationPath: str, file path of image information
+
+    Return:
+        result: int, the number of newly assigned products
+    '''
+    split=loadSplit(splitPath)
+    product=loadProduct(columns=["id", "label"], collapse=False).drop_duplicates("id")
+
+    if os.path.exists(imageInformationPath):
+        imageProduct=pd.read_csv(imageInformationPath, usecols=["product_id"])["product_id"].dropna()
+        unknown=pd.unique(imageProduct[~imageProduct.isin(product["id"])])
+        product=pd.concat([product, pd.DataFrame({"id":unknown, "label":-1})], ignore_index=True)
+
+    new=~product["id"].isin(split.index)
+    if not new.any() and os.path.exists(splitPath):
+        return 0
+
+    assigned=product.loc[~new].assign(split=product.loc[~new, "id"].map(split))
+    split=pd.concat([split, assignSplit(product.loc[new, "id"], product.loc[new, "label"], datasetSplitSetting, assigned)])
+    saveSplit(split, splitPath)
+    return int(new.sum())
+
+@instrument(count=countRow)
+def selectTestSet(productID:pd.Series, splitPath:str=splitPath) -> np.ndarray:
+    '''
+        Return whether each given product belongs to the test set
+    according to the persisted split, which is only read here
+
+    Argument:
+        productID: pd.Series, the product ID of each row to split
+        splitPath: str, file path of the persisted split
+
+    Return:
+        result: np.ndarray, True if the row belongs to the test set
+    '''
+    split=loadSplit(splitPath)
+    missing=~productID.isin(split.index)
+
+    if missing.any():
+        raise ValueError(str(int(missing.sum()))+" products haven't been assigned to the training or test set, "
+                         "run the split stage first, e.g. python PreProcessData.py split")
+
+    return productID.map(split).to_numpy()=="test"
+
+def assignSplit(productID:pd.Series, label:pd.Series, datasetSplitSetting:dict=datasetSplitSetting,
+                assigned:pd.DataFrame=None) -> pd.Series:
+    '''
+        Assign each product to the training or test set deterministically
+    by the hash of its ID
+
+        Without stratification, a product belongs to the test set if its
+    hash falls below the test proportion, so the assignment of a product never
+    depends on any other product. With stratification, the new products within
+    each label are ranked by their hash and the lowest ones are added to the test
+    set until it holds the test proportion of every product with the label,
+    counting the ones assigned before. The assignment then depends on the products
+    assigned before, which is why it's only made once and persisted
+
+    Argument:
+        productID: pd.Series, the unique ID of each product to assign
+        label: pd.Series, the corresponding label of each product
+        datasetSplitSetting: dict, the setting of the stable split
+        assigned: pd.DataFrame, the "label" and "split" of the products assigned before,
+                  None means nothing has been assigned
+
+    Return:
+        result: pd.Series, "train" or "test" for each product, indexed by product ID
+    '''
+    testSize=datasetSplitSetting["testSize"]
+    score=hashID(productID, datasetSplitSetting["salt"])
+
+    if datasetSplitSetting["stratify"]:
+        if assigned is None:
+            assigned=pd.DataFrame({"label":[], "split":[]})
+
+        rank=pd.Series(score).groupby(label.to_numpy()).rank(method="first").to_numpy()
+        total=label.value_counts().add(assigned["label"].value_counts(), fill_value=0)
+        assignedTest=assigned.loc[assigned["split"]=="test", "label"].value_counts().reindex(total.index, fill_value=0)
+        testNumber=np.floor(total*testSize+1e-9)-assignedTest
+        isTest=rank<=label.map(testNumber).to_numpy()
+    else:
+        isTest=score<testSize
+
+    return pd.Series(np.where(isTest, "test", "train"), index=productID.to_numpy())
+
+def hashID(productID:pd.Series, salt:str) -> np.ndarray:
+    '''
+        Map every ID to a float within 0~1 using the SHA-1 hash of the
+    salted ID, which stays the same across runs and machines
+
+    Argument:
+        productID: pd.Series, the unique ID of each product
+        salt: str, the salt mixed into the hash
+
+    Return:
+        result: np.ndarray, the hash of each ID as a float within 0~1
+    '''
+    digest=[hashlib.sha1((salt+str(ID)).encode()).digest()[:8] for ID in productID]
+    return np.frombuffer(b"".join(digest), dtype=">u8")/2.0**64
+
+def loadSplit(splitPath:str=splitPath) -> pd.Series:
+    '''
+        Load the persisted split, which is empty if nothing has been
+    assigned yet
+
+        The split is only read again once the file has changed, so it could
+    be selected chunk by chunk. The result is shared and shouldn't be modified
+
+    Argument:
+        splitPath: str, file path of the persisted split
+
+    Return:
+        result: pd.Series, "train" or "test" for each product, indexed by product ID
+    '''
+    if not os.path.exists(splitPath):
+        return pd.Series(dtype="object")
+
+    return readSplit(splitPath, os.stat(splitPath).st_mtime_ns)
+
+@lru_cache(maxsize=1)
+def readSplit(splitPath:str, modifiedTime:int) -> pd.Series:
+    '''
+        Read the persisted split, cached by its modification time
+
+    Argument:
+        splitPath: str, file path of the persisted split
+        modifiedTime: int, the modification time of the file in nanoseconds
+
+    Return:
+        result: pd.Series, "train" or "test" for each product, indexed by product ID
+    '''
+    split=pd.read_csv(splitPath)
+    return pd.Series(split["split"].to_numpy(), index=split["product_id"].to_numpy())
+
+def saveSplit(split:pd.Series, splitPath:str=splitPath):
+    '''
+        Save the split of every product as a csv file, which is written
+    next to the old one and then replaced
+
+    Argument:
+        split: pd.Series, "train" or "test" for each product, indexed by product ID
+        splitPath: str, file path of the persisted split
+    '''
+    pd.DataFrame({"product_id":split.index, "split":split.to_numpy()}).to_csv(splitPath+".tmp", index=False)
+    os.replace(splitPath+".tmp", splitPath)
+
+def matchProductID(imageID:pd.Series, imageInformationPath:str=imageInformationPath) -> pd.Series:
+    '''
+        Return the product ID of every given image, so images could be
+    split by their products
+
+    Argument:
+        imageID: pd.Series, the unique ID of each image
+        imageInformationPath: string, file path of image information
+
+    Return:
+        result: pd.Series, the corresponding product ID of each image
+    '''
+    imageInformation=pd.read_csv(imageInformationPath, usecols=["id", "product_id"])
+    productID=imageInformation.drop_duplicates("id").set_index("id")["product_id"]
+    return imageID.map(productID)
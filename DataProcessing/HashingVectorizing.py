@@ -0,0 +1,128 @@
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.preprocessing import normalize
+
+class HashingTfidfVectorizer:
+    '''
+        Transform text into TFIDF weights over a fixed number of hashed
+    features, with the IDF updated incrementally one chunk at a time
+
+        Words are mapped to features by their hash instead of a vocabulary,
+    so the fitted state is only the document frequency of every feature and its
+    memory doesn't grow with the corpus. Chunks could be fitted one after another
+    with partial_fit, and any number of copies could transform in parallel since
+    they share no vocabulary
+
+        The weights follow TfidfVectorizer with smooth IDF and l2 normalisation.
+    Features outside the document frequency range given by min_df and max_df get
+    no weight, which is applied when transforming so it always reflects every
+    chunk fitted so far
+    '''
+    def __init__(self, n_features:int=2**18, stop_words:str|list[str]=None, min_df:int|float=1, max_df:int|float=1.0):
+        '''
+        Argument:
+            n_features: int, the number of hashed features
+            stop_words: str|list[str], the stop words to drop, "english" uses the built-in list
+            min_df: int|float, the minimum document frequency of a feature, as a count or a proportion
+            max_df: int|float, the maximum document frequency of a feature, as a count or a proportion
+        '''
+        self.n_features=n_features
+        self.stop_words=stop_words
+        self.min_df=min_df
+        self.max_df=max_df
+        self.hasher=HashingVectorizer(n_features=n_features, stop_words=stop_words, alternate_sign=False, norm=None)
+        self.documentFrequency=np.zeros(n_features, dtype="int64")
+        self.documentNumber=0
+
+    def partial_fit(self, column:pd.Series) -> "HashingTfidfVectorizer":
+        '''
+            Add the document frequency of the given chunk of text
+
+        Argument:
+            column: pd.Series, a chunk of the text column
+
+        Return:
+            self: HashingTfidfVectorizer, the updated vectorizer
+        '''
+        count=self.hasher.transform(column)
+        self.documentFrequency+=np.bincount(count.indices, minlength=self.n_features)
+        self.documentNumber+=count.shape[0]
+        return self
+
+    def fit(self, column:pd.Series) -> "HashingTfidfVectorizer":
+        '''
+            Reset the document frequency and fit the whole text column
+
+        Argument:
+            column: pd.Series, the text column
+
+        Return:
+            self: HashingTfidfVectorizer, the fitted vectorizer
+        '''
+        self.documentFrequency[:]=0
+        self.documentNumber=0
+        return self.partial_fit(column)
+
+    def fit_transform(self, column:pd.Series) -> sp.csr_matrix:
+        '''
+            Fit the whole text column and return its weights, hashing
+        the text only once
+
+        Argument:
+            column: pd.Series, the text column
+
+        Return:
+            result: sp.csr_matrix, the TFIDF weight of every hashed feature
+        '''
+        count=self.hasher.transform(column)
+        self.documentFrequency=np.bincount(count.indices, minlength=self.n_features).astype("int64")
+        self.documentNumber=count.shape[0]
+        return self.weightCount(count)
+
+    def transform(self, column:pd.Series) -> sp.csr_matrix:
+        '''
+            Return the weights of the given text with the IDF fitted so far
+
+        Argument:
+            column: pd.Series, the text column
+
+        Return:
+            result: sp.csr_matrix, the TFIDF weight of every hashed feature
+        '''
+        return self.weightCount(self.hasher.transform(column))
+
+    def weightCount(self, count:sp.csr_matrix) -> sp.csr_matrix:
+        '''
+            Weight the hashed term counts by the IDF and normalise every row
+
+        Argument:
+            count: sp.csr_matrix, the term count of every hashed feature
+
+        Return:
+            result: sp.csr_matrix, the TFIDF weight of every hashed feature
+        '''
+        count=count.astype("float64")
+        count.data*=self.computeIDF()[count.indices]
+        count.eliminate_zeros()
+        return normalize(count, copy=False)
+
+    def computeIDF(self) -> np.ndarray:
+        '''
+            Return the smoothed IDF of every hashed feature, which is zero
+        for the features outside the document frequency range
+        '''
+        minimum=self.min_df if isinstance(self.min_df, int) else self.min_df*self.documentNumber
+        maximum=self.max_df if isinstance(self.max_df, int) else self.max_df*self.documentNumber
+
+        idf=np.log((1+self.documentNumber)/(1+self.documentFrequency))+1
+        idf[(self.documentFrequency<minimum) | (self.documentFrequency>maximum)]=0
+        return idf
+
+    def get_feature_names_out(self) -> np.ndarray:
+        '''
+            Return the name of every hashed feature, which is its index
+        '''
+        return np.array(["hash"+str(i) for i in range(self.n_features)], dtype="object")
@@ -0,0 +1,211 @@
+import hashlib
+import joblib
+import json
+import numpy as np
+import os
+import pandas as pd
+
+from Configuration import dataRange, imageFastDecode, imageFeatureFolder, imageFeatureSetting, imageStorageType, targetSize
+from DataLoading.ImageBatchLoading import ImageBatchLoader
+from DataProcessing.ImageProcessing import selectOffset
+from Monitoring.Instrumentation import countPair, countRow, instrument
+from sklearn.base import TransformerMixin
+from sklearn.decomposition import IncrementalPCA
+from sklearn.preprocessing import FunctionTransformer
+from sklearn.random_projection import SparseRandomProjection
+
+@instrument(count=countPair)
+def loadImageFeature(dataFrame:pd.DataFrame, trainPath:pd.Series, testPath:pd.Series,
+                     imageFeatureSetting:dict=imageFeatureSetting, imageFeatureFolder:str=imageFeatureFolder) -> tuple[np.ndarray, np.ndarray]:
+    '''
+        Return the reduced features of the training and test images,
+    loading them from the cache if they have been extracted before
+
+        The cache is keyed by the cleaning setting, the feature setting
+    and the image ID within each split, so repeated experiments on the
+    same split skip both loading the pixels and the projection
+
+        The reducer is written before the features and each file is written
+    next to the final one and then renamed, so an existing feature file always
+    comes with its reducer even if the process stops halfway
+
+    Argument:
+        dataFrame: pd.DataFrame, the original data frame after data cleaning
+        trainPath: pd.Series, the data series that contains all training paths
+        testPath: pd.Series, the data series that contains all test paths
+        imageFeatureSetting: dict, the setting of the reduced image features
+        imageFeatureFolder: str, the folder where all reduced features are cached
+
+    Return:
+        train: np.ndarray, the reduced features of the training images
+        test: np.ndarray, the reduced features of the test images
+    '''
+    key=constructFeatureKey(dataFrame.loc[trainPath.index, "id"], dataFrame.loc[testPath.index, "id"], imageFeatureSetting)
+    featurePath=imageFeatureFolder+"/"+key+".npz"
+
+    if os.path.exists(featurePath):
+        with np.load(featurePath) as feature:
+            return feature["train"], feature["test"]
+
+    trainLoader=ImageBatchLoader(trainPath, selectOffset(dataFrame, trainPath), batchSize=imageFeatureSetting["batchSize"])
+    testLoader=ImageBatchLoader(testPath, selectOffset(dataFrame, testPath), batchSize=imageFeatureSetting["batchSize"])
+
+    reducer=fitImageReducer(trainLoader, imageFeatureSetting["method"], imageFeatureSetting["componentNumber"])
+    train=extractImageFeature(reducer, trainLoader)
+    test=extractImageFeature(reducer, testLoader)
+
+    os.makedirs(imageFeatureFolder, exist_ok=True)
+    joblib.dump(reducer, imageFeatureFolder+"/"+key+".joblib.tmp")
+    os.replace(imageFeatureFolder+"/"+key+".joblib.tmp", imageFeatureFolder+"/"+key+".joblib")
+
+    with open(featurePath+".tmp", "wb") as file:
+        np.savez(file, train=train, test=test)
+    os.replace(featurePath+".tmp", featurePath)
+
+    return train, test
+
+def loadImageReducer(dataFrame:pd.DataFrame, trainPath:pd.Series, testPath:pd.Series,
+                     imageFeatureSetting:dict=imageFeatureSetting, imageFeatureFolder:str=imageFeatureFolder) -> TransformerMixin:
+    '''
+        Return the reducer cached by loadImageFeature for the given split,
+    so new images could be reduced in the same way as the training images
+
+    Argument:
+        dataFrame: pd.DataFrame, the original data frame after data cleaning
+        trainPath: pd.Series, the data series that contains all training paths
+        testPath: pd.Series, the data series that contains all test paths
+        imageFeatureSetting: dict, the setting of the reduced image features
+        imageFeatureFolder: str, the folder where all reduced features are cached
+
+    Return:
+        reducer: TransformerMixin, the fitted transformation
+    '''
+    key=constructFeatureKey(dataFrame.loc[trainPath.index, "id"], dataFrame.loc[testPath.index, "id"], imageFeatureSetting)
+    return joblib.load(imageFeatureFolder+"/"+key+".joblib")
+
+def constructFeatureKey(trainID:pd.Series, testID:pd.Series, imageFeatureSetting:dict) -> str:
+    '''
+        Return the cache key of the reduced features for the given split
+
+    Argument:
+        trainID: pd.Series, the ID of every training image in order
+        testID: pd.Series, the ID of every test image in order
+        imageFeatureSetting: dict, the setting of the reduced image features
+
+    Return:
+        result: str, the hexadecimal key of the cached features
+    '''
+    setting={
+        "targetSize":targetSize,
+        "dataRange":dataRange,
+        "storageType":imageStorageType,
+        "fastDecode":imageFastDecode,
+        "method":imageFeatureSetting["method"],
+        "componentNumber":imageFeatureSetting["componentNumber"]
+    }
+
+    result=hashlib.sha1(json.dumps(setting, sort_keys=True).encode())
+    result.update("\n".join(trainID).encode())
+    result.update(b"\0")
+    result.update("\n".join(testID).encode())
+    return result.hexdigest()
+
+@instrument()
+def fitImageReducer(loader:ImageBatchLoader, method:str, componentNumber:int) -> TransformerMixin:
+    '''
+        Fit the transformation that reduces the flattened images
+    to the given number of features
+
+        The following methods are supported:
+        1. "pca": incremental PCA fitted one batch at a time
+        2. "projection": sparse random projection, which only needs the number of pixels
+        3. "downsample": average square blocks of pixels, which needs no fitting
+
+        The incremental PCA needs at least as many images as components
+    in every batch, so a short final batch is merged into the previous one and
+    at most two batches are held at a time. The number of components can't be
+    larger than the batch size, otherwise batches would have to be accumulated
+    until there are enough images, which could hold most of the dataset
+
+    Argument:
+        loader: ImageBatchLoader, the loader over the training images
+        method: str, "pca", "projection" or "downsample"
+        componentNumber: int, the number of reduced features
+
+    Return:
+        reducer: TransformerMixin, the fitted transformation
+    '''
+    if method=="projection":
+        return SparseRandomProjection(n_components=componentNumber).fit(np.zeros((1, loader.featureNumber), dtype="float32"))
+    elif method=="downsample":
+        side=int(np.sqrt(loader.featureNumber))
+        factor=max(side//int(np.sqrt(componentNumber)), 1)
+        return FunctionTransformer(downsampleImage, kw_args={"side":side, "factor":factor})
+    elif method!="pca":
+        raise ValueError("Unknown image feature method: "+str(method))
+
+    if componentNumber>loader.batchSize:
+        raise ValueError("The number of PCA components ("+str(componentNumber)+") can't be larger than the batch size ("+
+                         str(loader.batchSize)+"), increase the batch size of imageFeatureSetting")
+
+    reducer=IncrementalPCA(n_components=componentNumber)
+    previous=None
+
+    for batch, _ in loader:
+        if previous is not None:
+            if len(batch)<componentNumber:
+                previous=np.concatenate([previous, batch])
+                continue
+            reducer.partial_fit(previous)
+        previous=batch.copy()
+
+    if previous is not None:
+        reducer.partial_fit(previous)
+
+    return reducer
+
+@instrument(count=countRow)
+def extractImageFeature(reducer:TransformerMixin, loader:ImageBatchLoader) -> np.ndarray:
+    '''
+        Transform every image with the fitted reducer one batch at a time
+    and collect the reduced features in a preallocated array
+
+        The number of reduced features is found by transforming a blank image,
+    so an empty split gives an empty array with the same number of features
+
+    Argument:
+        reducer: TransformerMixin, the fitted transformation
+        loader: ImageBatchLoader, the loader over the images to transform
+
+    Return:
+        result: np.ndarray, the (N, componentNumber) reduced features of every image
+    '''
+    componentNumber=reducer.transform(np.zeros((1, loader.featureNumber), dtype="float32")).shape[1]
+    result=np.empty((len(loader.datasetPath), componentNumber), dtype="float32")
+    start=0
+
+    for batch, _ in loader:
+        feature=reducer.transform(batch)
+        result[start:start+len(feature)]=feature
+        start+=len(feature)
+
+    return result
+
+def downsampleImage(batch:np.ndarray, side:int, factor:int) -> np.ndarray:
+    '''
+        Average every square block of pixels within the flattened images
+
+        If the side of the image isn't a multiple of the block size, the
+    pixels beyond the last full block are dropped
+
+    Argument:
+        batch: np.ndarray, the flattened square images
+        side: int, the side length of each image
+        factor: int, the side length of each averaged block
+
+    Return:
+        result: np.ndarray, the flattened downsampled images
+    '''
+    block=side//factor
+    image=batch.reshape(len(batch), side, side)[:, :block*factor, :block*factor]
+    return image.reshape(len(batch), block, factor, block, factor).mean(axis=(2, 4)).reshape(len(batch), -1)
@@ -1,22 +1,30 @@
 import numpy as np
 import pandas as pd
 
-from Configuration import imageDatasetSetting
+from Configuration import dataRange, datasetSplitSetting, imageDatasetSetting, targetSize
+from DataProcessing.DatasetSplitting import matchProductID, selectTestSet
+from Monitoring.Instrumentation import countPair, countRow, instrument
 from sklearn.model_selection import train_test_split
 
+@instrument(count=countPair)
 def splitTrainTest(dataFrame:pd.DataFrame,
                    pathColumn:str=imageDatasetSetting["pathColumn"],
                    targetColumn:str=imageDatasetSetting["targetColumn"],
-                   testSize:float=imageDatasetSetting["testSize"]) -> tuple[pd.Series, pd.Series, np.ndarray, np.ndarray]:
+                   testSize:float=imageDatasetSetting["testSize"],
+                   stable:bool=datasetSplitSetting["stable"]) -> tuple[pd.Series, pd.Series, np.ndarray, np.ndarray]:
     '''
         Split the given dataFrame to the training and test paths separately,
     which could be used for loading the training and test dataset
+
+        If the stable split is used, each image follows the split of its product
+    in the persisted split shared with the text dataset
     
     Argument:
         dataFrame: pd.DataFrame, the original data frame after data cleaning
         pathColumn: str, specifies the column that contains file paths storing pixel arrays
         targetColumn: str, specifies the column that contains labels
-        testSize: float, the proportion of test set within the whole dataset
+        testSize: float, the proportion of test set within the whole dataset for the random split
+        stable: bool, use the persisted split instead of a random split
 
     Return:
         trainPath: pd.Series, the data series that contains all training paths
@@ -26,23 +34,122 @@ def splitTrainTest(dataFrame:pd.DataFrame,
     '''
     dataset=dataFrame[pathColumn]
     label=dataFrame[targetColumn]
-    
-    trainPath, testPath, trainLabel, testLabel=train_test_split(dataset, label, test_size=testSize)
+
+    if stable:
+        isTest=selectTestSet(matchProductID(dataFrame["id"]))
+        trainPath, testPath, trainLabel, testLabel=dataset[~isTest], dataset[isTest], label[~isTest], label[isTest]
+    else:
+        trainPath, testPath, trainLabel, testLabel=train_test_split(dataset, label, test_size=testSize, random_state=datasetSplitSetting["randomState"])
+
     return trainPath, testPath, trainLabel.to_numpy(dtype="uint8"), testLabel.to_numpy(dtype="uint8")
 
-def loadFlatDataset(datasetPath:pd.Series) -> np.ndarray:
+def selectOffset(dataFrame:pd.DataFrame, datasetPath:pd.Series,
+                 offsetColumn:str=imageDatasetSetting["offsetColumn"]) -> pd.Series:
+    '''
+        Return the row offsets within the memory-mapped store for the
+    given split of paths
+
+        If the images are saved separately, there is no offset column
+    and None is returned instead
+
+    Argument:
+        dataFrame: pd.DataFrame, the original data frame after data cleaning
+        datasetPath: pd.Series, the data series that contains all paths within a dataset
+        offsetColumn: str, specifies the column that contains row offsets within the store
+
+    Return:
+        result: pd.Series, the data series that contains all offsets within a dataset
+    '''
+    if offsetColumn not in dataFrame.columns:
+        return None
+    
+    return dataFrame.loc[datasetPath.index, offsetColumn]
+
+@instrument(count=countRow)
+def loadFlatDataset(datasetPath:pd.Series, datasetOffset:pd.Series=None, dataRange:int=dataRange,
+                    featureNumber:int=targetSize*targetSize) -> np.ndarray:
     '''
         Load all images within the dataset and stack them
     together after flatten
+
+        The images are written into a preallocated array one by one, so
+    there is no intermediate list of arrays to stack
+
+        If offsets are given, every path points to the same memory-mapped
+    store and the rows are gathered from it directly
+
+        Images stored as raw uint8 pixels are normalised in place after
+    loading, so the result is always float32 within 0~1. An empty dataset
+    gives an empty array with the number of features of a cleaned image
     
     Argument:
         datasetPath: pd.Series, the data series that all paths within a dataset 
+        datasetOffset: pd.Series, the data series that contains all offsets within a dataset,
+                       None if every image is saved separately
+        dataRange: int, the maximum range of the pixel
+        featureNumber: int, the number of features of each image, only used for an empty dataset
     
     Return:
         result: np.ndarray, the stacked image dataset
     '''
-    result=[loadFlatImage(path) for path in datasetPath]
-    return np.stack(result).astype("float32")
+    if len(datasetPath)==0:
+        return np.empty((0, featureNumber), dtype="float32")
+
+    if datasetOffset is not None:
+        return loadFlatStore(datasetPath.iloc[0], datasetOffset.to_numpy(), dataRange)
+
+    result=None
+    for i, path in enumerate(datasetPath):
+        image=loadFlatImage(path)
+        if result is None:
+            result=np.empty((len(datasetPath), image.size), dtype="float32")
+            rawPixel=image.dtype==np.uint8
+        result[i]=image
+
+    if rawPixel:
+        result/=dataRange
+
+    return result
+
+@instrument(count=countRow)
+def loadFlatStore(storePath:str, offset:np.ndarray=None, dataRange:int=dataRange, chunkSize:int=1024) -> np.ndarray:
+    '''
+        Load the flattened images from the memory-mapped store
+
+        Without offsets, a zero-copy view over the whole store is returned
+    with the stored data type. Otherwise only the given rows are gathered in
+    the given order as float32, reading the store sequentially to keep the disk
+    access contiguous and normalising raw uint8 pixels in place
+
+        The rows are gathered a chunk at a time, so the only temporary copy
+    is a single chunk instead of every selected row
+
+    Argument:
+        storePath: str, file path of the memory-mapped store
+        offset: np.ndarray, the row offsets to gather, None for the whole store
+        dataRange: int, the maximum range of the pixel
+        chunkSize: int, the number of rows gathered at a time
+
+    Return:
+        result: np.ndarray, the flattened image dataset
+    '''
+    store=np.load(storePath, mmap_mode="r")
+    store=store.reshape(len(store), -1)
+
+    if offset is None:
+        return store
+
+    order=np.argsort(offset, kind="stable")
+    result=np.empty((len(offset), store.shape[1]), dtype="float32")
+
+    for start in range(0, len(order), chunkSize):
+        index=order[start:start+chunkSize]
+        result[index]=store[offset[index]]
+
+    if store.dtype==np.uint8:
+        result/=dataRange
+
+    return result
 
 def loadFlatImage(imagePath:str) -> np.ndarray:
     '''
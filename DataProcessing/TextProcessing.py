@@ -1,21 +1,35 @@
+import os
 import pandas as pd
+import scipy.sparse as sp
 
-from Configuration import textDatasetSetting, TFIDFVectorizerSetting
+from concurrent.futures import ProcessPoolExecutor
+from Configuration import datasetSplitSetting, textChunkSize, textDatasetSetting, textWorkerNumber, TFIDFVectorizerSetting
+from DataLoading.TextLoading import iterateProduct
+from DataProcessing.DatasetSplitting import selectTestSet
+from DataProcessing.HashingVectorizing import HashingTfidfVectorizer
+from functools import partial
+from Monitoring.Instrumentation import countPair, countRow, instrument
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.model_selection import train_test_split
 
+@instrument(count=countPair)
 def splitTrainTest(dataFrame:pd.DataFrame,
                    featureColumn:list[str]=textDatasetSetting["featureColumn"],
                    targetColumn:str=textDatasetSetting["targetColumn"],
-                   testSize:float=textDatasetSetting["testSize"]) -> tuple[pd.DataFrame, pd.DataFrame, pd.Series, pd.Series]:
+                   testSize:float=textDatasetSetting["testSize"],
+                   stable:bool=datasetSplitSetting["stable"]) -> tuple[pd.DataFrame, pd.DataFrame, pd.Series, pd.Series]:
     '''
         Split the given dataFrame to the training and test sets separately
+
+        If the stable split is used, each product is assigned by the persisted
+    split shared with the image dataset, which needs the column "id"
     
     Argument:
         dataFrame: pd.DataFrame, the original data frame after data cleaning
         featureColumn: list[str], contains the name of columns that are chosen as features
         targetColumn: str, specifies the column that contains the label
-        testSize: float, the proportion of test set within the whole dataset
+        testSize: float, the proportion of test set within the whole dataset for the random split
+        stable: bool, use the persisted split instead of a random split
 
     Return:
         trainData: pd.DataFrame, the data frame that contains training data
@@ -25,10 +39,15 @@ def splitTrainTest(dataFrame:pd.DataFrame,
     '''
     dataset=dataFrame.loc[:, featureColumn]
     label=dataFrame[targetColumn]
+
+    if stable:
+        isTest=selectTestSet(dataFrame["id"])
+        return dataset[~isTest], dataset[isTest], label[~isTest], label[isTest]
     
-    trainData, testData, trainLabel, testLabel=train_test_split(dataset, label, test_size=testSize)
+    trainData, testData, trainLabel, testLabel=train_test_split(dataset, label, test_size=testSize, random_state=datasetSplitSetting["randomState"])
     return trainData, testData, trainLabel, testLabel
 
+@instrument(count=countPair)
 def transformData(trainData:pd.DataFrame, testData:pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
     '''
         Transform each column data using TFIDF vectorizer and 
@@ -42,17 +61,220 @@ def transformData(trainData:pd.DataFrame, testData:pd.DataFrame) -> tuple[pd.Dat
         train: pd.DataFrame, the transformed training data which could be used for training
         test: pd.DataFrame, the transformed testing data which could be used for testing
     '''
-    train=[]
-    test=[]
-    column=trainData.columns
+    train, test, featureName=transformSparseData(trainData, testData)
+    return pd.DataFrame(train.toarray(), columns=featureName), pd.DataFrame(test.toarray(), columns=featureName)
+
+def transformSparseData(trainData:pd.DataFrame, testData:pd.DataFrame,
+                        vectorizerSetting:dict=TFIDFVectorizerSetting, workerNumber:int=textWorkerNumber) -> tuple[sp.csr_matrix, sp.csr_matrix, list[str]]:
+    '''
+        Transform each column data using TFIDF vectorizer and 
+    horizontally stack all sparse matrices at the end
+
+        Unlike transformData, the features are never densified so the
+    memory is proportional to the number of non-zero weights
+
+    Argument:
+        trainData: pd.DataFrame, the data frame that contains training data
+        testData: pd.DataFrame, the data frame that contains test data
+        vectorizerSetting: dict, the setting of TFIDFVectorizer
+        workerNumber: int, the number of worker processes, 1 means fitting serially
+                      and None uses one per column
+
+    Return:
+        train: sp.csr_matrix, the transformed training data which could be used for training
+        test: sp.csr_matrix, the transformed testing data which could be used for testing
+        featureName: list[str], the name of every feature column in order
+    '''
+    train, test, vectorizer=fitSparseData(trainData, testData, vectorizerSetting, workerNumber)
+    return train, test, constructFeatureName(vectorizer)
+
+@instrument(count=countPair)
+def fitSparseData(trainData:pd.DataFrame, testData:pd.DataFrame,
+                  vectorizerSetting:dict=TFIDFVectorizerSetting, workerNumber:int=textWorkerNumber) -> tuple[sp.csr_matrix, sp.csr_matrix, dict[str,TfidfVectorizer]]:
+    '''
+        Fit a TFIDF vectorizer for each column, transform both parts and
+    return the fitted vectorizers so they could be reused for prediction
+
+        If more than one worker is used, the columns are fitted across a
+    process pool and the results are collected in the original column order
+
+    Argument:
+        trainData: pd.DataFrame, the data frame that contains training data
+        testData: pd.DataFrame, the data frame that contains test data
+        vectorizerSetting: dict, the setting of TFIDFVectorizer
+        workerNumber: int, the number of worker processes, 1 means fitting serially
+                      and None uses one per column
+
+    Return:
+        train: sp.csr_matrix, the transformed training data which could be used for training
+        test: sp.csr_matrix, the transformed testing data which could be used for testing
+        vectorizer: dict[str,TfidfVectorizer], key=column name, value=the vectorizer fitted on it
+    '''
+    column=list(trainData.columns)
+    trainColumn=[trainData[name] for name in column]
+    testColumn=[testData[name] for name in column]
+    task=partial(transformSparseColumn, vectorizerSetting=vectorizerSetting)
+
+    if workerNumber==1 or len(column)<=1:
+        result=list(map(task, trainColumn, testColumn))
+    else:
+        with ProcessPoolExecutor(max_workers=min(workerNumber or os.cpu_count(), len(column))) as executor:
+            result=list(executor.map(task, trainColumn, testColumn))
+
+    train=[item[0] for item in result]
+    test=[item[1] for item in result]
+    vectorizer={column[i]:result[i][2] for i in range(len(column))}
+
+    return sp.hstack(train, format="csr"), sp.hstack(test, format="csr"), vectorizer
+
+@instrument(count=lambda result: countRow(result[0]))
+def fitSparseFeature(data:pd.DataFrame, vectorizerSetting:dict=TFIDFVectorizerSetting,
+                     workerNumber:int=textWorkerNumber) -> tuple[sp.csr_matrix, dict[str,TfidfVectorizer]]:
+    '''
+        Fit a TFIDF vectorizer for each column and transform the data,
+    for the products that are all used for fitting without a test part
+
+        If more than one worker is used, the columns are fitted across a
+    process pool and the results are collected in the original column order
+
+    Argument:
+        data: pd.DataFrame, the data frame that contains every feature column
+        vectorizerSetting: dict, the setting of TFIDFVectorizer
+        workerNumber: int, the number of worker processes, 1 means fitting serially
+                      and None uses one per column
+
+    Return:
+        result: sp.csr_matrix, the transformed data
+        vectorizer: dict[str,TfidfVectorizer], key=column name, value=the vectorizer fitted on it
+    '''
+    column=list(data.columns)
+    task=partial(fitSparseColumn, vectorizerSetting=vectorizerSetting)
+
+    if workerNumber==1 or len(column)<=1:
+        result=list(map(task, [data[name] for name in column]))
+    else:
+        with ProcessPoolExecutor(max_workers=min(workerNumber or os.cpu_count(), len(column))) as executor:
+            result=list(executor.map(task, [data[name] for name in column]))
+
+    return sp.hstack([item[0] for item in result], format="csr"), {column[i]:result[i][1] for i in range(len(column))}
+
+@instrument()
+def fitStreamingData(chunkSize:int=textChunkSize, featureColumn:list[str]=textDatasetSetting["featureColumn"],
+                     vectorizerSetting:dict=TFIDFVectorizerSetting) -> dict[str,HashingTfidfVectorizer]:
+    '''
+        Fit a hashing vectorizer for each column over the training products,
+    reading the processed product information one chunk at a time
+
+        Every chunk is split by the persisted split, so only the training
+    products update the IDF. The memory only depends on the chunk size and
+    the number of hashed features, not on the number of products
+
+    Argument:
+        chunkSize: int, the number of product rows read at a time
+        featureColumn: list[str], contains the name of columns that are chosen as features
+        vectorizerSetting: dict, the setting of TFIDFVectorizer in the "hashing" mode
+
+    Return:
+        vectorizer: dict[str,HashingTfidfVectorizer], key=column name, value=the vectorizer fitted on it
+    '''
+    if not datasetSplitSetting["stable"]:
+        raise ValueError("Fitting over chunks requires the stable split")
+
+    vectorizer={name:constructVectorizer(vectorizerSetting, "hashing") for name in featureColumn}
+
+    for chunk in iterateProduct(chunkSize, columns=["id"]+featureColumn):
+        chunk=chunk.loc[~selectTestSet(chunk["id"])]
+        for name in featureColumn:
+            vectorizer[name].partial_fit(chunk[name])
+
+    return vectorizer
+
+@instrument(count=countPair)
+def transformStreamingData(vectorizer:dict[str,HashingTfidfVectorizer], chunkSize:int=textChunkSize,
+                           featureColumn:list[str]=textDatasetSetting["featureColumn"],
+                           targetColumn:str=textDatasetSetting["targetColumn"]) -> tuple[sp.csr_matrix, sp.csr_matrix, pd.Series, pd.Series]:
+    '''
+        Transform the training and test products with the fitted hashing
+    vectorizers, reading the processed product information one chunk at a time
+
+        Every chunk is split by the persisted split and each part is transformed
+    on its own, so only the sparse features and the labels of every product are
+    kept, never the text of the whole table
+
+    Argument:
+        vectorizer: dict[str,HashingTfidfVectorizer], key=column name, value=the vectorizer fitted on it
+        chunkSize: int, the number of product rows read at a time
+        featureColumn: list[str], contains the name of columns that are chosen as features
+        targetColumn: str, specifies the column that contains the label
+
+    Return:
+        train: sp.csr_matrix, the transformed training data
+        test: sp.csr_matrix, the transformed testing data
+        trainLabel: pd.Series, the label of every training product
+        testLabel: pd.Series, the label of every test product
+    '''
+    if not datasetSplitSetting["stable"]:
+        raise ValueError("Transforming over chunks requires the stable split")
+
+    train, test, trainLabel, testLabel=[], [], [], []
+
+    for chunk in iterateProduct(chunkSize, columns=["id"]+featureColumn+[targetColumn]):
+        isTest=selectTestSet(chunk["id"])
+        train.append(transformRecord(chunk.loc[~isTest, featureColumn], vectorizer))
+        test.append(transformRecord(chunk.loc[isTest, featureColumn], vectorizer))
+        trainLabel.append(chunk.loc[~isTest, targetColumn])
+        testLabel.append(chunk.loc[isTest, targetColumn])
+
+    featureNumber=sum(vectorizer[name].n_features for name in featureColumn)
+    stack=lambda part: sp.vstack(part, format="csr") if part else sp.csr_matrix((0, featureNumber))
+    concat=lambda part: pd.concat(part, ignore_index=True) if part else pd.Series(dtype="float64")
+    return stack(train), stack(test), concat(trainLabel), concat(testLabel)
+
+@instrument(count=countRow)
+def transformRecord(data:pd.DataFrame, vectorizer:dict[str,TfidfVectorizer|HashingTfidfVectorizer],
+                    workerNumber:int=1, chunkSize:int=textChunkSize) -> sp.csr_matrix:
+    '''
+        Transform new data with the fitted vectorizers so it has the
+    same features as the training data
 
-    for name in column:
-        trainColumnDataFrame, testColumnDataFrame=transformColumn(trainData[name], testData[name])
-        train.append(trainColumnDataFrame)
-        test.append(testColumnDataFrame)
+        If more than one worker is used, the rows are transformed in chunks
+    across a process pool and stacked in the original order. This suits the
+    hashing vectorizers best, since each worker only receives their IDF instead
+    of a whole vocabulary
 
-    return pd.concat(train, axis=1), pd.concat(test, axis=1)
+    Argument:
+        data: pd.DataFrame, the data frame that contains every feature column
+        vectorizer: dict[str,TfidfVectorizer|HashingTfidfVectorizer], key=column name, value=the vectorizer fitted on it
+        workerNumber: int, the number of worker processes, 1 means transforming serially
+                      and None uses every core
+        chunkSize: int, the number of rows transformed by a worker process at a time
+
+    Return:
+        result: sp.csr_matrix, the transformed data which could be used for prediction
+    '''
+    if workerNumber==1 or len(data)<=chunkSize:
+        return sp.hstack([vectorizer[name].transform(data[name]) for name in vectorizer], format="csr")
 
+    chunk=[data.iloc[start:start+chunkSize] for start in range(0, len(data), chunkSize)]
+    with ProcessPoolExecutor(max_workers=workerNumber) as executor:
+        result=list(executor.map(partial(transformRecord, vectorizer=vectorizer), chunk))
+
+    return sp.vstack(result, format="csr")
+
+def constructFeatureName(vectorizer:dict[str,TfidfVectorizer]) -> list[str]:
+    '''
+        Return the name of every feature column in the order of
+    the stacked matrices
+
+    Argument:
+        vectorizer: dict[str,TfidfVectorizer], key=column name, value=the vectorizer fitted on it
+
+    Return:
+        result: list[str], the name of every feature column in order
+    '''
+    return [name for column in vectorizer for name in vectorizer[column].get_feature_names_out()]
+
+@instrument(count=countPair)
 def transformColumn(trainColumn:pd.Series, testColumn:pd.Series) -> tuple[pd.DataFrame, pd.DataFrame]:
     '''
         Transform the text data to feature importance using TFIDF
@@ -68,12 +290,85 @@ def transformColumn(trainColumn:pd.Series, testColumn:pd.Series) -> tuple[pd.Dat
         testColumnDataFrame: pd.DataFrame, the data frame containing all filtered features and
                              their corresponding weight for the test data
     '''
-    vectorizer=TfidfVectorizer(stop_words=TFIDFVectorizerSetting["stop_words"],
-                               max_features=TFIDFVectorizerSetting["max_features"],
-                               min_df=TFIDFVectorizerSetting["min_df"],
-                               max_df=TFIDFVectorizerSetting["max_df"]).fit(trainColumn)
+    trainColumnMatrix, testColumnMatrix, vectorizer=transformSparseColumn(trainColumn, testColumn)
+    featureName=vectorizer.get_feature_names_out()
 
-    trainColumnDataFrame=pd.DataFrame(vectorizer.transform(trainColumn).todense(), columns=vectorizer.get_feature_names_out())
-    testColumnDataFrame=pd.DataFrame(vectorizer.transform(testColumn).todense(), columns=vectorizer.get_feature_names_out())
+    trainColumnDataFrame=pd.DataFrame(trainColumnMatrix.toarray(), columns=featureName)
+    testColumnDataFrame=pd.DataFrame(testColumnMatrix.toarray(), columns=featureName)
 
     return trainColumnDataFrame, testColumnDataFrame
+
+@instrument(count=countPair)
+def transformSparseColumn(trainColumn:pd.Series, testColumn:pd.Series,
+                          vectorizerSetting:dict=TFIDFVectorizerSetting) -> tuple[sp.csr_matrix, sp.csr_matrix, TfidfVectorizer|HashingTfidfVectorizer]:
+    '''
+        Transform the text data to sparse feature importance using TFIDF
+    vectorizer so it could be used for model training
+
+        The training column is fitted and transformed by fitSparseColumn,
+    then the test column is transformed with the fitted vectorizer. In the
+    "hashing" mode, the vectorizer only keeps the document frequency of the
+    hashed features instead of a vocabulary
+
+    Argument:
+        trainColumn: pd.Series, the original train feature data in a column
+        testColumn: pd.Series, the original test feature data in a column
+        vectorizerSetting: dict, the setting of TFIDFVectorizer
+    
+    Return:
+        trainColumnMatrix: sp.csr_matrix, the weight of all filtered features for the training data
+        testColumnMatrix: sp.csr_matrix, the weight of all filtered features for the test data
+        vectorizer: TfidfVectorizer|HashingTfidfVectorizer, the vectorizer fitted on the training data
+    '''
+    trainColumnMatrix, vectorizer=fitSparseColumn(trainColumn, vectorizerSetting)
+    testColumnMatrix=vectorizer.transform(testColumn)
+
+    return trainColumnMatrix, testColumnMatrix.tocsr(), vectorizer
+
+def fitSparseColumn(column:pd.Series, vectorizerSetting:dict=TFIDFVectorizerSetting) -> tuple[sp.csr_matrix, TfidfVectorizer|HashingTfidfVectorizer]:
+    '''
+        Fit a TFIDF vectorizer on the text data of a column and transform
+    it in a single pass, dropping the pruned stop words so the vectorizer
+    stays small when it is sent back from a worker process
+
+    Argument:
+        column: pd.Series, the original feature data in a column
+        vectorizerSetting: dict, the setting of TFIDFVectorizer
+
+    Return:
+        columnMatrix: sp.csr_matrix, the weight of all filtered features
+        vectorizer: TfidfVectorizer|HashingTfidfVectorizer, the vectorizer fitted on the column
+    '''
+    vectorizer=constructVectorizer(vectorizerSetting)
+    columnMatrix=vectorizer.fit_transform(column)
+
+    if hasattr(vectorizer, "stop_words_"):
+        del vectorizer.stop_words_
+
+    return columnMatrix.tocsr(), vectorizer
+
+def constructVectorizer(vectorizerSetting:dict=TFIDFVectorizerSetting, mode:str=None) -> TfidfVectorizer|HashingTfidfVectorizer:
+    '''
+        Return an unfitted vectorizer of the given mode
+
+    Argument:
+        vectorizerSetting: dict, the setting of TFIDFVectorizer
+        mode: str, "tfidf" or "hashing", None means the mode within the setting
+
+    Return:
+        result: TfidfVectorizer|HashingTfidfVectorizer, the unfitted vectorizer
+    '''
+    mode=mode or vectorizerSetting.get("mode", "tfidf")
+
+    if mode=="hashing":
+        return HashingTfidfVectorizer(n_features=vectorizerSetting["n_features"],
+                                      stop_words=vectorizerSetting["stop_words"],
+                                      min_df=vectorizerSetting["min_df"],
+                                      max_df=vectorizerSetting["max_df"])
+    elif mode!="tfidf":
+        raise ValueError("Unknown vectorizer mode: "+str(mode))
+
+    return TfidfVectorizer(stop_words=vectorizerSetting["stop_words"],
+                           max_features=vectorizerSetting["max_features"],
+                           min_df=vectorizerSetting["min_df"],
+                           max_df=vectorizerSetting["max_df"])
@@ -0,0 +1,278 @@
+import atexit
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+from collections.abc import Callable
+from Configuration import instrumentationSetting
+
+try:
+    import resource
+except ImportError:
+    resource=None
+
+# Whether the instrumentation is enabled, decided once when the module is imported
+enabled=instrumentationSetting["enabled"] or os.environ.get("FACEBOOK_RANKING_INSTRUMENT", "")=="1"
+# The accumulated measurement of every instrumented function, key=qualified function name
+record={}
+# The lock guarding the record, since instrumented functions could be called from threads
+recordLock=threading.Lock()
+# The stack of the instrumented calls running in each thread
+callStack=threading.local()
+# The stack of every thread, key=thread identifier, so overlapping calls could be found
+threadStack={}
+# The lock guarding the stack of every thread and the tracemalloc peak
+stackLock=threading.Lock()
+# The time when the run started
+startTime=time.time()
+
+def instrument(count:Callable=None) -> Callable:
+    '''
+        Return a decorator that records the wall time, peak memory, number
+    of processed items and bytes read and written by every call of the function
+
+        If the instrumentation is disabled, the decorator returns the function
+    itself so there is no cost at all. Otherwise the measurements of every call
+    are accumulated per function and saved as a report when the process exits
+
+        Only the calling process is measured, so the functions run within
+    worker processes are not recorded and should be profiled with one worker
+
+        The tracemalloc peak is shared by every thread, so the peak memory is
+    only measured for calls that don't overlap with an instrumented call on
+    another thread, e.g. within the image loader threads or parallel pipeline
+    stages. Overlapping calls report no peak memory, and are counted as
+    "overlapCall" in the report, while their time and IO are still recorded
+
+    Argument:
+        count: Callable, returns the number of processed items from the result of
+               the function, None if the items aren't counted
+
+    Return:
+        result: Callable, the decorator of the function
+    '''
+    def decorator(function:Callable) -> Callable:
+        if not enabled:
+            return function
+
+        name=function.__module__+"."+function.__qualname__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            frame=enterCall()
+            try:
+                result=function(*args, **kwargs)
+            finally:
+                measurement=exitCall(frame)
+
+            measurement["item"]=None if count is None else count(result)
+            updateRecord(name, measurement)
+            return result
+
+        return wrapper
+
+    return decorator
+
+def enterCall() -> dict:
+    '''
+        Start measuring a call and push it onto the stack of the thread
+
+        The tracemalloc peak is shared by the whole process, so the peak
+    reached by the caller so far is kept in its frame before the peak is
+    reset for this call. If an instrumented call is running on another thread,
+    every running call is marked as overlapping and the peak isn't touched,
+    since resetting it would corrupt the peak of the other calls
+
+    Return:
+        frame: dict, the starting point of every measurement of the call
+    '''
+    stack=getattr(callStack, "stack", None)
+    if stack is None:
+        stack=callStack.stack=[]
+
+    frame={"memory":None, "peak":0, "overlap":False, "io":readIO(), "start":time.perf_counter()}
+
+    with stackLock:
+        threadStack[threading.get_ident()]=stack
+        other=[item for ident, itemStack in threadStack.items() if ident!=threading.get_ident() for item in itemStack]
+
+        if other:
+            for item in other+stack+[frame]:
+                item["overlap"]=True
+        elif instrumentationSetting["memory"]:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            current, peak=tracemalloc.get_traced_memory()
+            if stack:
+                stack[-1]["peak"]=max(stack[-1]["peak"], peak)
+            tracemalloc.reset_peak()
+            frame["memory"]=current
+
+        stack.append(frame)
+
+    return frame
+
+def exitCall(frame:dict) -> dict:
+    '''
+        Finish measuring a call, pop it from the stack of the thread and
+    pass its peak memory on to the caller, unless it overlapped with a
+    call on another thread
+
+    Argument:
+        frame: dict, the starting point returned by enterCall
+
+    Return:
+        measurement: dict, the time, memory and IO of the call
+    '''
+    second=time.perf_counter()-frame["start"]
+    io=readIO()
+    stack=callStack.stack
+    peakMemory=None
+
+    with stackLock:
+        stack.pop()
+        if not stack:
+            threadStack.pop(threading.get_ident(), None)
+
+        if frame["memory"] is not None and not frame["overlap"]:
+            peak=max(frame["peak"], tracemalloc.get_traced_memory()[1])
+            peakMemory=max(peak-frame["memory"], 0)
+            if stack:
+                stack[-1]["peak"]=max(stack[-1]["peak"], peak)
+            tracemalloc.reset_peak()
+
+    return {
+        "second":second,
+        "peakMemory":peakMemory,
+        "overlap":frame["overlap"],
+        "peakRSS":readPeakRSS(),
+        "readByte":None if io is None else io[0]-frame["io"][0],
+        "writeByte":None if io is None else io[1]-frame["io"][1]
+    }
+
+def updateRecord(name:str, measurement:dict):
+    '''
+        Accumulate the measurement of a call into the record of its function
+
+    Argument:
+        name: str, the qualified name of the function
+        measurement: dict, the time, memory, IO and number of items of the call
+    '''
+    with recordLock:
+        item=record.setdefault(name, {"call":0, "overlapCall":0, "second":0.0, "peakMemory":None, "peakRSS":None, "item":None, "readByte":None, "writeByte":None})
+        item["call"]+=1
+        item["overlapCall"]+=measurement["overlap"]
+        item["second"]+=measurement["second"]
+
+        for key in ["peakMemory", "peakRSS"]:
+            if measurement[key] is not None:
+                item[key]=max(item[key] or 0, measurement[key])
+        for key in ["item", "readByte", "writeByte"]:
+            if measurement[key] is not None:
+                item[key]=(item[key] or 0)+measurement[key]
+
+def countRow(result) -> int:
+    '''
+        Return the number of rows of a data frame, array or sparse matrix
+
+    Argument:
+        result: the data frame, array or sparse matrix returned by the function
+
+    Return:
+        result: int, the number of rows
+    '''
+    return result.shape[0] if hasattr(result, "shape") else len(result)
+
+def countPair(result:tuple) -> int:
+    '''
+        Return the total number of rows of the first two returned items,
+    which are the training and test part for most splitting and transforming functions
+
+    Argument:
+        result: tuple, the items returned by the function
+
+    Return:
+        result: int, the total number of rows
+    '''
+    return countRow(result[0])+countRow(result[1])
+
+def readIO() -> tuple[int, int]|None:
+    '''
+        Return the number of bytes read and written by the process
+    so far, None if the platform doesn't provide them
+    '''
+    try:
+        with open("/proc/self/io") as file:
+            value=dict(line.split(": ") for line in file.read().splitlines())
+        return int(value["rchar"]), int(value["wchar"])
+    except (OSError, KeyError, ValueError):
+        return None
+
+def readPeakRSS() -> int|None:
+    '''
+        Return the peak resident memory of the process so far in bytes,
+    None if the platform doesn't provide it
+    '''
+    if resource is None:
+        return None
+
+    peak=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform=="darwin" else peak*1024
+
+def constructReport() -> dict:
+    '''
+        Return the structured report of the run, where the functions
+    are sorted by their total time
+
+    Return:
+        result: dict, contains the information of the run and the record of every function
+    '''
+    with recordLock:
+        function=[{"function":name, **item} for name, item in record.items()]
+
+    for item in function:
+        item["itemPerSecond"]=item["item"]/item["second"] if item["item"] is not None and item["second"]>0 else None
+
+    return {
+        "start":time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(startTime)),
+        "second":time.time()-startTime,
+        "pid":os.getpid(),
+        "argv":sys.argv,
+        "peakRSS":readPeakRSS(),
+        "function":sorted(function, key=lambda item: item["second"], reverse=True)
+    }
+
+def saveReport(reportFolder:str=instrumentationSetting["reportFolder"]) -> str|None:
+    '''
+        Save the report of the run as a json file and print a summary,
+    which is done automatically when the process exits
+
+    Argument:
+        reportFolder: str, the folder where the report of each run is saved
+
+    Return:
+        result: str, file path of the saved report, None if nothing was recorded
+    '''
+    if not record:
+        return None
+
+    report=constructReport()
+    os.makedirs(reportFolder, exist_ok=True)
+    reportPath=os.path.join(reportFolder, "Report-"+time.strftime("%Y%m%d-%H%M%S", time.localtime(startTime))+"-"+str(report["pid"])+".json")
+
+    with open(reportPath, "w") as file:
+        json.dump(report, file, indent=4)
+
+    print("Instrumentation report saved to: ", reportPath)
+    for item in report["function"]:
+        print(format(item["second"], "10.3f")+"s", format(item["call"], "8d"), item["function"])
+
+    return reportPath
+
+if enabled:
+    # Resolve the report folder now, since the working directory could change before exit
+    atexit.register(saveReport, os.path.abspath(instrumentationSetting["reportFolder"]))
@@ -0,0 +1,142 @@
+import Configuration
+import TrainClassification
+import TrainRegression
+import joblib
+
+from DataCleaning.CleanImageData import cleanImage
+from DataCleaning.CleanTabularData import cleanProduct
+from DataCleaning.Deduplication import deduplicateImage, deduplicateProduct
+from DataLoading.TextLoading import constructProductPath
+from DataProcessing.DatasetSplitting import updateSplit
+from Retrieval.SimilarProduct import updateProductIndex
+from sklearn.metrics import classification_report
+
+def constructStage() -> dict[str,dict]:
+    '''
+        Return the definition of every stage from the raw data
+    to the trained models, which could be run by runPipeline
+
+        The stages depend on each other as follows:
+        1. cleanProduct: clean the products and label them by category
+        2. deduplicateProduct: find and optionally collapse near-duplicate products
+        3. split: assign every new product to the training or test set, which is
+           the only stage writing the split while the others only read it
+        4. cleanImage: clean the images and match them with the labels
+        5. deduplicateImage: find and optionally collapse near-duplicate images
+        6. textFeature: fit the vectorizers and cache the text features
+        7. imageFeature: cache the reduced image features if they are used
+        8. trainRegression: fit the price predictor on the cached text features
+        9. trainClassification: fit the image classifier and save its report
+        10. productIndex: add new products to the similar product index
+
+        The deduplication stages do nothing unless they are enabled
+
+        The settings are read from Configuration when the stages are
+    fingerprinted, so changing any of them reruns the affected stages
+
+    Return:
+        result: dict[str,dict], key=stage name, value=the stage definition
+    '''
+    productPath=constructProductPath(Configuration.cleanProductName, Configuration.cleanProductPath, Configuration.cleanProductFormat)
+    imageOutput=Configuration.imageStorePath if Configuration.imageStoreFormat=="store" else Configuration.targetFolder
+    deduplication=Configuration.deduplicationSetting["enabled"]
+
+    return {
+        "cleanProduct":{
+            "dependency":[],
+            "input":[Configuration.productPath],
+            "setting":["lineTerminator", "cleanProductName", "cleanProductPath", "cleanProductFormat", "productChunkSize", "categoryRelationPath"],
+            "output":[productPath, Configuration.categoryRelationPath],
+            "run":cleanProduct
+        },
+        "deduplicateProduct":{
+            "dependency":["cleanProduct"],
+            "input":[],
+            "setting":["deduplicationSetting", "productDuplicatePath"],
+            "output":[Configuration.productDuplicatePath] if deduplication else [],
+            "run":deduplicateProduct if deduplication else skipStage
+        },
+        "split":{
+            "dependency":["deduplicateProduct"],
+            "input":[Configuration.imageInformationPath],
+            "setting":["datasetSplitSetting", "splitPath", "imageInformationPath"],
+            "output":[Configuration.splitPath],
+            "run":updateSplit
+        },
+        "cleanImage":{
+            "dependency":["deduplicateProduct"],
+            "input":[Configuration.imageFolder, Configuration.imageInformationPath],
+            "setting":["targetSize", "targetFolder", "dataRange", "imageStorageType", "imageFastDecode", "imageLoadingPath",
+                       "imageStoreFormat", "imageStorePath"],
+            "output":[Configuration.imageLoadingPath, imageOutput],
+            "run":cleanImage
+        },
+        "deduplicateImage":{
+            "dependency":["cleanImage"],
+            "input":[],
+            "setting":["deduplicationSetting", "imageDuplicatePath"],
+            "output":[Configuration.imageDuplicatePath] if deduplication else [],
+            "run":deduplicateImage if deduplication else skipStage
+        },
+        "textFeature":{
+            "dependency":["split"],
+            "input":[],
+            "setting":["textDatasetSetting", "sparseFeature", "TFIDFVectorizerSetting", "textFeaturePath"],
+            "output":[Configuration.textFeaturePath],
+            "run":TrainRegression.saveFeature
+        },
+        "imageFeature":{
+            "dependency":["split", "deduplicateImage"],
+            "input":[],
+            "setting":["imageDatasetSetting", "imageFeatureSetting", "imageFeatureFolder"],
+            "output":[],
+            "run":saveImageFeature
+        },
+        "trainRegression":{
+            "dependency":["textFeature"],
+            "input":[],
+            "setting":["pricePredictorPath"],
+            "output":[Configuration.pricePredictorPath],
+            "run":lambda: TrainRegression.trainModel(*joblib.load(Configuration.textFeaturePath))
+        },
+        "trainClassification":{
+            "dependency":["imageFeature"],
+            "input":[],
+            "setting":["classificationSetting", "classificationReportPath"],
+            "output":[Configuration.classificationReportPath],
+            "run":saveClassificationReport
+        },
+        "productIndex":{
+            "dependency":["deduplicateImage"] if Configuration.retrievalSetting["imageWeight"]>0 else ["deduplicateProduct"],
+            "input":[],
+            "setting":["retrievalSetting", "productIndexFolder", "textDatasetSetting", "TFIDFVectorizerSetting", "imageFeatureSetting"],
+            "output":[Configuration.productIndexFolder],
+            "run":updateProductIndex
+        }
+    }
+
+def skipStage():
+    '''
+        Do nothing in place of a stage that isn't enabled
+    '''
+
+def saveImageFeature():
+    '''
+        Cache the reduced features of the training and test images,
+    which does nothing if every pixel is used instead
+    '''
+    if Configuration.imageFeatureSetting["method"] is not None:
+        TrainClassification.loadReducedData()
+
+def saveClassificationReport(classificationReportPath:str=Configuration.classificationReportPath):
+    '''
+        Train the image classification model and save its report
+    on the test images
+
+    Argument:
+        classificationReportPath: str, file path of the classification report
+    '''
+    testLabel, prediction=TrainClassification.trainModel()
+
+    with open(classificationReportPath, "w") as file:
+        file.write(classification_report(testLabel, prediction))
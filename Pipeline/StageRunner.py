@@ -0,0 +1,165 @@
+import Configuration
+import hashlib
+import json
+import os
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+def runPipeline(stage:dict[str,dict], target:list[str], pipelineStatePath:str, workerNumber:int=2, force:bool=False) -> list[str]:
+    '''
+        Run every stage needed by the targets in dependency order,
+    skipping the stages that are already up to date
+
+        Each stage is a dictionary containing:
+        1. "dependency": list[str], the stages it depends on
+        2. "input": list[str], the files or folders it reads
+        3. "setting": list[str], the names of settings in Configuration it uses
+        4. "output": list[str], the files or folders it writes
+        5. "run": Callable, the function that performs the stage
+
+        A stage is fingerprinted by its inputs, settings and the fingerprints
+    of its dependencies. It is skipped if the fingerprint matches the one
+    recorded by its last successful run and all its outputs exist. Stages whose
+    dependencies are finished run concurrently in a thread pool
+
+    Argument:
+        stage: dict[str,dict], key=stage name, value=the stage definition
+        target: list[str], the stages to bring up to date
+        pipelineStatePath: str, file path of the recorded fingerprints
+        workerNumber: int, the number of stages that could run at the same time
+        force: bool, run every needed stage even if it is up to date
+
+    Return:
+        result: list[str], the name of every stage that was run
+    '''
+    order=sortStage(stage, target)
+    state=loadState(pipelineStatePath)
+    fingerprint={}
+    result=[]
+    running={}
+
+    with ThreadPoolExecutor(max_workers=workerNumber) as executor:
+        while order or running:
+            for name in [name for name in order if all(dependency in fingerprint for dependency in stage[name]["dependency"])]:
+                order.remove(name)
+                current=fingerprintStage(stage[name], [fingerprint[dependency] for dependency in stage[name]["dependency"]])
+
+                if not force and state.get(name)==current and all(os.path.exists(path) for path in stage[name]["output"]):
+                    fingerprint[name]=current
+                    print("Stage up to date: ", name)
+                else:
+                    print("Stage started: ", name)
+                    running[executor.submit(stage[name]["run"])]=(name, current)
+
+            if not running:
+                continue
+
+            done, _=wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, current=running.pop(future)
+                future.result()
+
+                fingerprint[name]=current
+                state[name]=current
+                saveState(state, pipelineStatePath)
+                result.append(name)
+                print("Stage finished: ", name)
+
+    return result
+
+def sortStage(stage:dict[str,dict], target:list[str]) -> list[str]:
+    '''
+        Return every stage needed by the targets, with each stage
+    placed after all of its dependencies
+
+    Argument:
+        stage: dict[str,dict], key=stage name, value=the stage definition
+        target: list[str], the stages to bring up to date
+
+    Return:
+        result: list[str], the needed stages in dependency order
+    '''
+    result=[]
+    visiting=set()
+
+    def visit(name:str):
+        if name in result:
+            return
+        if name in visiting:
+            raise ValueError("Circular dependency at stage: "+name)
+
+        visiting.add(name)
+        for dependency in stage[name]["dependency"]:
+            visit(dependency)
+        visiting.remove(name)
+        result.append(name)
+
+    for name in target:
+        visit(name)
+
+    return result
+
+def fingerprintStage(definition:dict, dependencyFingerprint:list[str]) -> str:
+    '''
+        Return the fingerprint of a stage from its inputs, settings
+    and the fingerprints of its dependencies
+
+        Files are fingerprinted by their size and modification time, and
+    folders by the size and modification time of every file inside them
+
+    Argument:
+        definition: dict, the stage definition
+        dependencyFingerprint: list[str], the fingerprint of each dependency
+
+    Return:
+        result: str, the hexadecimal fingerprint of the stage
+    '''
+    result=hashlib.sha1()
+    setting={name:getattr(Configuration, name) for name in definition["setting"]}
+    result.update(json.dumps(setting, sort_keys=True, default=str).encode())
+
+    for path in definition["input"]:
+        result.update(path.encode())
+        if os.path.isdir(path):
+            for entry in sorted(os.scandir(path), key=lambda entry: entry.name):
+                status=entry.stat()
+                result.update((entry.name+str(status.st_size)+str(status.st_mtime_ns)).encode())
+        elif os.path.exists(path):
+            status=os.stat(path)
+            result.update((str(status.st_size)+str(status.st_mtime_ns)).encode())
+
+    for item in dependencyFingerprint:
+        result.update(item.encode())
+
+    return result.hexdigest()
+
+def loadState(pipelineStatePath:str) -> dict[str,str]:
+    '''
+        Load the fingerprint recorded by the last successful run
+    of each stage
+
+    Argument:
+        pipelineStatePath: str, file path of the recorded fingerprints
+
+    Return:
+        result: dict[str,str], key=stage name, value=the recorded fingerprint
+    '''
+    if not os.path.exists(pipelineStatePath):
+        return {}
+
+    with open(pipelineStatePath) as file:
+        return json.load(file)
+
+def saveState(state:dict[str,str], pipelineStatePath:str):
+    '''
+        Save the recorded fingerprint of each stage
+
+    Argument:
+        state: dict[str,str], key=stage name, value=the recorded fingerprint
+        pipelineStatePath: str, file path of the recorded fingerprints
+    '''
+    temporaryPath=pipelineStatePath+".tmp"
+    with open(temporaryPath, "w") as file:
+        json.dump(state, file, indent=4)
+
+    os.replace(temporaryPath, pipelineStatePath)
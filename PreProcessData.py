@@ -1,7 +1,12 @@
-from DataCleaning.CleanImageData import cleanImage
-from DataCleaning.CleanTabularData import cleanProduct
+import sys
+
+from Configuration import pipelineStatePath, pipelineWorkerNumber
+from Pipeline.PipelineStage import constructStage
+from Pipeline.StageRunner import runPipeline
 
 
 if __name__=="__main__":
-    cleanProduct()
-    cleanImage()
\ No newline at end of file
+    # Bring the given stages up to date, e.g. "python PreProcessData.py trainRegression",
+    # add "--force" to rerun them even if nothing has changed
+    target=[argument for argument in sys.argv[1:] if argument!="--force"] or ["cleanProduct", "split", "cleanImage", "deduplicateImage"]
+    runPipeline(constructStage(), target, pipelineStatePath, pipelineWorkerNumber, "--force" in sys.argv)
@@ -0,0 +1,92 @@
+import io
+import joblib
+import numpy as np
+
+from Configuration import categoryClassifierPath, dataRange, imageFastDecode, targetSize
+from DataCleaning.CleanImageData import processImage
+from functools import lru_cache
+from sklearn.base import ClassifierMixin, TransformerMixin
+
+def saveCategoryClassifier(model:ClassifierMixin, reducer:TransformerMixin=None, statistic:tuple[float, float]=(None, None),
+                           categoryClassifierPath:str=categoryClassifierPath):
+    '''
+        Save the image classification model together with everything
+    needed to preprocess new images as a single artifact
+
+    Argument:
+        model: ClassifierMixin, the classifier fitted on the training images
+        reducer: TransformerMixin, the reducer applied to the flattened images, None if every pixel is used
+        statistic: tuple[float, float], the mean and standard deviation used to standardise
+                   the pixels, (None, None) means no standardisation
+        categoryClassifierPath: str, file path of the category classifier
+    '''
+    joblib.dump({"model":model, "reducer":reducer, "statistic":statistic}, categoryClassifierPath)
+    loadCategoryClassifier.cache_clear()
+
+@lru_cache(maxsize=None)
+def loadCategoryClassifier(categoryClassifierPath:str=categoryClassifierPath) -> dict:
+    '''
+        Load the category classifier saved by saveCategoryClassifier
+
+        The artifact is only read once per path and kept in memory
+    for every following prediction
+
+    Argument:
+        categoryClassifierPath: str, file path of the category classifier
+
+    Return:
+        result: dict, contains the classifier, the image reducer and the pixel statistic
+    '''
+    return joblib.load(categoryClassifierPath)
+
+def predictCategory(images:list[bytes], categoryClassifierPath:str=categoryClassifierPath) -> np.ndarray:
+    '''
+        Predict the category label of a small batch of encoded images
+
+        Every image is cleaned in the same way as the training images,
+    then standardised and reduced if the classifier was trained so
+
+    Argument:
+        images: list[bytes], the encoded content of each image, e.g. a JPEG file
+        categoryClassifierPath: str, file path of the category classifier
+
+    Return:
+        result: np.ndarray, the predicted label of each image
+    '''
+    return predictPixel([processEncodedImage(image) for image in images], categoryClassifierPath)
+
+def processEncodedImage(image:bytes) -> np.ndarray:
+    '''
+        Decode an encoded image and clean it in the same way as the
+    training images
+
+    Argument:
+        image: bytes, the encoded content of the image, e.g. a JPEG file
+
+    Return:
+        result: np.ndarray, the flattened cleaned pixels of the image
+    '''
+    return processImage(io.BytesIO(image), targetSize, dataRange, fastDecode=imageFastDecode).ravel()
+
+def predictPixel(pixels:list[np.ndarray], categoryClassifierPath:str=categoryClassifierPath) -> np.ndarray:
+    '''
+        Predict the category label of a small batch of cleaned images,
+    which are standardised and reduced if the classifier was trained so
+
+    Argument:
+        pixels: list[np.ndarray], the flattened cleaned pixels of each image given by processEncodedImage
+        categoryClassifierPath: str, file path of the category classifier
+
+    Return:
+        result: np.ndarray, the predicted label of each image
+    '''
+    classifier=loadCategoryClassifier(categoryClassifierPath)
+    feature=np.stack(pixels)
+
+    mean, std=classifier["statistic"]
+    if mean is not None and std is not None:
+        feature=(feature-mean)/std
+    if classifier["reducer"] is not None:
+        feature=classifier["reducer"].transform(feature)
+
+    return classifier["model"].predict(feature)
@@ -0,0 +1,61 @@
+import joblib
+import numpy as np
+import pandas as pd
+
+from Configuration import pricePredictorPath
+from DataProcessing.TextProcessing import transformRecord
+from functools import lru_cache
+from sklearn.base import RegressorMixin
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+def savePricePredictor(vectorizer:dict[str,TfidfVectorizer], model:RegressorMixin, pricePredictorPath:str=pricePredictorPath):
+    '''
+        Save the fitted vectorizers and regression model as a single
+    artifact so prices could be predicted without refitting
+
+    Argument:
+        vectorizer: dict[str,TfidfVectorizer], key=column name, value=the vectorizer fitted on it
+        model: RegressorMixin, the regression model fitted on the transformed features
+        pricePredictorPath: str, file path of the price predictor
+    '''
+    joblib.dump({"vectorizer":vectorizer, "model":model}, pricePredictorPath)
+    loadPricePredictor.cache_clear()
+
+@lru_cache(maxsize=None)
+def loadPricePredictor(pricePredictorPath:str=pricePredictorPath) -> dict:
+    '''
+        Load the price predictor saved by savePricePredictor
+
+        The artifact is only read once per path and kept in memory
+    for every following prediction
+
+    Argument:
+        pricePredictorPath: str, file path of the price predictor
+
+    Return:
+        result: dict, contains the fitted vectorizers and the regression model
+    '''
+    return joblib.load(pricePredictorPath)
+
+def predictPrice(records:list[dict]|pd.DataFrame, pricePredictorPath:str=pricePredictorPath) -> np.ndarray:
+    '''
+        Predict the price of a small batch of products
+
+        Each record should contain every feature column used for training,
+    which are transformed with the fitted vectorizers before prediction
+
+    Argument:
+        records: list[dict]|pd.DataFrame, contains the product information to price
+        pricePredictorPath: str, file path of the price predictor
+
+    Return:
+        result: np.ndarray, the predicted price of each product
+    '''
+    predictor=loadPricePredictor(pricePredictorPath)
+    data=records if isinstance(records, pd.DataFrame) else pd.DataFrame.from_records(records)
+    feature=transformRecord(data, predictor["vectorizer"])
+
+    if hasattr(predictor["model"], "feature_names_in_"):
+        feature=pd.DataFrame(feature.toarray(), columns=predictor["model"].feature_names_in_)
+
+    return predictor["model"].predict(feature)
@@ -0,0 +1,373 @@
+import asyncio
+import base64
+import binascii
+import json
+import numpy as np
+import os
+import time
+
+from collections import deque
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from Configuration import categoryClassifierPath, pricePredictorPath, servingSetting
+from PIL import Image
+from Prediction.CategoryPrediction import loadCategoryClassifier, predictPixel, processEncodedImage
+from Prediction.PricePrediction import loadPricePredictor, predictPrice
+
+# The reason phrase of every status code returned by the server
+statusPhrase={200:"OK", 400:"Bad Request", 404:"Not Found", 500:"Internal Server Error", 503:"Service Unavailable"}
+
+class MicroBatcher:
+    '''
+        Coalesce the items of concurrent requests into micro-batches and
+    score each batch with a single call of the model
+
+        A batch is closed when it holds the maximum number of items or when
+    its first request has waited for the maximum time, whichever comes first.
+    The batch is scored in a worker thread, so the event loop keeps accepting
+    requests meanwhile, and the result is split back to every request in order
+    '''
+    def __init__(self, function:Callable[[list], np.ndarray], maxBatchSize:int, maxWait:float):
+        '''
+        Argument:
+            function: Callable, scores a list of items and returns one result per item
+            maxBatchSize: int, the maximum number of items within a batch
+            maxWait: float, the maximum number of seconds a request waits for others to join its batch
+        '''
+        self.function=function
+        self.maxBatchSize=maxBatchSize
+        self.maxWait=maxWait
+        self.queue=asyncio.Queue()
+        self.executor=ThreadPoolExecutor(max_workers=1)
+        self.batchNumber=0
+        self.itemNumber=0
+
+    async def submit(self, items:list) -> list:
+        '''
+            Queue the items of a request and wait for their results
+
+        Argument:
+            items: list, the items of the request
+
+        Return:
+            result: list, the result of each item
+        '''
+        future=asyncio.get_running_loop().create_future()
+        await self.queue.put((items, future))
+        return await future
+
+    async def run(self):
+        '''
+            Collect and score the batches until the task is cancelled
+        '''
+        loop=asyncio.get_running_loop()
+
+        while True:
+            batch=[await self.queue.get()]
+            size=len(batch[0][0])
+            deadline=loop.time()+self.maxWait
+
+            while size<self.maxBatchSize:
+                try:
+                    request=self.queue.get_nowait() if not self.queue.empty() else await asyncio.wait_for(self.queue.get(), deadline-loop.time())
+                except asyncio.TimeoutError:
+                    break
+                batch.append(request)
+                size+=len(request[0])
+
+            await self.scoreBatch(batch)
+
+    async def scoreBatch(self, batch:list[tuple[list, asyncio.Future]]):
+        '''
+            Score the items of every request within the batch at once
+        and set the result of each request
+
+            If scoring the whole batch raises, every request is scored on its
+        own, so only the requests that fail themselves get the error
+
+        Argument:
+            batch: list[tuple[list, asyncio.Future]], the items and the future of every request
+        '''
+        loop=asyncio.get_running_loop()
+        items=[item for request, _ in batch for item in request]
+
+        try:
+            result=await loop.run_in_executor(self.executor, self.function, items)
+        except Exception as error:
+            if len(batch)==1:
+                if not batch[0][1].done():
+                    batch[0][1].set_exception(error)
+                return
+
+            for request in batch:
+                await self.scoreBatch([request])
+            return
+
+        self.batchNumber+=1
+        self.itemNumber+=len(items)
+        start=0
+
+        for request, future in batch:
+            if not future.done():
+                future.set_result(list(result[start:start+len(request)]))
+            start+=len(request)
+
+class LatencyCounter:
+    '''
+        Count the requests of an endpoint and keep the latency of the
+    most recent ones to report its percentiles and throughput
+    '''
+    def __init__(self, latencyWindow:int):
+        '''
+        Argument:
+            latencyWindow: int, the number of most recent requests the percentiles are computed over
+        '''
+        self.latency=deque(maxlen=latencyWindow)
+        self.requestNumber=0
+        self.errorNumber=0
+        self.startTime=time.perf_counter()
+
+    def update(self, second:float, error:bool=False):
+        '''
+            Record a finished request
+
+        Argument:
+            second: float, the latency of the request
+            error: bool, whether the request failed
+        '''
+        self.latency.append(second)
+        self.requestNumber+=1
+        self.errorNumber+=error
+
+    def summarise(self) -> dict:
+        '''
+            Return the counters, throughput since the server started and
+        latency percentiles in milliseconds
+        '''
+        latency=np.array(self.latency)*1000
+        return {
+            "request":self.requestNumber,
+            "error":self.errorNumber,
+            "throughput":self.requestNumber/(time.perf_counter()-self.startTime),
+            "p50":float(np.percentile(latency, 50)) if len(latency)>0 else None,
+            "p99":float(np.percentile(latency, 99)) if len(latency)>0 else None
+        }
+
+class ScoringServer:
+    '''
+        Local HTTP/1.1 server scoring products with the saved price
+    predictor and category classifier
+
+        The artifacts are loaded once when the server starts. The endpoints are:
+        POST /price: {"records":[{...}, ...]} -> {"price":[...]}, each record
+                     contains every feature column of a product
+        POST /category: {"images":["<base64>", ...]} -> {"category":[...]}, each
+                        image is the base64 encoded content of an image file,
+                        which is decoded before it joins a batch
+        GET /metrics: the request, error and batch counters, throughput and
+                      p50/p99 latency in milliseconds of every endpoint
+        GET /health: the endpoints whose artifact is loaded
+
+        Connections are kept alive, so a client could send many requests over one
+    connection. A request with a malformed record or image is rejected with 400
+    before it joins a batch, and an endpoint whose artifact doesn't exist returns 503
+    '''
+    def __init__(self, servingSetting:dict=servingSetting, pricePredictorPath:str=pricePredictorPath,
+                 categoryClassifierPath:str=categoryClassifierPath):
+        '''
+        Argument:
+            servingSetting: dict, the setting of the scoring server
+            pricePredictorPath: str, file path of the price predictor
+            categoryClassifierPath: str, file path of the category classifier
+        '''
+        self.servingSetting=servingSetting
+        self.scorer={}
+
+        if os.path.exists(pricePredictorPath):
+            column=list(loadPricePredictor(pricePredictorPath)["vectorizer"])
+            self.scorer["/price"]=("records", "price", lambda records: checkRecord(records, column),
+                                   lambda records: predictPrice(records, pricePredictorPath))
+        if os.path.exists(categoryClassifierPath):
+            loadCategoryClassifier(categoryClassifierPath)
+            self.scorer["/category"]=("images", "category", checkImage, lambda pixels: predictPixel(pixels, categoryClassifierPath))
+
+        self.batcher={}
+        self.counter={path:LatencyCounter(servingSetting["latencyWindow"]) for path in ["/price", "/category"]}
+
+    async def serve(self):
+        '''
+            Start the batchers and serve the requests until the task is cancelled
+        '''
+        self.batcher={path:MicroBatcher(function, self.servingSetting["maxBatchSize"], self.servingSetting["maxWait"])
+                      for path, (_, _, _, function) in self.scorer.items()}
+        task=[asyncio.create_task(batcher.run()) for batcher in self.batcher.values()]
+        server=await asyncio.start_server(self.handleConnection, self.servingSetting["host"], self.servingSetting["port"])
+
+        print("Serving", list(self.scorer), "on http://"+self.servingSetting["host"]+":"+str(self.servingSetting["port"]))
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for item in task:
+                item.cancel()
+
+    async def handleConnection(self, reader:asyncio.StreamReader, writer:asyncio.StreamWriter):
+        '''
+            Read the requests of a connection one after another and write
+        the response of each, until the client closes it or the server stops,
+        and close the connection either way
+
+        Argument:
+            reader: asyncio.StreamReader, the incoming stream of the connection
+            writer: asyncio.StreamWriter, the outgoing stream of the connection
+        '''
+        try:
+            while True:
+                line=await reader.readline()
+                if not line.strip():
+                    break
+
+                method, path, _=line.decode("latin-1").split(" ", 2)
+                header={}
+                while (line:=await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    name, _, value=line.decode("latin-1").partition(":")
+                    header[name.strip().lower()]=value.strip()
+
+                length=int(header.get("content-length", 0))
+                body=await reader.readexactly(length) if length>0 else b""
+
+                status, payload=await self.route(method, path, body)
+                content=json.dumps(payload).encode()
+                writer.write(("HTTP/1.1 "+str(status)+" "+statusPhrase[status]+"\r\nContent-Type: application/json\r\n"
+                              "Content-Length: "+str(len(content))+"\r\n\r\n").encode()+content)
+                await writer.drain()
+
+                if header.get("connection", "").lower()=="close":
+                    break
+        except (asyncio.CancelledError, asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (asyncio.CancelledError, ConnectionError):
+                pass
+
+    async def route(self, method:str, path:str, body:bytes) -> tuple[int, dict]:
+        '''
+            Return the status code and the payload of the response to a request
+
+        Argument:
+            method: str, the HTTP method of the request
+            path: str, the path of the request
+            body: bytes, the body of the request
+
+        Return:
+            status: int, the status code of the response
+            payload: dict, the json payload of the response
+        '''
+        if method=="GET" and path=="/health":
+            return 200, {"endpoint":list(self.scorer)}
+        if method=="GET" and path=="/metrics":
+            return 200, self.constructMetric()
+        if method!="POST" or path not in self.counter:
+            return 404, {"error":"Unknown endpoint "+method+" "+path}
+        if path not in self.scorer:
+            return 503, {"error":"The artifact of "+path+" hasn't been trained"}
+
+        start=time.perf_counter()
+        field, resultField, check, _=self.scorer[path]
+
+        try:
+            items=json.loads(body)[field]
+            if not isinstance(items, list):
+                raise TypeError(field+" should be a list")
+            items=await asyncio.get_running_loop().run_in_executor(None, check, items)
+        except (ValueError, KeyError, TypeError) as error:
+            self.counter[path].update(time.perf_counter()-start, error=True)
+            return 400, {"error":"Invalid request: "+str(error)}
+
+        try:
+            result=await self.batcher[path].submit(items) if items else []
+        except Exception as error:
+            self.counter[path].update(time.perf_counter()-start, error=True)
+            return 500, {"error":type(error).__name__+": "+str(error)}
+
+        self.counter[path].update(time.perf_counter()-start)
+        return 200, {resultField:np.asarray(result).tolist()}
+
+    def constructMetric(self) -> dict:
+        '''
+            Return the counters and latency of every endpoint together
+        with the number and mean size of its batches
+        '''
+        metric={}
+
+        for path, counter in self.counter.items():
+            batcher=self.batcher.get(path)
+            metric[path]=counter.summarise()
+            metric[path]["batch"]=batcher.batchNumber if batcher else 0
+            metric[path]["meanBatchSize"]=batcher.itemNumber/batcher.batchNumber if batcher and batcher.batchNumber>0 else None
+
+        return metric
+
+def checkRecord(records:list, column:list[str]) -> list[dict]:
+    '''
+        Check that every record is an object containing each feature
+    column as text, so a bad record is rejected before joining a batch
+
+    Argument:
+        records: list, the records of a request
+        column: list[str], the feature columns of the price predictor
+
+    Return:
+        result: list[dict], the checked records
+    '''
+    for i, record in enumerate(records):
+        if not isinstance(record, dict):
+            raise TypeError("record "+str(i)+" should be an object")
+        missing=[name for name in column if not isinstance(record.get(name), str)]
+        if missing:
+            raise ValueError("record "+str(i)+" should contain "+", ".join(missing)+" as text")
+
+    return records
+
+def checkImage(images:list) -> list[np.ndarray]:
+    '''
+        Decode every base64 image of a request and clean its pixels, so
+    a bad image is rejected before joining a batch and the batch only scores
+    the cleaned pixels
+
+    Argument:
+        images: list, the base64 encoded images of a request
+
+    Return:
+        result: list[np.ndarray], the flattened cleaned pixels of each image
+    '''
+    result=[]
+
+    for i, image in enumerate(images):
+        if not isinstance(image, str):
+            raise TypeError("image "+str(i)+" should be a base64 string")
+        try:
+            content=base64.b64decode(image, validate=True)
+        except binascii.Error:
+            raise ValueError("image "+str(i)+" isn't valid base64")
+        try:
+            result.append(processEncodedImage(content))
+        except (Image.DecompressionBombError, OSError, SyntaxError, ValueError) as error:
+            raise ValueError("image "+str(i)+" can't be decoded: "+str(error))
+
+    return result
+
+def runServer(servingSetting:dict=servingSetting):
+    '''
+        Load the trained artifacts and serve them until interrupted
+
+    Argument:
+        servingSetting: dict, the setting of the scoring server
+    '''
+    try:
+        asyncio.run(ScoringServer(servingSetting).serve())
+    except KeyboardInterrupt:
+        pass
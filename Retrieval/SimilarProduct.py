@@ -0,0 +1,280 @@
+import joblib
+import numpy as np
+import os
+import pandas as pd
+
+from Configuration import imageFeatureSetting, productIndexFolder, retrievalSetting, textDatasetSetting, TFIDFVectorizerSetting
+from DataLoading.ImageBatchLoading import ImageBatchLoader
+from DataLoading.ImageLoading import loadImageLoading
+from DataLoading.TextLoading import loadProduct
+from DataProcessing.DatasetSplitting import matchProductID
+from DataProcessing.ImageFeature import extractImageFeature, fitImageReducer
+from DataProcessing.ImageProcessing import selectOffset
+from DataProcessing.TextProcessing import fitSparseFeature, transformRecord
+from functools import lru_cache
+from Monitoring.Instrumentation import countRow, instrument
+from Retrieval.VectorIndex import normaliseVector, VectorIndex
+from sklearn.base import TransformerMixin
+from sklearn.decomposition import TruncatedSVD
+
+@instrument(count=len)
+def buildProductIndex(retrievalSetting:dict=retrievalSetting, productIndexFolder:str=productIndexFolder) -> VectorIndex:
+    '''
+        Build the similar product index over every processed product
+    and save it together with the fitted encoder
+
+        Every product is encoded by:
+        1. Transform each feature column with its own TFIDF vectorizer and
+           stack all of them, as for the regression model
+        2. Reduce the stacked features to a few dense dimensions with truncated SVD
+        3. Optionally append the mean reduced features of the product's images,
+           scaled by the image weight
+        4. Normalise the vector so the dot product is the cosine similarity
+
+    Argument:
+        retrievalSetting: dict, the setting of the similar product search
+        productIndexFolder: str, the folder of the similar product index
+
+    Return:
+        index: VectorIndex, the index over every product
+    '''
+    featureColumn=textDatasetSetting["featureColumn"]
+    product=loadProduct(columns=["id"]+featureColumn).drop_duplicates("id")
+
+    feature, vectorizer=fitSparseFeature(product[featureColumn])
+    componentNumber=min(retrievalSetting["componentNumber"], feature.shape[1]-1)
+    encoder={
+        "setting":constructEncoderSetting(retrievalSetting),
+        "vectorizer":vectorizer,
+        "svd":TruncatedSVD(n_components=componentNumber).fit(feature),
+        "reducer":fitProductImageReducer() if retrievalSetting["imageWeight"]>0 else None
+    }
+
+    vector=encodeProduct(product, encoder, retrievalSetting["imageWeight"])
+    listNumber=retrievalSetting["listNumber"] or max(int(np.sqrt(len(product))), 1)
+
+    index=VectorIndex.train(vector, listNumber, retrievalSetting["iteration"])
+    index.add(vector, product["id"].to_numpy())
+
+    index.save(productIndexFolder)
+    joblib.dump(encoder, productIndexFolder+"/encoder.joblib")
+    loadProductIndex.cache_clear()
+    return index
+
+@instrument(count=lambda result: result)
+def updateProductIndex(retrievalSetting:dict=retrievalSetting, productIndexFolder:str=productIndexFolder) -> int:
+    '''
+        Add the processed products that aren't within the index yet,
+    building the whole index if it doesn't exist or its setting has changed
+
+        The new products are encoded with the saved encoder and assigned
+    to the existing lists, so the index could grow as new products are
+    cleaned. They are kept within the delta shard of the index until it grows
+    beyond the merge proportion. The lists are only retrained when the index is rebuilt
+
+    Argument:
+        retrievalSetting: dict, the setting of the similar product search
+        productIndexFolder: str, the folder of the similar product index
+
+    Return:
+        result: int, the number of added products
+    '''
+    if not os.path.exists(productIndexFolder+"/encoder.joblib"):
+        return len(buildProductIndex(retrievalSetting, productIndexFolder))
+
+    index, encoder=loadProductIndex(productIndexFolder)
+    if encoder["setting"]!=constructEncoderSetting(retrievalSetting):
+        return len(buildProductIndex(retrievalSetting, productIndexFolder))
+
+    product=loadProduct(columns=["id"]+textDatasetSetting["featureColumn"])
+    product=product.loc[~product["id"].isin(index.position.keys())].drop_duplicates("id")
+
+    if len(product)==0:
+        return 0
+
+    index.add(encodeProduct(product, encoder, retrievalSetting["imageWeight"]), product["id"].to_numpy(), retrievalSetting["mergeProportion"])
+    index.save(productIndexFolder)
+    loadProductIndex.cache_clear()
+    return len(product)
+
+@lru_cache(maxsize=None)
+def loadProductIndex(productIndexFolder:str=productIndexFolder) -> tuple[VectorIndex, dict]:
+    '''
+        Load the similar product index and its encoder saved by buildProductIndex
+
+        The index is only read once per folder and kept in memory
+    for every following query
+
+    Argument:
+        productIndexFolder: str, the folder of the similar product index
+
+    Return:
+        index: VectorIndex, the index over every product
+        encoder: dict, contains the fitted vectorizers, SVD and image reducer
+    '''
+    return VectorIndex.load(productIndexFolder), joblib.load(productIndexFolder+"/encoder.joblib")
+
+@instrument(count=countRow)
+def findSimilarProduct(productID:list[str], topNumber:int=retrievalSetting["topNumber"], probeNumber:int=retrievalSetting["probeNumber"],
+                       productIndexFolder:str=productIndexFolder) -> pd.DataFrame:
+    '''
+        Return the most similar listings of every given product within
+    the index, leaving out the product itself
+
+    Argument:
+        productID: list[str], the ID of products within the index
+        topNumber: int, the number of similar products of each query
+        probeNumber: int, the number of closest lists scored for each query
+        productIndexFolder: str, the folder of the similar product index
+
+    Return:
+        result: pd.DataFrame, the query ID, rank, similar product ID and cosine similarity
+                of every result
+    '''
+    index, _=loadProductIndex(productIndexFolder)
+    productID=np.asarray(productID, dtype="object")
+    neighbour, score=index.search(index.lookup(productID), topNumber, probeNumber, exclude=productID)
+    return constructResult(productID, neighbour, score)
+
+@instrument(count=countRow)
+def findSimilarRecord(records:list[dict]|pd.DataFrame, topNumber:int=retrievalSetting["topNumber"],
+                      probeNumber:int=retrievalSetting["probeNumber"], productIndexFolder:str=productIndexFolder) -> pd.DataFrame:
+    '''
+        Return the most similar listings of every given product, which
+    doesn't need to be within the index
+
+        Each record should contain every feature column, and an "id" if the
+    result should be labelled by it. Only the text is used, since the records
+    have no cleaned images
+
+    Argument:
+        records: list[dict]|pd.DataFrame, contains the product information to search with
+        topNumber: int, the number of similar products of each query
+        probeNumber: int, the number of closest lists scored for each query
+        productIndexFolder: str, the folder of the similar product index
+
+    Return:
+        result: pd.DataFrame, the query ID, rank, similar product ID and cosine similarity
+                of every result
+    '''
+    index, encoder=loadProductIndex(productIndexFolder)
+    data=records if isinstance(records, pd.DataFrame) else pd.DataFrame.from_records(records)
+    query=encodeText(data, encoder)
+
+    if encoder["reducer"] is not None:
+        query=normaliseVector(np.hstack([query, np.zeros((len(query), index.centroid.shape[1]-query.shape[1]), dtype="float32")]))
+
+    neighbour, score=index.search(query, topNumber, probeNumber)
+    return constructResult(data["id"].to_numpy() if "id" in data else np.arange(len(data)), neighbour, score)
+
+def encodeProduct(product:pd.DataFrame, encoder:dict, imageWeight:float) -> np.ndarray:
+    '''
+        Return the unit vector of every product from its text and
+    optionally from its images
+
+    Argument:
+        product: pd.DataFrame, contains the ID and every feature column of the products
+        encoder: dict, contains the fitted vectorizers, SVD and image reducer
+        imageWeight: float, the weight of the mean reduced image features
+
+    Return:
+        result: np.ndarray, the (N, dimension) unit vector of every product
+    '''
+    vector=encodeText(product, encoder)
+
+    if encoder["reducer"] is not None:
+        image=normaliseVector(encodeImage(product["id"], encoder["reducer"]))
+        vector=normaliseVector(np.hstack([vector, imageWeight*image]))
+
+    return vector
+
+def encodeText(product:pd.DataFrame, encoder:dict) -> np.ndarray:
+    '''
+        Return the unit vector of the reduced TFIDF features of every product
+
+    Argument:
+        product: pd.DataFrame, contains every feature column of the products
+        encoder: dict, contains the fitted vectorizers and SVD
+
+    Return:
+        result: np.ndarray, the (N, componentNumber) unit vector of every product
+    '''
+    return normaliseVector(encoder["svd"].transform(transformRecord(product, encoder["vectorizer"])))
+
+def encodeImage(productID:pd.Series, reducer:TransformerMixin) -> np.ndarray:
+    '''
+        Return the mean reduced features of the cleaned images of every
+    product, which is zero for products without any image
+
+    Argument:
+        productID: pd.Series, the unique ID of each product
+        reducer: TransformerMixin, the fitted image reducer
+
+    Return:
+        result: np.ndarray, the (N, componentNumber) mean image features of every product
+    '''
+    imageLoading=loadImageLoading()
+    imageProduct=matchProductID(imageLoading["id"])
+    imageLoading=imageLoading.loc[imageProduct.isin(productID).to_numpy()]
+
+    if len(imageLoading)==0:
+        return np.zeros((len(productID), imageFeatureSetting["componentNumber"]), dtype="float32")
+
+    loader=ImageBatchLoader(imageLoading["path"], selectOffset(imageLoading, imageLoading["path"]), batchSize=imageFeatureSetting["batchSize"])
+    feature=pd.DataFrame(extractImageFeature(reducer, loader))
+    mean=feature.groupby(imageProduct.loc[imageLoading.index].to_numpy()).mean()
+    return mean.reindex(productID.to_numpy(), fill_value=0).to_numpy(dtype="float32")
+
+def fitProductImageReducer() -> TransformerMixin:
+    '''
+        Fit the image reducer of imageFeatureSetting on every cleaned image
+
+    Return:
+        reducer: TransformerMixin, the fitted image reducer
+    '''
+    imageLoading=loadImageLoading()
+    loader=ImageBatchLoader(imageLoading["path"], selectOffset(imageLoading, imageLoading["path"]), batchSize=imageFeatureSetting["batchSize"])
+    return fitImageReducer(loader, imageFeatureSetting["method"], imageFeatureSetting["componentNumber"])
+
+def constructEncoderSetting(retrievalSetting:dict) -> dict:
+    '''
+        Return every setting that changes how products are encoded,
+    so the index is rebuilt when any of them changes
+
+    Argument:
+        retrievalSetting: dict, the setting of the similar product search
+
+    Return:
+        result: dict, the settings the encoder depends on
+    '''
+    return {
+        "featureColumn":textDatasetSetting["featureColumn"],
+        "vectorizer":TFIDFVectorizerSetting,
+        "componentNumber":retrievalSetting["componentNumber"],
+        "listNumber":retrievalSetting["listNumber"],
+        "imageWeight":retrievalSetting["imageWeight"],
+        "image":imageFeatureSetting if retrievalSetting["imageWeight"]>0 else None
+    }
+
+def constructResult(queryID:np.ndarray, neighbour:np.ndarray, score:np.ndarray) -> pd.DataFrame:
+    '''
+        Flatten the neighbours of every query into a data frame, dropping
+    the missing results
+
+    Argument:
+        queryID: np.ndarray, the ID of every query
+        neighbour: np.ndarray, the (Q, topNumber) ID of the neighbours from the closest
+        score: np.ndarray, the (Q, topNumber) cosine similarity of each neighbour
+
+    Return:
+        result: pd.DataFrame, the query ID, rank, similar product ID and cosine similarity
+                of every result
+    '''
+    result=pd.DataFrame({
+        "query":np.repeat(queryID, neighbour.shape[1]),
+        "rank":np.tile(np.arange(1, neighbour.shape[1]+1), len(queryID)),
+        "id":neighbour.ravel(),
+        "score":score.ravel()
+    })
+
+    return result.loc[result["id"].notna()].reset_index(drop=True)
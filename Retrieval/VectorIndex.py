@@ -0,0 +1,291 @@
+import numpy as np
+import os
+import pandas as pd
+
+class VectorIndex:
+    '''
+        Approximate nearest-neighbour index over unit vectors with an
+    inverted file (IVF), ranking the neighbours by cosine similarity
+
+        The vectors are grouped into lists by their closest centroid, which
+    is trained with spherical k-means. A query only scores the vectors within
+    the few lists whose centroids are closest to it, so the time of a query
+    grows with the size of those lists instead of the whole index
+
+        New vectors could be added at any time and are assigned to the existing
+    centroids. They are kept within a small delta shard next to the main one,
+    which is only merged into the main shard once the delta grows beyond a
+    proportion of it, so adding a few vectors never copies the whole index
+
+        The index is saved as npy files within a folder and the vectors of the
+    main shard are memory-mapped when it's loaded. Saving only rewrites the delta
+    shard unless it has been merged since the last save
+    '''
+    def __init__(self, centroid:np.ndarray):
+        '''
+        Argument:
+            centroid: np.ndarray, the (listNumber, dimension) unit centroid of every list
+        '''
+        self.centroid=centroid.astype("float32")
+        self.vector=np.empty((0, centroid.shape[1]), dtype="float32")
+        self.ID=np.empty(0, dtype="object")
+        self.assignment=np.empty(0, dtype="int64")
+        self.order=np.empty(0, dtype="int64")
+        self.offset=np.zeros(len(centroid)+1, dtype="int64")
+        self.clearDelta()
+        self.position={}
+        self.savedFolder=None
+
+    @classmethod
+    def train(cls, vector:np.ndarray, listNumber:int, iteration:int=10, sampleNumber:int=64, seed:int=0) -> "VectorIndex":
+        '''
+            Train the centroids with spherical k-means on a sample of
+        the vectors and return an empty index
+
+            Lists left empty by an iteration are restarted from random vectors
+
+        Argument:
+            vector: np.ndarray, the (N, dimension) unit vectors to train on
+            listNumber: int, the number of lists
+            iteration: int, the number of k-means iterations
+            sampleNumber: int, the number of sampled vectors per list
+            seed: int, the seed of the random sample
+
+        Return:
+            result: VectorIndex, the index with trained centroids and no vector
+        '''
+        random=np.random.default_rng(seed)
+        sample=np.asarray(vector[random.choice(len(vector), min(len(vector), listNumber*sampleNumber), replace=False)], dtype="float32")
+        listNumber=min(listNumber, len(sample))
+        centroid=sample[random.choice(len(sample), listNumber, replace=False)].copy()
+
+        for _ in range(iteration):
+            assignment=np.argmax(sample@centroid.T, axis=1)
+            total=np.zeros_like(centroid)
+            np.add.at(total, assignment, sample)
+
+            empty=np.bincount(assignment, minlength=listNumber)==0
+            total[empty]=sample[random.choice(len(sample), empty.sum())]
+            centroid=normaliseVector(total)
+
+        return cls(centroid)
+
+    def __len__(self) -> int:
+        '''
+            Return the number of vectors within the index
+        '''
+        return len(self.ID)+len(self.deltaID)
+
+    def add(self, vector:np.ndarray, ID:np.ndarray, mergeProportion:float=0.1) -> int:
+        '''
+            Add new vectors to the delta shard, skipping the ID that are
+        already within the index, and merge the delta into the main shard
+        once it holds more than the given proportion of the main shard
+
+        Argument:
+            vector: np.ndarray, the (N, dimension) unit vectors to add
+            ID: np.ndarray, the unique ID of every vector
+            mergeProportion: float, the size of the delta shard relative to the
+                             main shard beyond which they are merged
+
+        Return:
+            result: int, the number of added vectors
+        '''
+        ID=np.asarray(ID, dtype="object")
+        new=np.array([item not in self.position for item in ID], dtype="bool") & ~pd.Series(ID).duplicated().to_numpy()
+
+        if not new.any():
+            return 0
+
+        vector=np.asarray(vector[new], dtype="float32")
+        start=len(self)
+
+        self.deltaVector=np.concatenate([self.deltaVector, vector])
+        self.deltaID=np.concatenate([self.deltaID, ID[new]])
+        self.deltaAssignment=np.concatenate([self.deltaAssignment, np.argmax(vector@self.centroid.T, axis=1)])
+        self.position.update({item:start+i for i, item in enumerate(ID[new])})
+
+        if len(self.deltaID)>mergeProportion*len(self.ID):
+            self.mergeDelta()
+        else:
+            self.deltaOrder=np.argsort(self.deltaAssignment, kind="stable")
+            self.deltaOffset=constructOffset(self.deltaAssignment, len(self.centroid))
+
+        return int(new.sum())
+
+    def mergeDelta(self):
+        '''
+            Merge the delta shard into the main shard
+
+            The delta is ordered by its list and every vector is inserted at
+        the end of its list within the order of the main shard, so the offsets
+        only grow by the size of each list within the delta and the main shard
+        is never sorted again
+        '''
+        deltaOrder=np.argsort(self.deltaAssignment, kind="stable")
+
+        self.order=np.insert(self.order, self.offset[self.deltaAssignment[deltaOrder]+1], len(self.ID)+deltaOrder)
+        self.offset=self.offset+constructOffset(self.deltaAssignment, len(self.centroid))
+        self.vector=np.concatenate([self.vector, self.deltaVector])
+        self.ID=np.concatenate([self.ID, self.deltaID])
+        self.assignment=np.concatenate([self.assignment, self.deltaAssignment])
+
+        self.clearDelta()
+        self.savedFolder=None
+
+    def clearDelta(self):
+        '''
+            Empty the delta shard
+        '''
+        self.deltaVector=np.empty((0, self.centroid.shape[1]), dtype="float32")
+        self.deltaID=np.empty(0, dtype="object")
+        self.deltaAssignment=np.empty(0, dtype="int64")
+        self.deltaOrder=np.empty(0, dtype="int64")
+        self.deltaOffset=np.zeros(len(self.centroid)+1, dtype="int64")
+
+    def search(self, query:np.ndarray, topNumber:int=10, probeNumber:int=8, exclude:np.ndarray=None) -> tuple[np.ndarray, np.ndarray]:
+        '''
+            Return the closest vectors to every query within the closest lists
+
+            The queries are scored against the centroids at once, then the
+        vectors within the probed lists of both shards are scored for each query
+        and the best ones are selected with a partial sort. If there are fewer
+        candidates than requested, the missing results have no ID and a score of -inf
+
+        Argument:
+            query: np.ndarray, the (Q, dimension) unit query vectors
+            topNumber: int, the number of neighbours of each query
+            probeNumber: int, the number of closest lists scored for each query
+            exclude: np.ndarray, the ID to leave out of the results of each query,
+                     None means nothing is excluded
+
+        Return:
+            neighbour: np.ndarray, the (Q, topNumber) ID of the neighbours from the closest
+            score: np.ndarray, the (Q, topNumber) cosine similarity of each neighbour
+        '''
+        query=np.atleast_2d(np.asarray(query, dtype="float32"))
+        probeNumber=min(probeNumber, len(self.centroid))
+        probe=np.argpartition(-(query@self.centroid.T), probeNumber-1, axis=1)[:, :probeNumber]
+
+        neighbour=np.full((len(query), topNumber), None, dtype="object")
+        score=np.full((len(query), topNumber), -np.inf, dtype="float32")
+
+        for i in range(len(query)):
+            candidate=np.concatenate([self.order[self.offset[j]:self.offset[j+1]] for j in probe[i]])
+            deltaCandidate=np.concatenate([self.deltaOrder[self.deltaOffset[j]:self.deltaOffset[j+1]] for j in probe[i]])
+            if exclude is not None and exclude[i] in self.position:
+                candidate=candidate[candidate!=self.position[exclude[i]]]
+                deltaCandidate=deltaCandidate[deltaCandidate!=self.position[exclude[i]]-len(self.ID)]
+            if len(candidate)+len(deltaCandidate)==0:
+                continue
+
+            similarity=np.concatenate([np.asarray(self.vector[candidate])@query[i], self.deltaVector[deltaCandidate]@query[i]])
+            candidateID=np.concatenate([self.ID[candidate], self.deltaID[deltaCandidate]])
+            best=np.argpartition(-similarity, min(topNumber, len(similarity))-1)[:topNumber]
+            best=best[np.argsort(-similarity[best], kind="stable")]
+
+            neighbour[i, :len(best)]=candidateID[best]
+            score[i, :len(best)]=similarity[best]
+
+        return neighbour, score
+
+    def lookup(self, ID:np.ndarray) -> np.ndarray:
+        '''
+            Return the stored vectors of the given ID
+
+        Argument:
+            ID: np.ndarray, the ID of vectors within the index
+
+        Return:
+            result: np.ndarray, the (N, dimension) stored vector of each ID
+        '''
+        position=np.array([self.position[item] for item in ID], dtype="int64")
+        main=position<len(self.ID)
+
+        result=np.empty((len(position), self.centroid.shape[1]), dtype="float32")
+        result[main]=self.vector[position[main]]
+        result[~main]=self.deltaVector[position[~main]-len(self.ID)]
+        return result
+
+    def save(self, indexFolder:str):
+        '''
+            Save the index as npy files within the given folder
+
+            The main shard is only written if it has changed since it was last
+        saved to or loaded from the folder, otherwise only the delta shard is.
+        Every file is written next to the old one and then replaced, so an index
+        memory-mapped from the same folder stays readable
+
+        Argument:
+            indexFolder: str, the folder of the index
+        '''
+        os.makedirs(indexFolder, exist_ok=True)
+        array={"deltaVector":self.deltaVector, "deltaID":self.deltaID.astype("str")}
+
+        if self.savedFolder!=indexFolder:
+            array={"centroid":self.centroid, "vector":self.vector, "id":self.ID.astype("str"), "assignment":self.assignment,
+                   "order":self.order, "offset":self.offset, **array}
+
+        for name in array:
+            with open(indexFolder+"/"+name+".npy.tmp", "wb") as file:
+                np.save(file, np.asarray(array[name]))
+            os.replace(indexFolder+"/"+name+".npy.tmp", indexFolder+"/"+name+".npy")
+
+        self.savedFolder=indexFolder
+
+    @classmethod
+    def load(cls, indexFolder:str) -> "VectorIndex":
+        '''
+            Load the index saved within the given folder, memory-mapping
+        the vectors of the main shard so only the scored ones are read
+
+            The delta vectors are added again, so one whose ID is already within
+        the main shard is left out, in case the folder is read between saving a
+        merged main shard and its delta
+
+        Argument:
+            indexFolder: str, the folder of the index
+
+        Return:
+            result: VectorIndex, the loaded index
+        '''
+        index=cls(np.load(indexFolder+"/centroid.npy"))
+        index.vector=np.load(indexFolder+"/vector.npy", mmap_mode="r")
+        index.ID=np.load(indexFolder+"/id.npy").astype("object")
+        index.assignment=np.load(indexFolder+"/assignment.npy")
+        index.order=np.load(indexFolder+"/order.npy")
+        index.offset=np.load(indexFolder+"/offset.npy")
+        index.position={item:i for i, item in enumerate(index.ID)}
+        index.savedFolder=indexFolder
+
+        if os.path.exists(indexFolder+"/deltaID.npy"):
+            index.add(np.load(indexFolder+"/deltaVector.npy"), np.load(indexFolder+"/deltaID.npy"), mergeProportion=np.inf)
+
+        return index
+
+def constructOffset(assignment:np.ndarray, listNumber:int) -> np.ndarray:
+    '''
+        Return the offset of every list within vectors ordered by their list,
+    so the vectors of a list are given by the slice between two consecutive offsets
+
+    Argument:
+        assignment: np.ndarray, the list of every vector
+        listNumber: int, the number of lists
+
+    Return:
+        result: np.ndarray, the (listNumber+1) offset of every list
+    '''
+    return np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=listNumber))])
+
+def normaliseVector(vector:np.ndarray) -> np.ndarray:
+    '''
+        Scale every row to unit length, leaving zero rows unchanged
+
+    Argument:
+        vector: np.ndarray, the (N, dimension) vectors
+
+    Return:
+        result: np.ndarray, the (N, dimension) unit vectors
+    '''
+    norm=np.linalg.norm(vector, axis=1, keepdims=True)
+    return (vector/np.where(norm>0, norm, 1)).astype("float32")
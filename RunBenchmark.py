@@ -0,0 +1,18 @@
+import os
+import tempfile
+
+from Benchmark.StageBenchmark import compareResult, runBenchmark, saveResult
+from Configuration import benchmarkResultPath, benchmarkSetting
+
+
+if __name__=="__main__":
+    resultPath=os.path.abspath(benchmarkResultPath)
+
+    with tempfile.TemporaryDirectory() as workFolder:
+        result=runBenchmark(benchmarkSetting, workFolder)
+
+    history=saveResult(result, benchmarkSetting, resultPath)
+
+    if len(history)>1:
+        regression=compareResult(history[-2], history[-1], benchmarkSetting["tolerance"])
+        print("\n".join(regression) if regression else "No regression compared with version "+history[-2]["version"])
@@ -0,0 +1,9 @@
+import sys
+
+from Command.CommandLine import runCommand
+
+
+if __name__=="__main__":
+    # e.g. "python RunCommand.py train-regression --set TFIDFVectorizerSetting.max_features=5000",
+    # "python RunCommand.py --help" lists every command
+    sys.exit(runCommand(sys.argv[1:]))
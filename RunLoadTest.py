@@ -0,0 +1,8 @@
+import asyncio
+import json
+
+from Benchmark.LoadTest import runLoadTest
+
+
+if __name__=="__main__":
+    print(json.dumps(asyncio.run(runLoadTest()), indent=4))
@@ -0,0 +1,8 @@
+import sys
+
+from Tuning.ParameterSweep import runSweep
+
+
+if __name__=="__main__":
+    # The task is given as the first argument, "regression" or "classification"
+    runSweep(sys.argv[1] if len(sys.argv)>1 else "regression")
@@ -0,0 +1,5 @@
+from Prediction.ScoringServer import runServer
+
+
+if __name__=="__main__":
+    runServer()
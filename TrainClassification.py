@@ -1,7 +1,14 @@
 import numpy as np
+import pandas as pd
 
+from Configuration import classificationSetting, imageFeatureSetting
+from DataLoading.ImageBatchLoading import computeImageStatistic, ImageBatchLoader
 from DataLoading.ImageLoading import loadImageLoading
-from DataProcessing.ImageProcessing import loadFlatDataset, splitTrainTest
+from DataProcessing.ImageFeature import loadImageFeature, loadImageReducer
+from DataProcessing.ImageProcessing import loadFlatDataset, selectOffset, splitTrainTest
+from Prediction.CategoryPrediction import saveCategoryClassifier
+from sklearn.base import TransformerMixin
+from sklearn.linear_model import SGDClassifier
 from sklearn.svm import SVC
 from sklearn.metrics import classification_report
 
@@ -11,7 +18,8 @@ def loadData() -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
 
         This function contains the following steps:
         1. Split the image paths into the training part and test part
-        2. Load all image arrays within each sub dataset
+        2. Load all image arrays within each sub dataset, gathering them from the
+           memory-mapped store if it is used
         3. Flatten each image and stack them together
     
     Return:
@@ -20,15 +28,139 @@ def loadData() -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
         trainLabel: np.ndarray, array that could be used as training label
         testLabel: np.ndarray, array that could be used as test label
     '''
+    trainPath, testPath, trainOffset, testOffset, trainLabel, testLabel=splitData()
+    return loadFlatDataset(trainPath, trainOffset), loadFlatDataset(testPath, testOffset), trainLabel, testLabel
+
+def loadReducedData() -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, TransformerMixin]:
+    '''
+        Load the reduced image features for model training
+
+        This function contains the following steps:
+        1. Split the image paths into the training part and test part
+        2. Load the cached reduced features of each sub dataset, or fit the reducer
+           on the training images and transform both parts one batch at a time
+
+    Return:
+        train: np.ndarray, the reduced features of the training images
+        test: np.ndarray, the reduced features of the test images
+        trainLabel: np.ndarray, array that could be used as training label
+        testLabel: np.ndarray, array that could be used as test label
+        reducer: TransformerMixin, the reducer fitted on the training images
+    '''
     dataFrame=loadImageLoading()
     trainPath, testPath, trainLabel, testLabel=splitTrainTest(dataFrame)
-    return loadFlatDataset(trainPath), loadFlatDataset(testPath), trainLabel, testLabel
+    train, test=loadImageFeature(dataFrame, trainPath, testPath)
+    return train, test, trainLabel, testLabel, loadImageReducer(dataFrame, trainPath, testPath)
 
-if __name__=="__main__":
-    train, test, trainLabel, testLabel=loadData()
-    model=SVC(gamma=0.001)
+def splitData() -> tuple[pd.Series, pd.Series, pd.Series, pd.Series, np.ndarray, np.ndarray]:
+    '''
+        Split the image paths into the training part and test part
+    without loading any image
 
-    model.fit(train, trainLabel)
-    prediction=model.predict(test)
+    Return:
+        trainPath: pd.Series, the data series that contains all training paths
+        testPath: pd.Series, the data series that contains all test paths
+        trainOffset: pd.Series, the data series that contains all training offsets, None if
+                     every image is saved separately
+        testOffset: pd.Series, the data series that contains all test offsets, None if
+                    every image is saved separately
+        trainLabel: np.ndarray, array that could be used as training label
+        testLabel: np.ndarray, array that could be used as test label
+    '''
+    dataFrame=loadImageLoading()
+    trainPath, testPath, trainLabel, testLabel=splitTrainTest(dataFrame)
+    trainOffset, testOffset=selectOffset(dataFrame, trainPath), selectOffset(dataFrame, testPath)
+    return trainPath, testPath, trainOffset, testOffset, trainLabel, testLabel
+
+def trainBatchModel(trainPath:pd.Series, trainOffset:pd.Series, trainLabel:np.ndarray, classes:np.ndarray,
+                    batchSize:int=classificationSetting["batchSize"], epoch:int=classificationSetting["epoch"],
+                    statistic:tuple[float, float]=(None, None)) -> SGDClassifier:
+    '''
+        Train a linear classifier incrementally, loading one batch
+    of training images at a time
+
+        The memory is capped at a few prefetched batches and the training
+    time grows linearly with the number of images
+
+    Argument:
+        trainPath: pd.Series, the data series that contains all training paths
+        trainOffset: pd.Series, the data series that contains all training offsets
+        trainLabel: np.ndarray, array that could be used as training label
+        classes: np.ndarray, every label that could appear in the dataset
+        batchSize: int, the number of images loaded at a time
+        epoch: int, the number of passes over the training set
+        statistic: tuple[float, float], the mean and standard deviation used to standardise
+                   the pixels, (None, None) means no standardisation
 
-    classification_report(testLabel, prediction)
+    Return:
+        model: SGDClassifier, the classifier trained on every batch
+    '''
+    model=SGDClassifier()
+    loader=ImageBatchLoader(trainPath, trainOffset, trainLabel, batchSize, shuffle=True, mean=statistic[0], std=statistic[1])
+
+    for _ in range(epoch):
+        for batch, batchLabel in loader:
+            model.partial_fit(batch, batchLabel, classes=classes)
+
+    return model
+
+def predictBatch(model:SGDClassifier, testPath:pd.Series, testOffset:pd.Series,
+                 batchSize:int=classificationSetting["batchSize"], statistic:tuple[float, float]=(None, None)) -> np.ndarray:
+    '''
+        Predict the test images one batch at a time
+
+    Argument:
+        model: SGDClassifier, the trained classifier
+        testPath: pd.Series, the data series that contains all test paths
+        testOffset: pd.Series, the data series that contains all test offsets
+        batchSize: int, the number of images loaded at a time
+        statistic: tuple[float, float], the mean and standard deviation used to standardise
+                   the pixels, (None, None) means no standardisation
+
+    Return:
+        prediction: np.ndarray, the predicted label of each test image
+    '''
+    loader=ImageBatchLoader(testPath, testOffset, batchSize=batchSize, mean=statistic[0], std=statistic[1])
+    prediction=[model.predict(batch) for batch, _ in loader]
+    return np.concatenate(prediction)
+
+def trainModel() -> tuple[np.ndarray, np.ndarray]:
+    '''
+        Train the image classification model in the configured mode,
+    predict the test images and save the model as the category classifier
+    together with the reducer or statistic needed to preprocess new images
+
+    Return:
+        testLabel: np.ndarray, the true label of each test image
+        prediction: np.ndarray, the predicted label of each test image
+    '''
+    if classificationSetting["mode"]=="batch":
+        trainPath, testPath, trainOffset, testOffset, trainLabel, testLabel=splitData()
+
+        if classificationSetting["standardise"]:
+            statistic=computeImageStatistic(ImageBatchLoader(trainPath, trainOffset, batchSize=classificationSetting["batchSize"]))
+        else:
+            statistic=(None, None)
+
+        reducer=None
+        model=trainBatchModel(trainPath, trainOffset, trainLabel, np.union1d(trainLabel, testLabel), statistic=statistic)
+        prediction=predictBatch(model, testPath, testOffset, statistic=statistic)
+    else:
+        if imageFeatureSetting["method"] is None:
+            train, test, trainLabel, testLabel=loadData()
+            reducer=None
+        else:
+            train, test, trainLabel, testLabel, reducer=loadReducedData()
+
+        statistic=(None, None)
+        model=SVC(gamma=classificationSetting["gamma"])
+
+        model.fit(train, trainLabel)
+        prediction=model.predict(test)
+
+    saveCategoryClassifier(model, reducer, statistic)
+    return testLabel, prediction
+
+if __name__=="__main__":
+    testLabel, prediction=trainModel()
+    print(classification_report(testLabel, prediction))
@@ -1,10 +1,15 @@
+import joblib
 import pandas as pd
+import scipy.sparse as sp
 
+from Configuration import datasetSplitSetting, sparseFeature, textDatasetSetting, textFeaturePath, TFIDFVectorizerSetting
 from DataLoading.TextLoading import loadProduct
-from DataProcessing.TextProcessing import splitTrainTest, transformData
+from DataProcessing.TextProcessing import constructFeatureName, fitSparseData, fitStreamingData, splitTrainTest, transformStreamingData
+from Prediction.PricePrediction import savePricePredictor
+from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.linear_model import LinearRegression
 
-def loadData() -> tuple[pd.DataFrame, pd.DataFrame, pd.Series, pd.Series]:
+def loadData(sparseFeature:bool=sparseFeature) -> tuple[pd.DataFrame|sp.csr_matrix, pd.DataFrame|sp.csr_matrix, pd.Series, pd.Series, dict[str,TfidfVectorizer]]:
     '''
         Load the product data for model training
 
@@ -12,24 +17,72 @@ def loadData() -> tuple[pd.DataFrame, pd.DataFrame, pd.Series, pd.Series]:
         1. Split the data into the training part and test part
         2. Transform each column in each part to its corresonding data frame
         3. Concatenate all data frames to form the final dataset
+
+        If sparse features are used, step 2~3 stack sparse matrices instead
+    of dense data frames, which could be fed to the model directly
+
+        In the "hashing" mode with the stable split, the vectorizers are fitted
+    over chunks of the processed product information instead, and both parts are
+    transformed one chunk at a time, so the whole table is never held in memory
+
+    Argument:
+        sparseFeature: bool, keep the features as sparse matrices instead of dense data frames
     
     Return:
-        train: pd.DataFrame, the transformed training data which could be used for training
-        test: pd.DataFrame, the transformed testing data which could be used for testing
+        train: pd.DataFrame|sp.csr_matrix, the transformed training data which could be used for training
+        test: pd.DataFrame|sp.csr_matrix, the transformed testing data which could be used for testing
         trainLabel: pd.Series, the data series that could be used as training label
         testLabel: pd.Series, the data series that could be used as test label
+        vectorizer: dict[str,TfidfVectorizer], the vectorizer fitted on each column
     '''
-    data=loadProduct()
-    trainData, testData, trainLabel, testLabel=splitTrainTest(data)
-    train, test=transformData(trainData, testData)
+    if TFIDFVectorizerSetting["mode"]=="hashing" and datasetSplitSetting["stable"]:
+        vectorizer=fitStreamingData()
+        train, test, trainLabel, testLabel=transformStreamingData(vectorizer)
+    else:
+        data=loadProduct(columns=["id"]+textDatasetSetting["featureColumn"]+[textDatasetSetting["targetColumn"]])
+        trainData, testData, trainLabel, testLabel=splitTrainTest(data)
+        train, test, vectorizer=fitSparseData(trainData, testData)
 
-    return train, test, trainLabel, testLabel
+    if not sparseFeature:
+        featureName=constructFeatureName(vectorizer)
+        train=pd.DataFrame(train.toarray(), columns=featureName)
+        test=pd.DataFrame(test.toarray(), columns=featureName)
 
-if __name__=="__main__":
-    train, test, trainLabel, testLabel=loadData()
+    return train, test, trainLabel, testLabel, vectorizer
 
+def saveFeature(textFeaturePath:str=textFeaturePath):
+    '''
+        Build the product data for model training and save it,
+    so the model could be trained again without refitting the vectorizers
+
+    Argument:
+        textFeaturePath: str, file path of the cached text features
+    '''
+    joblib.dump(loadData(), textFeaturePath)
+
+def trainModel(train:pd.DataFrame|sp.csr_matrix, test:pd.DataFrame|sp.csr_matrix, trainLabel:pd.Series, testLabel:pd.Series,
+               vectorizer:dict[str,TfidfVectorizer]) -> LinearRegression:
+    '''
+        Fit the linear regression model, report its R2 score on the
+    test data and save it together with the vectorizers as the price predictor
+
+    Argument:
+        train: pd.DataFrame|sp.csr_matrix, the transformed training data
+        test: pd.DataFrame|sp.csr_matrix, the transformed testing data
+        trainLabel: pd.Series, the data series that could be used as training label
+        testLabel: pd.Series, the data series that could be used as test label
+        vectorizer: dict[str,TfidfVectorizer], the vectorizer fitted on each column
+
+    Return:
+        model: LinearRegression, the fitted regression model
+    '''
     model=LinearRegression().fit(train, trainLabel)
     score=model.score(test, testLabel)
 
     print("The R2 score of the linear regression model is: ", score)
+    savePricePredictor(vectorizer, model)
+    return model
+
+if __name__=="__main__":
+    trainModel(*loadData())
 
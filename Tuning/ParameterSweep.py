@@ -0,0 +1,236 @@
+import itertools
+import json
+import math
+import numpy as np
+import os
+import pandas as pd
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+from Configuration import imageFeatureSetting, sweepResultPath, sweepSetting, textDatasetSetting, TFIDFVectorizerSetting
+from DataLoading.ImageLoading import loadImageLoading
+from DataLoading.TextLoading import loadProduct
+from DataProcessing import ImageProcessing, TextProcessing
+from DataProcessing.ImageFeature import loadImageFeature
+from sklearn.base import BaseEstimator
+from sklearn.linear_model import Ridge
+from sklearn.model_selection import train_test_split
+from sklearn.svm import SVC
+
+# The features shared by every candidate within the process, key=feature key, value=(fit, validation, fitLabel, validationLabel)
+sharedFeature={}
+# The shuffled order of the fitting rows, whose leading part is the sample of each round
+sharedOrder=np.empty(0, dtype="int64")
+
+def runSweep(task:str, sweepSetting:dict=sweepSetting, sweepResultPath:str=sweepResultPath) -> pd.DataFrame:
+    '''
+        Search the grid of feature and model settings of the given task
+    with successive halving, save the result table and print the best candidate
+
+        This function contains the following steps:
+        1. Load the data once and hold out a validation part of the training set
+        2. Build the features of every distinct feature setting once, which are
+           shared by every model setting using them
+        3. Fit every candidate on a small sample of the fitting rows in parallel,
+           keep the best 1/reduction of them and fit those on a sample reduction
+           times larger, until a single candidate is fitted on every row
+
+        The features are sent to each worker process once when it starts, so
+    every worker holds a copy of them
+
+    Argument:
+        task: str, "regression" or "classification"
+        sweepSetting: dict, the setting of the hyperparameter sweep
+        sweepResultPath: str, file path of the result table
+
+    Return:
+        result: pd.DataFrame, the settings, round, number of fitting rows, fit time,
+                feature time and validation score of every fitted candidate
+    '''
+    featureGrid=constructGrid(sweepSetting[task]["featureGrid"])
+    modelGrid=constructGrid(sweepSetting[task]["modelGrid"])
+    feature, featureSecond=loadSweepFeature(task, featureGrid, sweepSetting["validationSize"], sweepSetting["seed"])
+
+    candidate=[(featureSetting, modelSetting) for featureSetting in featureGrid for modelSetting in modelGrid]
+    order=np.random.default_rng(sweepSetting["seed"]).permutation(len(next(iter(feature.values()))[2]))
+    schedule=constructSchedule(len(candidate), sweepSetting["reduction"], sweepSetting["minimumProportion"])
+
+    workerNumber=min(sweepSetting["workerNumber"] or os.cpu_count(), len(candidate))
+    executor=ProcessPoolExecutor(workerNumber, initializer=setSharedFeature, initargs=(feature, order)) if workerNumber>1 else None
+    setSharedFeature(feature, order)
+
+    result=[]
+    remaining=list(range(len(candidate)))
+
+    try:
+        for stage, proportion in enumerate(schedule):
+            rowNumber=max(int(len(order)*proportion), 2)
+            argument=[(task, constructFeatureKey(candidate[i][0]), candidate[i][1], rowNumber) for i in remaining]
+            score=executor.map(evaluateCandidate, *zip(*argument)) if executor else map(evaluateCandidate, *zip(*argument))
+
+            for i, (value, second) in zip(remaining, score):
+                result.append({"candidate":i, "round":stage, "rowNumber":rowNumber, "score":value, "fitSecond":second,
+                               "featureSecond":featureSecond[constructFeatureKey(candidate[i][0])],
+                               **{"feature."+key:item for key, item in candidate[i][0].items()},
+                               **{"model."+key:item for key, item in candidate[i][1].items()}})
+
+            roundScore={item["candidate"]:item["score"] for item in result if item["round"]==stage}
+            remaining=sorted(remaining, key=lambda i: -np.nan_to_num(roundScore[i], nan=-np.inf))
+            remaining=remaining[:math.ceil(len(remaining)/sweepSetting["reduction"])]
+    finally:
+        if executor:
+            executor.shutdown()
+
+    result=pd.DataFrame(result)
+    result.to_csv(sweepResultPath, index=False)
+
+    best=int(result["candidate"].iloc[-1])
+    print("The best candidate scores", result["score"].iloc[-1], "on the validation set with", json.dumps({**candidate[best][0], **candidate[best][1]}))
+    return result
+
+def loadSweepFeature(task:str, featureGrid:list[dict], validationSize:float, seed:int) -> tuple[dict[str,tuple], dict[str,float]]:
+    '''
+        Load the training set of the task once and build the features of
+    every distinct feature setting on its fitting and validation parts
+
+    Argument:
+        task: str, "regression" or "classification"
+        featureGrid: list[dict], every feature setting, which overrides TFIDFVectorizerSetting
+                     or imageFeatureSetting
+        validationSize: float, the proportion of the training set held out for validation
+        seed: int, the seed of the validation split
+
+    Return:
+        feature: dict[str,tuple], key=feature key, value=(fit, validation, fitLabel, validationLabel)
+        featureSecond: dict[str,float], key=feature key, value=the time building the features
+    '''
+    if task=="regression":
+        product=loadProduct(columns=["id"]+textDatasetSetting["featureColumn"]+[textDatasetSetting["targetColumn"]])
+        trainData, _, trainLabel, _=TextProcessing.splitTrainTest(product)
+        fitData, validationData, fitLabel, validationLabel=train_test_split(trainData, trainLabel.to_numpy(), test_size=validationSize, random_state=seed)
+    elif task=="classification":
+        dataFrame=loadImageLoading()
+        trainPath, _, trainLabel, _=ImageProcessing.splitTrainTest(dataFrame)
+        fitPath, validationPath, fitLabel, validationLabel=train_test_split(trainPath, trainLabel, test_size=validationSize, random_state=seed)
+    else:
+        raise ValueError("Unknown sweep task: "+str(task))
+
+    feature={}
+    featureSecond={}
+
+    for featureSetting in featureGrid:
+        key=constructFeatureKey(featureSetting)
+        if key in feature:
+            continue
+
+        start=time.perf_counter()
+        if task=="regression":
+            fit, validation, _=TextProcessing.fitSparseData(fitData, validationData, {**TFIDFVectorizerSetting, **featureSetting})
+        elif {**imageFeatureSetting, **featureSetting}["method"] is None:
+            fit=ImageProcessing.loadFlatDataset(fitPath, ImageProcessing.selectOffset(dataFrame, fitPath))
+            validation=ImageProcessing.loadFlatDataset(validationPath, ImageProcessing.selectOffset(dataFrame, validationPath))
+        else:
+            fit, validation=loadImageFeature(dataFrame, fitPath, validationPath, {**imageFeatureSetting, **featureSetting})
+
+        feature[key]=(fit, validation, fitLabel, validationLabel)
+        featureSecond[key]=time.perf_counter()-start
+
+    return feature, featureSecond
+
+def evaluateCandidate(task:str, featureKey:str, modelSetting:dict, rowNumber:int) -> tuple[float, float]:
+    '''
+        Fit a candidate on the leading rows of the shared order and
+    score it on the validation part
+
+        A fit that fails on a small sample, e.g. with a single class, scores NaN
+    and is dropped from the next round
+
+    Argument:
+        task: str, "regression" or "classification"
+        featureKey: str, the key of the shared features of the candidate
+        modelSetting: dict, the parameters of the model
+        rowNumber: int, the number of fitting rows
+
+    Return:
+        score: float, the R2 score or accuracy on the validation part
+        second: float, the time fitting the model
+    '''
+    fit, validation, fitLabel, validationLabel=sharedFeature[featureKey]
+    row=np.sort(sharedOrder[:rowNumber])
+    model=constructModel(task, modelSetting)
+
+    start=time.perf_counter()
+    try:
+        model.fit(fit[row], fitLabel[row])
+    except ValueError:
+        return float("nan"), time.perf_counter()-start
+    second=time.perf_counter()-start
+
+    return float(model.score(validation, validationLabel)), second
+
+def setSharedFeature(feature:dict[str,tuple], order:np.ndarray):
+    '''
+        Keep the features and the row order within the process, which is
+    called once when every worker process starts
+
+    Argument:
+        feature: dict[str,tuple], key=feature key, value=(fit, validation, fitLabel, validationLabel)
+        order: np.ndarray, the shuffled order of the fitting rows
+    '''
+    global sharedOrder
+    sharedFeature.clear()
+    sharedFeature.update(feature)
+    sharedOrder=order
+
+def constructModel(task:str, modelSetting:dict) -> BaseEstimator:
+    '''
+        Return the unfitted model of the task with the given parameters
+
+    Argument:
+        task: str, "regression" or "classification"
+        modelSetting: dict, the parameters of the model
+
+    Return:
+        result: BaseEstimator, Ridge for the regression and SVC for the classification
+    '''
+    if task=="regression":
+        return Ridge(**modelSetting)
+
+    return SVC(**modelSetting)
+
+def constructGrid(grid:dict[str,list]) -> list[dict]:
+    '''
+        Return every combination of the values within the grid
+
+    Argument:
+        grid: dict[str,list], key=parameter name, value=the values to try
+
+    Return:
+        result: list[dict], every setting within the grid
+    '''
+    return [dict(zip(grid, value)) for value in itertools.product(*grid.values())]
+
+def constructFeatureKey(featureSetting:dict) -> str:
+    '''
+        Return the key of the features built with the given setting
+    '''
+    return json.dumps(featureSetting, sort_keys=True)
+
+def constructSchedule(candidateNumber:int, reduction:int, minimumProportion:float) -> list[float]:
+    '''
+        Return the proportion of the fitting rows used in every round
+    of the successive halving
+
+        The last round fits a single candidate on every row and each earlier
+    round uses reduction times fewer rows, but never fewer than the minimum
+
+    Argument:
+        candidateNumber: int, the number of candidates within the first round
+        reduction: int, the factor the candidates are cut by after each round
+        minimumProportion: float, the minimum proportion of the fitting rows
+
+    Return:
+        result: list[float], the proportion of the fitting rows of each round
+    '''
+    roundNumber=math.ceil(math.log(candidateNumber)/math.log(reduction)-1e-9) if candidateNumber>1 else 0
+    return [max(minimumProportion, float(reduction)**(stage-roundNumber)) for stage in range(roundNumber+1)]